@@ -0,0 +1,229 @@
+"""
+Bounded execution of AI calls.
+
+- Every call has a deadline (`AI_DEADLINE`, default 6 s); past it the caller
+  gets a fallback instead of standing in silence. The abandoned request
+  finishes in the background and is ignored. A stream must start within
+  `AI_FIRST_TOKEN_DEADLINE` (default 4 s) and then only stall for at most
+  `AI_DEADLINE` between chunks, so long answers aren't cut off.
+- Optional hedging (`AI_HEDGE=1`): if the first request hasn't answered by the
+  `AI_HEDGE_PERCENTILE` (default 90th) of recent latencies, a second identical
+  request is sent and whichever finishes first wins.
+- A circuit breaker opens after `AI_BREAKER_FAILURES` (default 3) consecutive
+  failures or a single rate-limit (429) error. While open, calls are not made
+  at all for `AI_BREAKER_RESET` seconds (default 30); then one trial call is let
+  through (half-open) and its outcome closes or re-opens the breaker.
+
+`ai_response.py` answers from the local knowledge base when a call is
+refused, times out or fails.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import perf_metrics
+
+DEADLINE = float(os.environ.get('AI_DEADLINE', '6'))
+FIRST_TOKEN_DEADLINE = float(os.environ.get('AI_FIRST_TOKEN_DEADLINE', '4'))
+HEDGE = os.environ.get('AI_HEDGE', '0') == '1'
+HEDGE_PERCENTILE = float(os.environ.get('AI_HEDGE_PERCENTILE', '90'))
+# Latency samples needed before the hedge delay is trusted
+HEDGE_MIN_SAMPLES = 5
+BREAKER_FAILURES = int(os.environ.get('AI_BREAKER_FAILURES', '3'))
+BREAKER_RESET = float(os.environ.get('AI_BREAKER_RESET', '30'))
+# Full-call latencies (the hedge delay's basis) and stream time-to-first-token,
+# kept apart so one doesn't skew the other
+LATENCY_METRIC = 'ai.latency'
+FIRST_TOKEN_METRIC = 'ai.first_token'
+
+
+class CircuitOpenError(RuntimeError):
+    """The breaker is open; the call was not attempted."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """No answer before the deadline."""
+
+
+def is_rate_limit(e: Exception) -> bool:
+    msg = str(e)
+    return '429' in msg or 'Quota exceeded' in msg or 'ResourceExhausted' in type(e).__name__
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """May a call go out now? In half-open state only one trial at a time."""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            self._state = self.CLOSED
+
+    def record_failure(self, rate_limited: bool = False):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if rate_limited or self.failures >= self.failure_threshold or self._state == self.HALF_OPEN:
+                if self._state != self.OPEN:
+                    perf_metrics.incr('ai.breaker_opened')
+                    print(f"[AI] Circuit open for {self.reset_timeout:.0f}s "
+                          f"({'rate limited' if rate_limited else f'{self.failures} failures'})")
+                self._state = self.OPEN
+                self.opened_at = time.time()
+
+
+class AIExecutor:
+    def __init__(self, breaker: CircuitBreaker = None, deadline: float = DEADLINE,
+                 hedge: bool = HEDGE, hedge_percentile: float = HEDGE_PERCENTILE, workers: int = 4):
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai')
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None if there's no basis yet."""
+        samples = perf_metrics.samples(LATENCY_METRIC)
+        if not self.hedge or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return perf_metrics.percentile(samples, self.hedge_percentile)
+
+    def call(self, fn, *args, deadline: float = None, hedge_gate=None):
+        """Run `fn(*args)` under the breaker and deadline, hedging if enabled.
+
+        `hedge_gate()` is asked before sending the hedged request (e.g. to
+        check the quota); it is skipped if that returns False.
+        Raises CircuitOpenError, DeadlineExceeded or `fn`'s own exception.
+        """
+        if not self.breaker.allow():
+            perf_metrics.incr('ai.breaker_rejected')
+            raise CircuitOpenError("AI circuit breaker is open")
+        deadline = self.deadline if deadline is None else deadline
+        start = time.perf_counter()
+        end = start + deadline
+        futures = [self._pool.submit(fn, *args)]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None and delay < deadline:
+                done, _ = wait(futures, timeout=delay)
+                if not done and (hedge_gate is None or hedge_gate()):
+                    perf_metrics.incr('ai.hedged')
+                    futures.append(self._pool.submit(fn, *args))
+            error = None
+            while futures:
+                done, _ = wait(futures, timeout=max(0.0, end - time.perf_counter()),
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for f in done:
+                    futures.remove(f)
+                    if f.exception() is None:
+                        elapsed = time.perf_counter() - start
+                        perf_metrics.record(LATENCY_METRIC, elapsed)
+                        self.breaker.record_success()
+                        return f.result()
+                    error = f.exception()
+            if error is not None and not futures:
+                raise error
+            perf_metrics.incr('ai.deadline_exceeded')
+            raise DeadlineExceeded(f"no AI answer within {deadline:.1f}s")
+        except Exception as e:
+            self.breaker.record_failure(rate_limited=is_rate_limit(e))
+            raise
+
+    def stream(self, gen_fn, *args, first_deadline: float = FIRST_TOKEN_DEADLINE, deadline: float = None):
+        """Iterate `gen_fn(*args)` in a worker, yielding its items here.
+
+        Raises DeadlineExceeded if the first item takes longer than
+        `first_deadline` or any later one longer than `deadline` after the
+        previous. A stall after the stream has started is not held against
+        the breaker: the service answered.
+        """
+        if not self.breaker.allow():
+            perf_metrics.incr('ai.breaker_rejected')
+            raise CircuitOpenError("AI circuit breaker is open")
+        deadline = self.deadline if deadline is None else deadline
+        start = time.perf_counter()
+        items = queue.Queue()
+        done = object()
+
+        def pump():
+            try:
+                for item in gen_fn(*args):
+                    items.put((item, None))
+                items.put((done, None))
+            except Exception as e:
+                items.put((done, e))
+
+        self._pool.submit(pump)
+        first = True
+        failed = False
+        limit = start + first_deadline
+        try:
+            while True:
+                try:
+                    item, error = items.get(timeout=max(0.0, limit - time.perf_counter()))
+                except queue.Empty:
+                    perf_metrics.incr('ai.deadline_exceeded')
+                    raise DeadlineExceeded(f"AI stream stalled after {time.perf_counter() - start:.1f}s")
+                if error is not None:
+                    raise error
+                if item is done:
+                    break
+                if first:
+                    perf_metrics.record(FIRST_TOKEN_METRIC, time.perf_counter() - start)
+                    first = False
+                yield item
+                # The gap to the next item, not the whole answer, is bounded
+                limit = time.perf_counter() + deadline
+        except Exception as e:
+            if first or not isinstance(e, DeadlineExceeded):
+                failed = True
+                self.breaker.record_failure(rate_limited=is_rate_limit(e))
+            raise
+        finally:
+            # Also reached if the consumer stops early, so the half-open
+            # trial slot is always released
+            if not failed:
+                self.breaker.record_success()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_ai_executor() -> AIExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = AIExecutor()
+        return _executor
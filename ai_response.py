@@ -1,22 +1,27 @@
 import os
-import google.generativeai as genai
+import re
 import time
+from collections import deque
+
+import perf_metrics
+from gemini_client import get_gemini_client
+from answer_cache import get_answer_cache
+from ai_executor import get_ai_executor, is_rate_limit, CircuitBreaker, CircuitOpenError, DeadlineExceeded
+from rate_limiter import get_rate_limiter, get_usage_ledger, estimate_tokens, QuotaExceeded
+import local_llm
 
 # Allow a local, untracked secrets file on devices (e.g., Raspberry Pi).
 # The file `secrets_local.py` should define `GEMINI_KEY = 'your-key'`.
 def _ensure_api_key():
-    """Ensure `api_key` is set and genai is configured.
+    """Find the Gemini API key.
     This attempts the following (in order):
     - `GEMINI_KEY` environment variable
     - `secrets_local.py` file in the working directory
-    If found, configure the `genai` client and return the key, otherwise None.
+    Returns the key, otherwise None. The shared client (`gemini_client.py`)
+    is configured with it on first use.
     """
     key = os.environ.get('GEMINI_KEY')
     if key:
-        try:
-            genai.configure(api_key=key)
-        except Exception:
-            pass
         return key
 
     # Try local file fallback dynamically (works if file is created after import)
@@ -27,10 +32,6 @@ def _ensure_api_key():
             secrets_local = importlib.import_module('secrets_local')
             key = getattr(secrets_local, 'GEMINI_KEY', None)
             if key:
-                try:
-                    genai.configure(api_key=key)
-                except Exception:
-                    pass
                 return key
     except Exception:
         pass
@@ -38,160 +39,457 @@ def _ensure_api_key():
     return None
 
 
+# Spoken when Gemini gives nothing usable
+EMPTY_ANSWER = "I'm not sure about that. Please ask me about the school rules, or try rephrasing your question."
+BUSY_ANSWER = "I'm currently busy with too many requests. Please wait a minute."
+ERROR_ANSWER = "I couldn't process that. Could you please rephrase your question?"
+OFFLINE_ANSWER = "I can't reach my online brain right now. You can ask me about the school meanwhile."
+
+
+def _clean(text: str) -> str:
+    # Markdown symbols would be read out loud
+    return str(text).replace('*', '').replace('#', '')
+
+
+def _error_answer(e: Exception) -> str:
+    error_msg = str(e)
+    if "429" in error_msg or "Quota exceeded" in error_msg or isinstance(e, QuotaExceeded):
+        return BUSY_ANSWER
+    if isinstance(e, (CircuitOpenError, DeadlineExceeded)):
+        return OFFLINE_ANSWER
+    return ERROR_ANSWER
+
+
+def _local_fallback(payload: str, error: Exception) -> str:
+    """Answer without Gemini: an expired cached answer, else the school
+    knowledge base (loosely: the strict lookup already found nothing for
+    most questions that get here), else the local model server
+    (`LOCAL_LLM_FALLBACK=1`), else an apology."""
+    perf_metrics.incr('ai.fallbacks')
+    cache = get_answer_cache()
+    answer = cache.get_stale(payload) if cache else None
+    if not answer:
+        try:
+            from school_data import get_school_answer_enhanced, related_school_answer
+            answer = get_school_answer_enhanced(payload) or related_school_answer(payload)
+        except Exception:
+            answer = None
+    if not answer and local_llm.fallback_enabled() and local_llm.backend_name() != 'local':
+        try:
+            text, _ = local_llm.get_local_llm().complete(payload, _max_tokens(), timeout=get_ai_executor().deadline)
+            answer = _clean(text.strip()) or None
+            perf_metrics.incr('ai.local_fallbacks')
+        except Exception as e:
+            print(f"Local LLM fallback failed: {e}")
+    return answer or _error_answer(error)
+
+
 # Determine api_key at import time if possible
 api_key = _ensure_api_key()
 
-if api_key:
+if local_llm.backend_name() == 'local':
+    print(f"✅ Using local model server at {local_llm.LOCAL_LLM_URL}")
+elif api_key:
     print(f"✅ Gemini API Key Found: {str(api_key)[:8]}...")
 else:
     print("❌ Warning: GEMINI_KEY environment variable not set and no local secret found. AI responses will not work.")
 
+# Stands in for the API key when answering with the local model server
+LOCAL_KEY = 'local'
+
+
+def _backend_key():
+    """Gemini key, or LOCAL_KEY when `AI_BACKEND=local` (no key needed)."""
+    if local_llm.backend_name() == 'local':
+        return LOCAL_KEY
+    return api_key or _ensure_api_key()
+
+
+def start_ai_warmup():
+    """Connect to Gemini in the background so the first question is fast."""
+    key = _backend_key()
+    if key and key != LOCAL_KEY:
+        get_gemini_client().start_warmup(key)
+
 def get_response(payload: str):
     """Legacy function - redirects to get_chat_response"""
     return get_chat_response(payload)
 
 
-def get_chat_response(payload: str):
-    """Get AI response using Google Gemini"""
+def _answer(content: str) -> dict:
+    return {'choices': [{'message': {'content': content}}]}
+
+
+def _max_tokens() -> int:
+    # Allow token tuning via env var for Pi or testing
+    return int(os.environ.get('GEMINI_MAX_TOKENS', '300'))
+
+
+def _reserve_quota(payload: str, priority: str, key: str = None) -> int:
+    """Take quota for one call (shared limiter); returns the token estimate.
+    Raises QuotaExceeded if the call must be shed, or CircuitOpenError
+    (taking nothing) if the breaker would refuse it anyway. The local model
+    server has no quota."""
+    if get_ai_executor().breaker.state == CircuitBreaker.OPEN:
+        perf_metrics.incr('ai.breaker_rejected')
+        raise CircuitOpenError("AI circuit breaker is open")
+    if key == LOCAL_KEY:
+        return 0
+    estimate = estimate_tokens(payload, _max_tokens())
+    if not get_rate_limiter().acquire(estimate, priority):
+        ledger = get_usage_ledger()
+        if ledger:
+            ledger.record_shed()
+        raise QuotaExceeded("Quota exceeded (client-side limit)")
+    return estimate
+
+
+def _refund_quota(estimate: int, key: str = None):
+    """Return a reservation the breaker refused (e.g. it lost the half-open
+    trial to another call)."""
+    if key != LOCAL_KEY:
+        get_rate_limiter().refund(estimate)
+
+
+def _record_usage(payload: str, estimate: int, latency: float, usage=None, text: str = ''):
+    """Settle the limiter with the real token counts and log the call."""
+    if local_llm.backend_name() == 'local':
+        perf_metrics.record('ai.local_latency', latency)
+        return
+    tokens_in = getattr(usage, 'prompt_token_count', None) or estimate_tokens(payload)
+    tokens_out = getattr(usage, 'candidates_token_count', None) or estimate_tokens(text)
+    get_rate_limiter().settle(estimate, tokens_in + tokens_out)
+    ledger = get_usage_ledger()
+    if ledger:
+        ledger.record_call(tokens_in, tokens_out, latency)
+
+
+class ConversationMemory:
+    """Recent turns of one conversation, kept within a token budget.
+
+    The newest turns are kept verbatim; when there are more than
+    `CHAT_HISTORY_TURNS` (default 6) or they no longer fit in
+    `CHAT_HISTORY_TOKENS` (default 300) the oldest are folded into a rolling
+    summary (question plus the first sentence of the answer), which itself is
+    capped at a third of the budget. History untouched for
+    `CHAT_HISTORY_IDLE` seconds (default 120) is forgotten, even if the
+    conversation wasn't ended. Nothing here calls the model, so keeping
+    context costs only the extra prompt tokens.
+    """
+
+    def __init__(self, token_budget: int = None, max_turns: int = None, idle_timeout: float = None):
+        self.token_budget = token_budget or int(os.environ.get('CHAT_HISTORY_TOKENS', '300'))
+        self.max_turns = max_turns or int(os.environ.get('CHAT_HISTORY_TURNS', '6'))
+        self.idle_timeout = idle_timeout or float(os.environ.get('CHAT_HISTORY_IDLE', '120'))
+        self.turns = deque()
+        self.summary = deque()
+        self.updated = 0.0
+
+    def reset(self):
+        self.turns.clear()
+        self.summary.clear()
+
+    def __bool__(self):
+        return bool(self.turns or self.summary)
+
+    def _expire(self):
+        if self and time.monotonic() - self.updated > self.idle_timeout:
+            perf_metrics.incr('ai.history_expired')
+            self.reset()
+
+    def add(self, question: str, answer: str):
+        self._expire()
+        self.turns.append((question.strip(), answer.strip()))
+        self.updated = time.monotonic()
+        self._compact()
+
+    @staticmethod
+    def _tokens(lines) -> int:
+        return sum(estimate_tokens(line) for line in lines)
+
+    def _turn_lines(self):
+        for q, a in self.turns:
+            yield f"Student: {q}"
+            yield f"OMNIS: {a}"
+
+    def _compact(self):
+        while len(self.turns) > 1 and (len(self.turns) > self.max_turns or
+                                       self._tokens(self._turn_lines()) + self._tokens(self.summary) > self.token_budget):
+            q, a = self.turns.popleft()
+            first = re.split(r'(?<=[.!?])\s+', a, maxsplit=1)[0]
+            self.summary.append(f"{q} -> {first}")
+            perf_metrics.incr('ai.history_compactions')
+        while len(self.summary) > 1 and self._tokens(self.summary) > self.token_budget // 3:
+            self.summary.popleft()
+
+    def context(self) -> str:
+        """Prompt prefix describing the conversation so far ('' if none)."""
+        self._expire()
+        if not self:
+            return ''
+        lines = ["Conversation so far (answer the new question in this context):"]
+        if self.summary:
+            lines.append("Earlier: " + "; ".join(self.summary))
+        lines.extend(self._turn_lines())
+        return "\n".join(lines)
+
+
+def _with_context(payload: str, context: str = None) -> str:
+    return f"{context}\n\nStudent's new question: {payload}" if context else payload
+
+
+def get_chat_response(payload: str, priority: str = 'high', context: str = None):
+    """Get AI response using Google Gemini (repeat questions come from the answer cache).
+    `priority` is 'high' (someone is waiting) or 'low' (may be shed, see rate_limiter.py).
+    `context` is earlier conversation (`ConversationMemory.context()`); answers
+    that depend on it, or come from the local model server, are not cached."""
     # Ensure we have a valid API key at call time (pick up secrets_local.py if added later)
-    key = api_key or _ensure_api_key()
+    key = _backend_key()
     if not key:
         return {"error": "Gemini API key not configured"}
-    
+
+    cache = None if context else get_answer_cache()
+    cached = cache.get(payload) if cache else None
+    if cached:
+        return _answer(cached)
+
+    prompt = _with_context(payload, context)
+    start = time.perf_counter()
+    estimate = None
     try:
-        # (Re)configure genai with the discovered key to be safe
-        try:
-            genai.configure(api_key=key)
-        except Exception:
-            pass
+        estimate = _reserve_quota(prompt, priority, key)
+        # Deadline, optional hedging and circuit breaker (ai_executor.py);
+        # a hedged duplicate only goes out if there is spare quota
+        result = get_ai_executor().call(
+            _generate_chat_response, prompt, key, estimate,
+            hedge_gate=lambda: get_rate_limiter().acquire(estimate, 'low'))
+    except Exception as e:
+        print(f"Error getting AI response: {e}")
+        if isinstance(e, CircuitOpenError) and estimate is not None:
+            _refund_quota(estimate, key)
+        ledger = get_usage_ledger()
+        if ledger and not isinstance(e, (QuotaExceeded, CircuitOpenError)):
+            ledger.record_error()
+        return _answer(_local_fallback(payload, e))
+    content = result['choices'][0]['message']['content']
+    # The local server's answers would outlive a switch back to Gemini
+    if cache and key != LOCAL_KEY and content not in (EMPTY_ANSWER, BUSY_ANSWER, ERROR_ANSWER):
+        cache.put(payload, content, time.perf_counter() - start)
+    return result
 
-        model = genai.GenerativeModel(
-            'gemini-2.5-flash',
-            system_instruction=("You are OMNIS, a helpful school assistant robot. "
-                                "Keep answers brief and concise. "
-                                "Be friendly and to the point."),
-        )
 
-        # Allow token tuning via env var for Pi or testing
-        max_tokens = int(os.environ.get('GEMINI_MAX_TOKENS', '300'))
-        temperature = float(os.environ.get('GEMINI_TEMPERATURE', '0.6'))
+def _generate_chat_response(payload: str, key: str, estimate: int = 0):
+    """One Gemini call (errors propagate to the executor)."""
+    if key == LOCAL_KEY:
+        return _generate_local_response(payload)
+    # Shared model: configured once, rebuilt only if the key changes
+    client = get_gemini_client()
+    model = client.model(key)
 
-        # Try a couple times if the model returns empty content
-        response = None
-        content = None
-        for attempt in range(2):
-            try:
-                response = model.generate_content(
-                    payload,
-                    generation_config=genai.types.GenerationConfig(
-                        max_output_tokens=max_tokens,
-                        temperature=temperature,
-                    )
-                )
-            except Exception as e:
-                # transient error -> retry once
-                if attempt == 0:
-                    if os.environ.get('OMNIS_DEBUG') == '1':
-                        print(f"[DEBUG] Generation attempt failed (will retry): {e}")
-                    time.sleep(0.3)
-                    continue
-                else:
-                    raise
-
-            # Debug: show raw response when debugging
-            if os.environ.get('OMNIS_DEBUG') == '1':
-                try:
-                    print(f"[DEBUG] raw response: {response}")
-                except Exception:
-                    pass
+    max_tokens = _max_tokens()
+    temperature = float(os.environ.get('GEMINI_TEMPERATURE', '0.6'))
 
-            # Try to get text content safely
+    # Try a couple times if the model returns empty content
+    response = None
+    content = None
+    error = None
+    for attempt in range(2):
+        if attempt:
+            # The retry is another request: it needs its own quota, and is
+            # skipped rather than queued when there is none left
+            estimate = estimate_tokens(payload, max_tokens)
+            if not get_rate_limiter().acquire(estimate, 'high', timeout=0):
+                perf_metrics.incr('ai.retry_shed')
+                if error is not None:
+                    raise error
+                break
+        try:
+            call_start = time.perf_counter()
+            response = model.generate_content(
+                payload,
+                generation_config=client.generation_config(max_tokens, temperature)
+            )
+        except Exception as e:
+            # transient error -> retry once (a 429 won't clear in 0.3 s)
+            if attempt == 0 and not is_rate_limit(e):
+                if os.environ.get('OMNIS_DEBUG') == '1':
+                    print(f"[DEBUG] Generation attempt failed (will retry): {e}")
+                error = e
+                time.sleep(0.3)
+                continue
+            else:
+                raise
+        # Settled once per request, against that request's own reservation
+        _record_usage(payload, estimate, time.perf_counter() - call_start,
+                      getattr(response, 'usage_metadata', None))
+
+        # Debug: show raw response when debugging
+        if os.environ.get('OMNIS_DEBUG') == '1':
             try:
-                content = getattr(response, 'text', None)
+                print(f"[DEBUG] raw response: {response}")
             except Exception:
-                content = None
+                pass
 
-            # If direct text not available, attempt to assemble from candidates -> content -> parts
-            if not content or not str(content).strip():
-                try:
-                    candidates = getattr(response, 'candidates', None) or []
-                    for cand in candidates:
-                        try:
-                            cand_content = getattr(cand, 'content', None)
-                            if cand_content and getattr(cand_content, 'parts', None):
-                                parts = cand_content.parts
-                                text_parts = []
-                                for p in parts:
-                                    # some parts may be objects with .text
-                                    t = getattr(p, 'text', None)
-                                    if t:
-                                        text_parts.append(t)
-                                joined = ''.join(text_parts).strip()
-                                if joined:
-                                    content = joined
-                                    break
-                        except Exception:
-                            continue
-                except Exception:
-                    content = None
-
-            if content and str(content).strip():
-                break
-            # otherwise loop to retry one more time
-        
         # Try to get text content safely
         try:
-            content = response.text
-        except:
-            # Response is blocked, check candidates directly
+            content = getattr(response, 'text', None)
+        except Exception:
             content = None
-            if response.candidates and len(response.candidates) > 0:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and candidate.content and len(candidate.content.parts) > 0:
+
+        # If direct text not available, attempt to assemble from candidates -> content -> parts
+        if not content or not str(content).strip():
+            try:
+                candidates = getattr(response, 'candidates', None) or []
+                for cand in candidates:
                     try:
-                        content = candidate.content.parts[0].text
-                    except:
-                        pass
-        
+                        cand_content = getattr(cand, 'content', None)
+                        if cand_content and getattr(cand_content, 'parts', None):
+                            parts = cand_content.parts
+                            text_parts = []
+                            for p in parts:
+                                # some parts may be objects with .text
+                                t = getattr(p, 'text', None)
+                                if t:
+                                    text_parts.append(t)
+                            joined = ''.join(text_parts).strip()
+                            if joined:
+                                content = joined
+                                break
+                    except Exception:
+                        continue
+            except Exception:
+                content = None
+
         if content and str(content).strip():
-            return {
-                'choices': [{
-                    'message': {
-                        'content': str(content).strip().replace('*', '').replace('#', '')
-                    }
-                }]
-            }
-        else:
-            # Handle blocked or empty content with a helpful response
-            return {
-                'choices': [{
-                    'message': {
-                        'content': "I'm not sure about that. Please ask me about the school rules, or try rephrasing your question."
-                    }
-                }]
-            }
-    except Exception as e:
-        print(f"Error getting AI response: {e}")
-        error_msg = str(e)
-        if "429" in error_msg or "Quota exceeded" in error_msg:
-             return {
-                'choices': [{
-                    'message': {
-                        'content': "I'm currently busy with too many requests. Please wait a minute."
-                    }
-                }]
-            }
-        
-        # Return a helpful error message instead of error
+            break
+        # otherwise loop to retry one more time
+    
+    # Try to get text content safely
+    try:
+        content = response.text
+    except:
+        # Response is blocked, check candidates directly
+        content = None
+        if response.candidates and len(response.candidates) > 0:
+            candidate = response.candidates[0]
+            if hasattr(candidate, 'content') and candidate.content and len(candidate.content.parts) > 0:
+                try:
+                    content = candidate.content.parts[0].text
+                except:
+                    pass
+    
+    if content and str(content).strip():
+        return {
+            'choices': [{
+                'message': {
+                    'content': _clean(str(content).strip())
+                }
+            }]
+        }
+    else:
+        # Handle blocked or empty content with a helpful response
         return {
             'choices': [{
                 'message': {
-                    'content': "I couldn't process that. Could you please rephrase your question?"
+                    'content': EMPTY_ANSWER
                 }
             }]
         }
 
 
+def _generate_local_response(payload: str):
+    """One call to the local model server (`local_llm.py`)."""
+    start = time.perf_counter()
+    text, usage = local_llm.get_local_llm().complete(
+        payload, _max_tokens(), float(os.environ.get('GEMINI_TEMPERATURE', '0.6')))
+    _record_usage(payload, 0, time.perf_counter() - start, usage, text)
+    return _answer(_clean(text.strip()) if text and text.strip() else EMPTY_ANSWER)
+
+
+def stream_chat_response(payload: str, priority: str = 'high', context: str = None):
+    """Yield the Gemini answer to `payload` in pieces as they are generated.
+
+    Lets the caller start speaking the first sentence while the rest is
+    still being produced. Yields nothing if no API key is configured; empty
+    or failed generations yield the same fallback text as `get_chat_response`
+    (unless part of the answer was already delivered). `context` as for
+    `get_chat_response`.
+    """
+    key = _backend_key()
+    if not key:
+        return
+
+    cache = None if context else get_answer_cache()
+    cached = cache.get(payload) if cache else None
+    if cached:
+        yield cached
+        return
+
+    prompt = _with_context(payload, context)
+    start = time.perf_counter()
+    delivered = False
+    complete = False
+    parts = []
+    fallback = EMPTY_ANSWER
+    estimate = None
+    try:
+        estimate = _reserve_quota(prompt, priority, key)
+        # First-token and total deadlines plus the circuit breaker (ai_executor.py)
+        for text in get_ai_executor().stream(_stream_pieces, prompt, key, estimate):
+            if not delivered:
+                perf_metrics.record('ai.time_to_first_token', time.perf_counter() - start)
+                delivered = True
+            parts.append(text)
+            yield text
+        complete = True
+        perf_metrics.record('ai.stream_total', time.perf_counter() - start)
+    except Exception as e:
+        print(f"Error streaming AI response: {e}")
+        if isinstance(e, CircuitOpenError) and estimate is not None:
+            _refund_quota(estimate, key)
+        ledger = get_usage_ledger()
+        if ledger and not isinstance(e, (QuotaExceeded, CircuitOpenError)):
+            ledger.record_error()
+        if not delivered:
+            fallback = _local_fallback(payload, e)
+    if not delivered:
+        yield fallback
+    elif complete and cache and key != LOCAL_KEY:
+        cache.put(payload, ''.join(parts).strip(), time.perf_counter() - start)
+
+
+def _stream_pieces(payload: str, key: str, estimate: int = 0):
+    """Raw streaming Gemini call: cleaned text pieces, blocked chunks skipped."""
+    temperature = float(os.environ.get('GEMINI_TEMPERATURE', '0.6'))
+    start = time.perf_counter()
+    if key == LOCAL_KEY:
+        for text in local_llm.get_local_llm().stream(
+                payload, _max_tokens(), temperature,
+                on_usage=lambda usage: _record_usage(payload, 0, time.perf_counter() - start, usage)):
+            yield _clean(text)
+        return
+    client = get_gemini_client()
+    response = client.model(key).generate_content(
+        payload,
+        generation_config=client.generation_config(_max_tokens(), temperature),
+        stream=True,
+    )
+    usage = None
+    produced = []
+    for chunk in response:
+        # The final chunk carries the token counts for the whole answer
+        usage = getattr(chunk, 'usage_metadata', None) or usage
+        try:
+            text = chunk.text
+        except Exception:
+            # Blocked or non-text chunk
+            text = None
+        if text:
+            produced.append(text)
+            yield _clean(text)
+    _record_usage(payload, estimate, time.perf_counter() - start, usage, ''.join(produced))
+
+
 if __name__ == '__main__':
     result = get_chat_response("tell me about langchain")
     if 'error' not in result:
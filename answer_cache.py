@@ -0,0 +1,170 @@
+"""
+Persistent cache of AI answers, keyed by the normalized question.
+
+Students ask the same general questions over and over; a cached answer is
+returned instantly and costs no Gemini quota. Questions are normalized
+(lowercase, punctuation, wake words and stop words removed) so "OMNIS, what
+is AI?" and "what's AI" share an entry. Entries live in SQLite with a TTL and
+the least recently used ones are dropped past the size cap; expired answers
+are kept until then as a fallback for when Gemini can't be reached.
+Questions about changing facts ("today", "weather", "news", ...) are never
+cached.
+
+Settings: `ANSWER_CACHE` (set to 0 to disable), `ANSWER_CACHE_DB` (default
+answer_cache.db), `ANSWER_CACHE_TTL_HOURS` (default 168), `ANSWER_CACHE_MAX`
+(entries, default 2000).
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import perf_metrics
+
+DEFAULT_DB = os.environ.get('ANSWER_CACHE_DB', 'answer_cache.db')
+DEFAULT_TTL = float(os.environ.get('ANSWER_CACHE_TTL_HOURS', '168')) * 3600
+DEFAULT_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX', '2000'))
+
+WAKE_WORDS = {'omnis', 'hello', 'hey', 'hi'}
+STOP_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'do', 'does', 'did',
+    'can', 'could', 'would', 'will', 'you', 'me', 'my', 'i', 'please', 'tell',
+    'about', 'of', 'to', 'for', 'in', 'on', 'and', 'or', 'so', 'just', 'us',
+    'know', 'explain', 'say', 's', 'whats', 'what', 'okay', 'ok',
+}
+# Answers to these change too often to reuse
+VOLATILE_WORDS = {
+    'today', 'tonight', 'now', 'current', 'currently', 'latest', 'news',
+    'time', 'date', 'day', 'weather', 'temperature', 'yesterday', 'tomorrow',
+    'score', 'live', 'this',
+}
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize_question(text: str) -> str:
+    """Canonical form of a question for cache lookups ('' if nothing is left)."""
+    words = _WORD.findall(str(text).lower().replace("'", ''))
+    return ' '.join(w for w in words if w not in STOP_WORDS and w not in WAKE_WORDS)
+
+
+def is_cacheable(text: str) -> bool:
+    words = set(_WORD.findall(str(text).lower()))
+    return bool(normalize_question(text)) and not (words & VOLATILE_WORDS)
+
+
+class AnswerCache:
+    def __init__(self, path: str = DEFAULT_DB, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        # Shared between the speech thread and background callers
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS answers (
+            key TEXT PRIMARY KEY,
+            question TEXT,
+            answer TEXT NOT NULL,
+            created REAL NOT NULL,
+            expires REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            latency REAL NOT NULL DEFAULT 0)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers(last_used)")
+        self._db.commit()
+
+    def get(self, question: str):
+        """Cached answer for `question`, or None (counts a hit/miss)."""
+        if not is_cacheable(question):
+            return None
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT answer, expires, latency FROM answers WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None or row[1] < now:
+                # Expired rows stay (for `get_stale`) until overwritten or evicted
+                self.misses += 1
+                perf_metrics.incr('ai_cache.misses')
+                return None
+            answer, _, latency = row
+            self._db.execute("UPDATE answers SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                             (now, key))
+            self._db.commit()
+            self.hits += 1
+            self.saved_seconds += latency
+        perf_metrics.incr('ai_cache.hits')
+        perf_metrics.record('ai_cache.saved_latency', latency)
+        return answer
+
+    def get_stale(self, question: str):
+        """Cached answer even if expired (fallback when the AI is unreachable)."""
+        if not is_cacheable(question):
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT answer FROM answers WHERE key = ?",
+                                   (normalize_question(question),)).fetchone()
+        return row[0] if row else None
+
+    def put(self, question: str, answer: str, latency: float = 0.0, ttl: float = None) -> bool:
+        """Store `answer`; `latency` is what generating it cost (reported as
+        saved time on later hits). False if the question isn't cacheable."""
+        if not answer or not is_cacheable(question):
+            return False
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (key, question, answer, created, expires, last_used, hits, latency) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (normalize_question(question), question, answer, now, now + ttl, now, latency))
+            self._evict_locked()
+            self._db.commit()
+        return True
+
+    def _evict_locked(self):
+        excess = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+        if excess > 0:
+            # Expired entries go first, then the least recently used
+            self._db.execute("DELETE FROM answers WHERE key IN (SELECT key FROM answers "
+                             "ORDER BY expires < ? DESC, last_used LIMIT ?)", (time.time(), excess))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+                'saved_seconds': self.saved_seconds,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Process-wide cache, or None if disabled (ANSWER_CACHE=0) or unusable."""
+    global _cache
+    if os.environ.get('ANSWER_CACHE', '1') == '0':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = AnswerCache()
+            except sqlite3.Error as e:
+                print(f"[AnswerCache] Disabled: {e}")
+                _cache = False
+        return _cache or None
@@ -0,0 +1,141 @@
+"""
+Answers that change over time (clock, date, weather), computed when asked.
+
+A knowledge-base answer like "{time}" names a provider here. Each provider
+keeps its last answer for its own TTL, so repeated questions don't
+recompute it. Slow providers (`background=True`, e.g. the weather scrape)
+are never run on the question path: the question gets the last known
+answer, even if expired, and a refresh starts in the background;
+`start_background_refresh()` keeps them fresh before anyone asks.
+
+Settings: `WEATHER_CITY` (default varkala), `WEATHER_TTL` (seconds,
+default 900).
+"""
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import perf_metrics
+
+WEATHER_CITY = os.environ.get('WEATHER_CITY', 'varkala')
+WEATHER_TTL = float(os.environ.get('WEATHER_TTL', '900'))
+
+_PLACEHOLDER = re.compile(r'^\{(\w+)\}$')
+
+
+class AnswerProvider:
+    def __init__(self, name: str, fn, ttl: float, background: bool = False,
+                 pending: str = None, unavailable: str = None):
+        self.name = name
+        self.fn = fn
+        self.ttl = ttl
+        self.background = background
+        # Said when there is no answer yet / the last attempt failed
+        self.pending = pending
+        self.unavailable = unavailable
+        self.value = None
+        self.updated = 0.0
+        self.failed = False
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def fresh(self) -> bool:
+        return self.value is not None and time.monotonic() - self.updated < self.ttl
+
+    def refresh(self):
+        """Compute a new answer; on errors the last one is kept."""
+        start = time.perf_counter()
+        try:
+            value = self.fn()
+        except Exception as e:
+            perf_metrics.incr(f'answers.{self.name}.errors')
+            print(f"[Answers] {self.name} failed: {e}")
+            value = None
+        perf_metrics.record(f'answers.{self.name}.refresh', time.perf_counter() - start)
+        with self._lock:
+            if value:
+                self.value = value
+                self.updated = time.monotonic()
+            self.failed = not value
+            self._refreshing = False
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True, name=f'Answer-{self.name}').start()
+
+    def get(self) -> str:
+        if self.fresh():
+            perf_metrics.incr(f'answers.{self.name}.hits')
+            return self.value
+        perf_metrics.incr(f'answers.{self.name}.misses')
+        if self.background:
+            self.refresh_in_background()
+        else:
+            self.refresh()
+        if self.value:
+            return self.value
+        return (self.unavailable if self.failed else None) or self.pending
+
+
+_providers = {}
+_refresher = None
+
+
+def register(name: str, fn, ttl: float, background: bool = False,
+             pending: str = None, unavailable: str = None) -> AnswerProvider:
+    """Make "{name}" answers come from `fn()`, cached for `ttl` seconds."""
+    provider = AnswerProvider(name, fn, ttl, background, pending, unavailable)
+    _providers[name] = provider
+    return provider
+
+
+def is_dynamic(answer) -> bool:
+    """Is `answer` a provider placeholder such as "{time}"?"""
+    match = _PLACEHOLDER.match(answer) if isinstance(answer, str) else None
+    return bool(match) and match.group(1) in _providers
+
+
+def render(answer):
+    """The provider's current answer for a placeholder, else `answer` itself."""
+    match = _PLACEHOLDER.match(answer) if isinstance(answer, str) else None
+    provider = _providers.get(match.group(1)) if match else None
+    return provider.get() if provider else answer
+
+
+def start_background_refresh(interval: float = 30.0) -> threading.Thread:
+    """Start (once) the thread keeping background providers fresh, so
+    questions never wait for them."""
+    global _refresher
+    if _refresher is not None:
+        return _refresher
+
+    def run():
+        while True:
+            for provider in list(_providers.values()):
+                # Renew a little before expiry
+                if provider.background and (provider.value is None or
+                                            time.monotonic() - provider.updated > provider.ttl * 0.8):
+                    provider.refresh_in_background()
+            time.sleep(interval)
+
+    _refresher = threading.Thread(target=run, daemon=True, name='AnswerRefresh')
+    _refresher.start()
+    return _refresher
+
+
+def _weather() -> str:
+    # Imported here: the scraper's dependencies are only needed when asked
+    from weather import get_weather_data
+    return get_weather_data(WEATHER_CITY)
+
+
+register('time', lambda: datetime.now().strftime("%M minutes past %I%p"), ttl=1.0)
+register('date', lambda: datetime.now().strftime("Today is %B %d %Y"), ttl=60.0)
+register('weather', _weather, ttl=WEATHER_TTL, background=True,
+         pending="I'm checking the weather right now. Please ask me again in a minute.",
+         unavailable="Sorry, the weather service is unavailable right now.")
@@ -0,0 +1,226 @@
+"""
+Cached microphone discovery shared by `main.py`, `sr_class.py` and the
+microphone helper scripts.
+
+Enumerating PortAudio devices re-initialises ALSA and is slow (and noisy) on
+the Pi, so the device is probed once and cached. Failed probes back off
+exponentially, and the cache is dropped when the sound-card list changes
+(USB mic plugged/unplugged), which is detected by watching /proc/asound/cards.
+
+The chosen device can be pinned with `MIC_DEVICE_INDEX`, or saved by
+`find_working_mic.py` / `fix_audio_device.py` into `audio_device.json`.
+"""
+import json
+import os
+import threading
+import time
+
+from alsa_error import no_alsa_error
+
+PREFERENCE_FILE = 'audio_device.json'
+ASOUND_CARDS = '/proc/asound/cards'
+# Substrings that mark a likely external/USB microphone, best first
+PREFERRED_NAMES = (("USB", "Hardware"), ("USB",), ("C-Media",), ("Webcam",), ("plughw",))
+# Index used by the original Pi wiring when nothing better is found
+FALLBACK_INDEX = 4
+
+
+def _sr():
+    # Imported lazily so callers that only need `is_available()` before the
+    # speech stack is loaded don't pay for PyAudio at import time.
+    import speech_recognition as sr
+    return sr
+
+
+def choose_device_index(names, preferred=None):
+    """Pick the best input device index from `names` (list of device names).
+
+    `preferred` is a `{'index': int, 'name': str}` dict; it wins if that
+    device is still present (matched by name first, then by index).
+    """
+    if preferred:
+        pname = preferred.get('name')
+        if pname and pname in names:
+            return names.index(pname)
+        pindex = preferred.get('index')
+        if pname is None and isinstance(pindex, int) and 0 <= pindex < len(names):
+            return pindex
+    for needles in PREFERRED_NAMES:
+        for i, name in enumerate(names):
+            if all(n in name for n in needles):
+                return i
+    return None
+
+
+def load_preference(path: str = PREFERENCE_FILE):
+    env_index = os.environ.get('MIC_DEVICE_INDEX')
+    if env_index not in (None, ''):
+        try:
+            return {'index': int(env_index), 'name': None}
+        except ValueError:
+            print(f"[AudioDevices] Ignoring invalid MIC_DEVICE_INDEX={env_index!r}")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_preference(index: int, name: str = None, path: str = PREFERENCE_FILE):
+    """Persist the chosen device so the next start skips the search."""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'index': index, 'name': name}, f)
+    os.replace(tmp, path)
+
+
+class AudioDeviceManager:
+    """Probe-once, cache-forever microphone selection with backoff and hotplug."""
+
+    def __init__(self, min_backoff: float = 1.0, max_backoff: float = 60.0,
+                 hotplug_interval: float = 2.0):
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.hotplug_interval = hotplug_interval
+        self._lock = threading.Lock()
+        self._microphone = None
+        self._device_index = None
+        self._device_names = None
+        self._backoff = min_backoff
+        self._next_probe = 0.0
+        self._failures = 0
+        self._signature = self._hardware_signature()
+        self._next_hotplug_check = 0.0
+
+    # --- hotplug -------------------------------------------------------
+    @staticmethod
+    def _hardware_signature():
+        """Cheap fingerprint of attached sound cards (None if unknown)."""
+        try:
+            with open(ASOUND_CARDS, 'r') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _check_hotplug(self, now: float):
+        if now < self._next_hotplug_check:
+            return
+        self._next_hotplug_check = now + self.hotplug_interval
+        sig = self._hardware_signature()
+        if sig != self._signature:
+            self._signature = sig
+            print("[AudioDevices] Sound hardware changed - re-probing microphone")
+            self._invalidate(reset_backoff=True)
+
+    def _invalidate(self, reset_backoff: bool = False):
+        self._microphone = None
+        self._device_index = None
+        self._device_names = None
+        if reset_backoff:
+            self._backoff = self.min_backoff
+            self._next_probe = 0.0
+            self._failures = 0
+
+    # --- probing -------------------------------------------------------
+    def list_devices(self, refresh: bool = False):
+        """Cached list of PortAudio device names."""
+        if self._device_names is None or refresh:
+            sr = _sr()
+            with no_alsa_error():
+                self._device_names = list(sr.Microphone.list_microphone_names())
+        return self._device_names
+
+    def open_device(self, index):
+        """Instantiate and briefly open `sr.Microphone(index)`; raises on failure."""
+        sr = _sr()
+        with no_alsa_error():
+            mic = sr.Microphone(device_index=index)
+            with mic:
+                pass
+        return mic
+
+    def _probe(self):
+        names = []
+        try:
+            names = self.list_devices(refresh=True)
+            for i, name in enumerate(names):
+                print(f"  Device {i}: {name}")
+        except Exception as e:
+            print(f"[AudioDevices] Error listing mics: {e}")
+
+        index = choose_device_index(names, load_preference())
+        if index is not None:
+            print(f"✅ Using microphone index {index} ({names[index]})")
+        elif len(names) > FALLBACK_INDEX:
+            print(f"⚠️ No USB Mic found, trying index {FALLBACK_INDEX}")
+            index = FALLBACK_INDEX
+        else:
+            print("⚠️ No USB Mic found, trying the default device")
+        mic = self.open_device(index)
+        self._device_index = index
+        return mic
+
+    def _refresh_locked(self, now: float):
+        self._check_hotplug(now)
+        if self._microphone is not None or now < self._next_probe:
+            return
+        print("\n[AudioDevices] Searching for microphone...")
+        try:
+            self._microphone = self._probe()
+            self._backoff = self.min_backoff
+            self._failures = 0
+        except Exception as e:
+            self._failures += 1
+            self._next_probe = now + self._backoff
+            print(f"[AudioDevices] Microphone unavailable ({e}); "
+                  f"retrying in {self._backoff:.1f}s")
+            self._backoff = min(self.max_backoff, self._backoff * 2)
+
+    # --- public API ----------------------------------------------------
+    def get_microphone(self):
+        """Return the cached `sr.Microphone`, probing only when allowed."""
+        with self._lock:
+            self._refresh_locked(time.time())
+            return self._microphone
+
+    def is_available(self) -> bool:
+        """Cheap per-frame check: True if a microphone is (or just became) usable."""
+        return self.get_microphone() is not None
+
+    def mark_failed(self):
+        """Report that the cached device stopped working (e.g. unplugged)."""
+        with self._lock:
+            self._invalidate()
+            self._next_probe = time.time() + self._backoff
+            self._backoff = min(self.max_backoff, self._backoff * 2)
+
+    @property
+    def device_index(self):
+        return self._device_index
+
+    def probe_all(self):
+        """Try to open every device; returns [(index, name, ok, error)].
+
+        Slow - only meant for the diagnostic scripts.
+        """
+        results = []
+        for i, name in enumerate(self.list_devices(refresh=True)):
+            try:
+                self.open_device(i)
+                results.append((i, name, True, None))
+            except Exception as e:
+                results.append((i, name, False, e))
+        return results
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_device_manager() -> AudioDeviceManager:
+    """Process-wide shared manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = AudioDeviceManager()
+        return _manager
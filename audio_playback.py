@@ -0,0 +1,174 @@
+"""
+Persistent in-process audio output.
+
+`pygame.mixer` is initialised once and keeps the output device open, MP3s are
+decoded in process into `pygame.mixer.Sound` buffers (recently used ones stay
+in memory), and playback can be stopped instantly for barge-in. This replaces
+forking `mpg321` for every utterance; `speaker.py` falls back to `mpg321` if
+the mixer can't be opened.
+
+`join(paths)` stitches several clips into one Sound (silence trimmed, short
+gaps between) so greetings can be assembled from cached segments.
+
+Settings: `SPEAKER_DEVICE` (ALSA device, passed to SDL as AUDIODEV),
+`SPEAKER_MIXER_RATE` (default 24000, gTTS's native rate), `SPEAKER_BUFFER`
+(mixer buffer in samples, default 1024).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import perf_metrics
+
+MIXER_RATE = int(os.environ.get('SPEAKER_MIXER_RATE', '24000'))
+MIXER_BUFFER = int(os.environ.get('SPEAKER_BUFFER', '1024'))
+# Decoded sounds kept in memory (short phrases are ~50-200 KB each)
+SOUND_CACHE_SIZE = 64
+# Pause inserted between joined segments, and the level (fraction of the
+# clip's peak) below which leading/trailing audio counts as silence
+SEGMENT_GAP = 0.08
+SEGMENT_SILENCE = 0.02
+
+
+class PlaybackEngine:
+    def __init__(self, device: str = None, rate: int = MIXER_RATE, buffer: int = MIXER_BUFFER):
+        self.device = device
+        self.rate = rate
+        self.buffer = buffer
+        self.available = False
+        self._lock = threading.Lock()
+        self._sounds = OrderedDict()  # path -> pygame Sound
+        self._channel = None
+        self._done = threading.Event()
+        self._done.set()
+        self._init_mixer()
+
+    def _init_mixer(self):
+        try:
+            if self.device and os.name == 'posix':
+                os.environ.setdefault('SDL_AUDIODRIVER', 'alsa')
+                os.environ.setdefault('AUDIODEV', self.device)
+            import pygame
+            self._pygame = pygame
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(frequency=self.rate, size=-16, channels=1, buffer=self.buffer)
+            self.rate, _, self.channels = pygame.mixer.get_init()
+            self._channel = pygame.mixer.Channel(0)
+            self.available = True
+        except Exception as e:
+            print(f"[Playback] In-process audio unavailable ({e}); using mpg321")
+            self.available = False
+
+    def load(self, path: str):
+        """Decoded Sound for `path` (memoized, LRU)."""
+        with self._lock:
+            sound = self._sounds.get(path)
+            if sound is not None:
+                self._sounds.move_to_end(path)
+                return sound
+        sound = self._pygame.mixer.Sound(path)
+        with self._lock:
+            self._sounds[path] = sound
+            while len(self._sounds) > SOUND_CACHE_SIZE:
+                self._sounds.popitem(last=False)
+        return sound
+
+    def pcm(self, sound) -> np.ndarray:
+        """Mono float PCM of `sound` at the mixer rate (for echo reference)."""
+        arr = self._pygame.sndarray.array(sound).astype(np.float64)
+        if arr.ndim > 1:
+            arr = arr.mean(axis=1)
+        return arr
+
+    def join(self, paths, gap: float = SEGMENT_GAP):
+        """One Sound made of the clips in `paths`, played back to back."""
+        key = ('join', tuple(paths), gap)
+        with self._lock:
+            sound = self._sounds.get(key)
+            if sound is not None:
+                self._sounds.move_to_end(key)
+                return sound
+        pieces = []
+        silence = None
+        for path in paths:
+            arr = _trim(self._pygame.sndarray.array(self.load(path)))
+            if silence is None:
+                silence = np.zeros((int(self.rate * gap),) + arr.shape[1:], dtype=arr.dtype)
+            elif len(silence):
+                pieces.append(silence)
+            pieces.append(arr)
+        sound = self._pygame.sndarray.make_sound(np.ascontiguousarray(np.concatenate(pieces)))
+        with self._lock:
+            self._sounds[key] = sound
+            while len(self._sounds) > SOUND_CACHE_SIZE:
+                self._sounds.popitem(last=False)
+        return sound
+
+    def play_file(self, path: str, on_start=None) -> bool:
+        """Play `path` and block until it ends or `stop()` is called.
+
+        `on_start(sound, start_time)` runs right after playback begins.
+        Returns False if playback was stopped early.
+        """
+        requested = time.perf_counter()
+        return self.play_sound(self.load(path), on_start, requested)
+
+    def play_sound(self, sound, on_start=None, requested: float = None) -> bool:
+        """Like `play_file` for an already decoded Sound."""
+        if requested is None:
+            requested = time.perf_counter()
+        length = sound.get_length()
+        self._done.clear()
+        self._channel.play(sound)
+        started = time.time()
+        perf_metrics.record('playback.start_latency', time.perf_counter() - requested)
+        if on_start:
+            on_start(sound, started)
+        # Sleep for the clip's duration; stop() wakes us immediately
+        stopped = self._done.wait(length)
+        while not stopped and self._channel.get_busy():
+            # Mixer buffering can run a few ms past the nominal length
+            stopped = self._done.wait(0.02)
+        self._done.set()
+        return not stopped
+
+    def stop(self):
+        """Stop playback immediately (barge-in)."""
+        if self.available:
+            try:
+                self._channel.stop()
+            except Exception:
+                pass
+        self._done.set()
+
+    def forget(self, path: str):
+        with self._lock:
+            self._sounds.pop(path, None)
+
+
+def _trim(arr: np.ndarray) -> np.ndarray:
+    """Drop leading/trailing near-silence (TTS engines pad every clip)."""
+    level = np.abs(arr.astype(np.int32))
+    if level.ndim > 1:
+        level = level.max(axis=1)
+    peak = level.max() if len(level) else 0
+    if peak == 0:
+        return arr[:0]
+    loud = np.flatnonzero(level > peak * SEGMENT_SILENCE)
+    return arr[loud[0]:loud[-1] + 1]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_playback_engine(device: str = None) -> PlaybackEngine:
+    """Process-wide engine (the output device is opened once)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PlaybackEngine(device=device)
+        return _engine
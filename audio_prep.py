@@ -0,0 +1,121 @@
+"""
+Audio conditioning applied to each captured phrase before it is sent to
+Google speech recognition:
+
+1. trim leading/trailing silence with a simple energy VAD
+2. resample to 16 kHz mono 16-bit (USB mics usually capture at 44.1/48 kHz)
+3. normalise the level
+4. pre-encode FLAC once, so the upload size can be recorded and the
+   recognizer reuses the same bytes instead of encoding again
+
+Disable with `ASR_PREP=0`; skip the FLAC pre-encode with `ASR_FLAC=0`.
+"""
+import os
+
+import numpy as np
+import speech_recognition as sr
+
+import perf_metrics
+
+TARGET_RATE = 16000
+FRAME_SECONDS = 0.02
+# Silence kept around the detected speech so word edges aren't clipped
+PAD_SECONDS = 0.25
+# Frames louder than noise floor * ratio (and above MIN_SPEECH_RMS) are speech
+VAD_RATIO = 3.0
+MIN_SPEECH_RMS = 150.0
+TARGET_PEAK = 0.7 * 32767
+MAX_GAIN = 8.0
+
+
+def prep_enabled() -> bool:
+    return os.environ.get('ASR_PREP', '1') != '0'
+
+
+class EncodedAudioData(sr.AudioData):
+    """AudioData that remembers its FLAC encoding so it is only done once."""
+
+    def __init__(self, frame_data, sample_rate, sample_width):
+        super().__init__(frame_data, sample_rate, sample_width)
+        self._flac_cache = {}
+
+    def get_flac_data(self, convert_rate=None, convert_width=None):
+        key = (convert_rate, convert_width)
+        if key not in self._flac_cache:
+            self._flac_cache[key] = super().get_flac_data(convert_rate, convert_width)
+        return self._flac_cache[key]
+
+
+def trim_silence(samples: np.ndarray, rate: int):
+    """Return `samples` cut to the speech region, or None if there is no speech."""
+    frame = max(1, int(rate * FRAME_SECONDS))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return None
+    frames = samples[:n_frames * frame].astype(np.float64).reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    noise_floor = np.percentile(rms, 20)
+    speech = np.nonzero(rms > max(noise_floor * VAD_RATIO, MIN_SPEECH_RMS))[0]
+    if len(speech) == 0:
+        return None
+    pad = int(PAD_SECONDS * rate)
+    start = max(0, speech[0] * frame - pad)
+    end = min(len(samples), (speech[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def resample(samples: np.ndarray, rate: int, target: int = TARGET_RATE) -> np.ndarray:
+    """Linear-interpolation resampler with a small windowed-sinc anti-alias filter."""
+    if rate == target or len(samples) == 0:
+        return samples.astype(np.float64)
+    x = samples.astype(np.float64)
+    if rate > target:
+        cutoff = 0.45 * target / rate
+        taps = np.arange(-15, 16)
+        kernel = np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        x = np.convolve(x, kernel / kernel.sum(), mode='same')
+    n_out = int(round(len(x) * target / float(rate)))
+    return np.interp(np.arange(n_out) * (rate / float(target)), np.arange(len(x)), x)
+
+
+def normalize(samples: np.ndarray) -> np.ndarray:
+    peak = np.max(np.abs(samples)) if len(samples) else 0
+    if peak <= 0:
+        return samples
+    gain = min(MAX_GAIN, TARGET_PEAK / peak)
+    return samples * gain
+
+
+def condition_audio(audio_data: sr.AudioData, encode_flac: bool = None):
+    """Trim, resample, normalise (and optionally FLAC-encode) `audio_data`.
+
+    Returns an `EncodedAudioData`, or None when the phrase contains no speech
+    (so the caller can skip the network round trip entirely).
+    """
+    if encode_flac is None:
+        encode_flac = os.environ.get('ASR_FLAC', '1') != '0'
+
+    raw = audio_data.get_raw_data(convert_width=2)
+    samples = np.frombuffer(raw, dtype=np.int16)
+    perf_metrics.record('asr.captured_seconds', len(samples) / float(audio_data.sample_rate))
+
+    trimmed = trim_silence(samples, audio_data.sample_rate)
+    if trimmed is None:
+        perf_metrics.incr('asr.skipped_silent')
+        return None
+    out = normalize(resample(trimmed, audio_data.sample_rate))
+    pcm = np.clip(out, -32768, 32767).astype(np.int16).tobytes()
+    conditioned = EncodedAudioData(pcm, TARGET_RATE, 2)
+    perf_metrics.record('asr.upload_seconds_audio', len(out) / float(TARGET_RATE))
+
+    if encode_flac:
+        try:
+            # Same arguments Recognizer.recognize_google uses for 16 kHz input
+            flac = conditioned.get_flac_data(convert_rate=None, convert_width=2)
+            perf_metrics.record('asr.upload_bytes', len(flac))
+            perf_metrics.incr('asr.bytes_sent', len(flac))
+        except Exception as e:
+            # e.g. no `flac` binary; the recognizer will report the real error
+            if os.environ.get('OMNIS_DEBUG') == '1':
+                print(f"[DEBUG] FLAC pre-encode failed: {e}")
+    return conditioned
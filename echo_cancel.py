@@ -0,0 +1,188 @@
+"""
+Acoustic echo cancellation so the microphone can stay open while OMNIS talks.
+
+The speaker publishes the PCM it is about to play into `echo_reference`. The
+listener wraps its microphone in `EchoCancellingSource`, which looks up the
+reference samples that were playing while each mic chunk was captured and
+removes their echo with a block NLMS adaptive filter before the audio reaches
+`Recognizer.listen()`.
+
+Enable with `OMNIS_AEC=1`. Tuning:
+- `AEC_DELAY_MS`: playback start -> sound reaching the mic (default 120)
+- `AEC_TAIL_MS`: echo tail covered by the adaptive filter (default 32)
+- `AEC_STEP`: NLMS step size, 0..1 (default 0.5)
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import speech_recognition as sr
+
+
+def aec_enabled() -> bool:
+    return os.environ.get('OMNIS_AEC') == '1'
+
+
+class NLMSEchoCanceller:
+    """Block normalised-LMS filter estimating the echo path from a reference.
+
+    Audio is filtered in small sub-blocks (one matrix product each) and the
+    weights are updated once per sub-block, which keeps it fast enough for
+    the Pi with numpy while still converging within a fraction of a second.
+    The update is normalised by the energy of the whole sub-block, so it is
+    stable for any `step` in 0..1 even on coloured (speech-like) references.
+    If the weights still blow up (clipping, a burst of non-finite input) the
+    filter starts over rather than amplifying the echo.
+    """
+
+    # Residual this many times louder than the microphone means divergence
+    DIVERGED = 1e4
+
+    def __init__(self, filter_len: int = 512, step: float = 0.5, eps: float = 1e-6,
+                 block: int = 64):
+        self.filter_len = filter_len
+        self.step = step
+        self.block = block
+        self.eps = eps
+        self.weights = np.zeros(filter_len, dtype=np.float64)
+        self._history = np.zeros(filter_len - 1, dtype=np.float64)
+        self.resets = 0
+
+    def reset(self):
+        self.weights[:] = 0
+        self._history[:] = 0
+
+    def process(self, mic: np.ndarray, ref: np.ndarray) -> np.ndarray:
+        """Return `mic` with the estimated echo of `ref` removed (float64)."""
+        mic = np.asarray(mic, dtype=np.float64)
+        ref = np.asarray(ref, dtype=np.float64)
+        full = np.concatenate((self._history, ref))
+        self._history = full[-(self.filter_len - 1):]
+        if not np.any(full):
+            # Nothing playing: pass the microphone straight through
+            return mic
+
+        # Row i holds ref[i], ref[i-1], ..., ref[i-L+1]
+        windows = np.lib.stride_tricks.sliding_window_view(full, self.filter_len)[:, ::-1]
+        error = np.empty_like(mic)
+        for start in range(0, len(mic), self.block):
+            x = windows[start:start + self.block]
+            target = mic[start:start + self.block]
+            e = target - x @ self.weights
+            if not np.all(np.isfinite(e)) or e @ e > self.DIVERGED * (target @ target + self.eps):
+                # Diverged: the estimate is worse than no filter at all
+                self.weights[:] = 0
+                self.resets += 1
+                e = target.copy()
+            # Normalised by the energy of the whole sub-block
+            norm = np.einsum('ij,ij->', x, x)
+            self.weights += self.step * (x.T @ e) / (norm + self.eps)
+            error[start:start + self.block] = e
+        return error
+
+
+class EchoReference:
+    """Thread-safe timeline of PCM the speaker has played (or is playing)."""
+
+    def __init__(self, max_seconds: float = 120.0):
+        self._lock = threading.Lock()
+        self._clips = deque()
+        self.max_seconds = max_seconds
+
+    def publish(self, pcm: np.ndarray, sample_rate: int, start_time: float = None):
+        """Register mono `pcm` that starts playing at `start_time` (default now)."""
+        start_time = time.time() if start_time is None else start_time
+        clip = (start_time, sample_rate, np.asarray(pcm, dtype=np.float64))
+        with self._lock:
+            self._clips.append(clip)
+            while self._clips and self._clips[0][0] + len(self._clips[0][2]) / self._clips[0][1] \
+                    < start_time - self.max_seconds:
+                self._clips.popleft()
+
+    def clear(self):
+        """Forget everything (called when playback is interrupted)."""
+        with self._lock:
+            self._clips.clear()
+
+    def get(self, start_time: float, n_samples: int, sample_rate: int) -> np.ndarray:
+        """Reference samples (at `sample_rate`) playing during the given window."""
+        out = np.zeros(n_samples, dtype=np.float64)
+        t = start_time + np.arange(n_samples) / float(sample_rate)
+        end_time = t[-1] if n_samples else start_time
+        with self._lock:
+            clips = list(self._clips)
+        for clip_start, clip_rate, pcm in clips:
+            clip_end = clip_start + len(pcm) / clip_rate
+            if clip_end < start_time or clip_start > end_time:
+                continue
+            pos = (t - clip_start) * clip_rate
+            inside = (pos >= 0) & (pos < len(pcm) - 1)
+            if np.any(inside):
+                out[inside] += np.interp(pos[inside], np.arange(len(pcm)), pcm)
+        return out
+
+    def is_active(self, at: float = None) -> bool:
+        at = time.time() if at is None else at
+        with self._lock:
+            return any(s <= at <= s + len(p) / r for s, r, p in self._clips)
+
+
+# Shared between speaker.py (producer) and sr_class.py (consumer)
+echo_reference = EchoReference()
+
+
+class _CancellingStream:
+    def __init__(self, source, canceller: NLMSEchoCanceller, reference: EchoReference,
+                 delay: float):
+        self._source = source
+        self._canceller = canceller
+        self._reference = reference
+        self._delay = delay
+
+    def read(self, size):
+        raw = self._source.stream.read(size)
+        captured_at = time.time()
+        width = self._source.SAMPLE_WIDTH
+        if width != 2 or not raw:
+            return raw
+        mic = np.frombuffer(raw, dtype=np.int16)
+        rate = self._source.SAMPLE_RATE
+        chunk_start = captured_at - len(mic) / float(rate) - self._delay
+        ref = self._reference.get(chunk_start, len(mic), rate)
+        cleaned = self._canceller.process(mic, ref)
+        return np.clip(cleaned, -32768, 32767).astype(np.int16).tobytes()
+
+    def close(self):
+        return self._source.stream.close()
+
+
+class EchoCancellingSource(sr.AudioSource):
+    """`sr.AudioSource`-compatible wrapper that echo-cancels another source."""
+
+    def __init__(self, source, reference: EchoReference = None):
+        # sr.AudioSource.__init__ only raises NotImplementedError, so skip it
+        self.source = source
+        self.reference = reference or echo_reference
+        self.delay = float(os.environ.get('AEC_DELAY_MS', '120')) / 1000.0
+        self.tail = float(os.environ.get('AEC_TAIL_MS', '32')) / 1000.0
+        self.step = float(os.environ.get('AEC_STEP', '0.5'))
+        self.canceller = None
+        self.stream = None
+
+    def __getattr__(self, name):
+        # SAMPLE_RATE, SAMPLE_WIDTH, CHUNK, format... come from the real source
+        return getattr(self.source, name)
+
+    def __enter__(self):
+        self.source.__enter__()
+        if self.canceller is None:
+            taps = max(16, int(self.tail * self.source.SAMPLE_RATE))
+            self.canceller = NLMSEchoCanceller(filter_len=taps, step=self.step)
+        self.stream = _CancellingStream(self.source, self.canceller, self.reference, self.delay)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+        return self.source.__exit__(exc_type, exc_value, traceback)
@@ -1,12 +1,12 @@
-import speech_recognition as sr
-import os
+from audio_devices import get_device_manager, save_preference, PREFERENCE_FILE
 
 print("="*60)
 print("🔎 SCIENTIFIC MICROPHONE FINDER")
 print("="*60)
 
+manager = get_device_manager()
 try:
-    mics = sr.Microphone.list_microphone_names()
+    mics = manager.list_devices(refresh=True)
 except Exception as e:
     print(f"Error listing: {e}")
     mics = []
@@ -15,31 +15,25 @@ working_index = None
 
 print(f"\nFound {len(mics)} potential devices. Testing each one...\n")
 
-for i, name in enumerate(mics):
+# Try to open every device once (the manager opens and closes the stream)
+for i, name, ok, error in manager.probe_all() if mics else []:
     print(f"Testing Index {i}: '{name}'...", end="", flush=True)
-    try:
-        # Try to open the mic with this index
-        mic = sr.Microphone(device_index=i) 
-        with mic as source:
-            # Just try to listen for a split second to see if the stream opens
-            # We use a tiny timeout to fail fast
-            pass
+    if ok:
         print(f" ✅ PASS! (Stream opened)")
-        
+
         # If we successfully opened it, this is likely our winner
         # We prefer USB devices, but if we found one that opened, we take note
         if working_index is None:
             working_index = i
-        
+
         # If it's explicitly a USB device, it updates our best guess
         if "USB" in name or "Webcam" in name or "C-Media" in name:
             working_index = i
             print("   (Preferred USB device found!)")
-
-    except Exception as e:
+    else:
         # Most devices (like HDMI) will fail here, which is normal
-        error_msg = str(e)
-        if "monitor" in error_msg or "output" in error_msg: 
+        error_msg = str(error)
+        if "monitor" in error_msg or "output" in error_msg:
              print(" ❌ Skipped (Output only)")
         else:
              print(f" ❌ FAILED")
@@ -47,22 +41,13 @@ for i, name in enumerate(mics):
 print("\n" + "="*60)
 if working_index is not None:
     print(f"🎉 WINNER: Use Index {working_index} ({mics[working_index]})")
-    
-    # Auto-update the file if found
+
+    # Save the choice; OMNIS's shared device manager picks it up on next start
     try:
-        with open('sr_class.py', 'r') as f:
-            content = f.read()
-            
-        import re
-        # Smart replacement of device_index=...
-        new_content = re.sub(r'device_index=\d+', f'device_index={working_index}', content)
-        
-        with open('sr_class.py', 'w') as f:
-            f.write(new_content)
-        print(f"✅ Automatically updated sr_class.py to index {working_index}")
-        
+        save_preference(working_index, mics[working_index])
+        print(f"✅ Saved microphone choice to {PREFERENCE_FILE}")
     except Exception as e:
-        print(f"Could not auto-update: {e}")
+        print(f"Could not save choice: {e}")
 else:
     print("😭 FATAL: No working microphone input found on this Raspberry Pi.")
     print("Please check if your USB microphone is plugged in correctly.")
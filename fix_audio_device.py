@@ -1,21 +1,18 @@
-import speech_recognition as sr
-import os
+from audio_devices import get_device_manager, choose_device_index, save_preference, PREFERENCE_FILE
 
 print("Scanning for microphones...")
 try:
-    mics = sr.Microphone.list_microphone_names()
+    mics = get_device_manager().list_devices(refresh=True)
 except Exception as e:
     print(f"Error listing mics: {e}")
     mics = []
 
-usb_mic_index = None
-
 print("\nAvailable Microphones:")
 for i, mic_name in enumerate(mics):
     print(f"{i}: {mic_name}")
-    # Look for common USB mic names
-    if "USB" in mic_name or "Webcam" in mic_name or "plughw" in mic_name or "C-Media" in mic_name:
-        usb_mic_index = i
+
+# Look for common USB mic names (same rules OMNIS uses at runtime)
+usb_mic_index = choose_device_index(mics)
 
 # Default to index 1 if a USB one wasn't explicitly named (Pi's onboard audio is usually 0)
 if usb_mic_index is None:
@@ -26,25 +23,11 @@ if usb_mic_index is None:
 
 print(f"\n✅ Auto-Selected Microphone Index: {usb_mic_index}")
 
-print("Updating sr_class.py...")
+print(f"Saving choice to {PREFERENCE_FILE}...")
 try:
-    with open('sr_class.py', 'r') as f:
-        content = f.read()
-
-    # We need to replace ALL instances of sr.Microphone() with sr.Microphone(device_index=X)
-    # But first, let's remove any previous patches to ensure a clean state
-    # This regex-like replace is safer
-    
-    # Reset to default first to avoid double patching keys
-    content = content.replace("device_index=", "")
-    content = content.replace("sr.Microphone()", f"sr.Microphone(device_index={usb_mic_index})")
-    
-    # Fix potential double closing parenthesis if we messed up
-    content = content.replace("))", ")")
-
-    with open('sr_class.py', 'w') as f:
-        f.write(content)
-    print(f"✅ sr_class.py updated to use Device Index {usb_mic_index}")
+    name = mics[usb_mic_index] if usb_mic_index < len(mics) else None
+    save_preference(usb_mic_index, name)
+    print(f"✅ OMNIS will use Device Index {usb_mic_index}")
 
 except Exception as e:
-    print(f"❌ Error updating file: {e}")
+    print(f"❌ Error saving choice: {e}")
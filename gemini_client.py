@@ -0,0 +1,95 @@
+"""
+Long-lived Gemini client shared by every question.
+
+`google.generativeai` is imported on first use (it is slow to import on a
+Pi), the `GenerativeModel` and its transport channel are built once and
+reused, and `genai.configure` only runs again when the API key changes.
+`start_warmup(key)` opens the connection in the background at startup so the
+first student question doesn't pay for DNS, TLS and channel setup.
+
+Settings: `GEMINI_MODEL` (default gemini-2.5-flash), `GEMINI_TRANSPORT`
+('grpc' or 'rest'; library default if unset).
+"""
+import os
+import threading
+import time
+
+import perf_metrics
+
+MODEL_NAME = os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')
+SYSTEM_INSTRUCTION = ("You are OMNIS, a helpful school assistant robot. "
+                      "Keep answers brief and concise. "
+                      "Be friendly and to the point.")
+
+
+class GeminiClient:
+    def __init__(self, model_name: str = MODEL_NAME, system_instruction: str = SYSTEM_INSTRUCTION,
+                 transport: str = None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.transport = transport or os.environ.get('GEMINI_TRANSPORT') or None
+        self._lock = threading.Lock()
+        self._genai = None
+        self._model = None
+        self._key = None
+        self.warmed = threading.Event()
+
+    @property
+    def genai(self):
+        if self._genai is None:
+            start = time.perf_counter()
+            import google.generativeai as genai
+            self._genai = genai
+            perf_metrics.record('ai.import', time.perf_counter() - start)
+        return self._genai
+
+    def model(self, key: str):
+        """The shared GenerativeModel, rebuilt only if `key` changed."""
+        with self._lock:
+            if self._model is None or key != self._key:
+                start = time.perf_counter()
+                genai = self.genai
+                kwargs = {'transport': self.transport} if self.transport else {}
+                genai.configure(api_key=key, **kwargs)
+                self._model = genai.GenerativeModel(self.model_name,
+                                                    system_instruction=self.system_instruction)
+                self._key = key
+                perf_metrics.record('ai.client_setup', time.perf_counter() - start)
+                perf_metrics.incr('ai.client_builds')
+            return self._model
+
+    def generation_config(self, max_tokens: int, temperature: float):
+        return self.genai.types.GenerationConfig(max_output_tokens=max_tokens,
+                                                 temperature=temperature)
+
+    def warm_up(self, key: str) -> bool:
+        """Build the model and open its connection with a free request."""
+        start = time.perf_counter()
+        try:
+            # count_tokens goes through the same service channel as
+            # generate_content but doesn't use generation quota
+            self.model(key).count_tokens("Hello")
+        except Exception as e:
+            print(f"[AI] Warm-up failed: {e}")
+            return False
+        perf_metrics.record('ai.warmup', time.perf_counter() - start)
+        self.warmed.set()
+        return True
+
+    def start_warmup(self, key: str) -> threading.Thread:
+        t = threading.Thread(target=self.warm_up, args=(key,), daemon=True, name='GeminiWarmup')
+        t.start()
+        return t
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gemini_client() -> GeminiClient:
+    """Process-wide client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
@@ -0,0 +1,133 @@
+"""
+Fixed phrases spoken by `main.py` and `sr_class.py`. Kept in one place so the
+TTS warm-up job can pre-synthesize exactly the strings they will ask for.
+"""
+import time
+
+SCHOOL_WELCOME = "Welcome to MGM Model School. I am OMNIS."
+UNKNOWN_GREETING = "Hello there!"
+TIME_GREETINGS = ("Good morning", "Good afternoon", "Good evening")
+SALUTATION = "Hello"
+CASUAL_SALUTATION = "Hello there"
+NAME_JOINER = "and"
+EVERYONE = "everyone"
+# Names read out in one group greeting; a bigger crowd is "A, B, C and everyone"
+MAX_GREETING_NAMES = 4
+
+# Replies used by the speech thread
+ACK_PHRASE = "Yes, how can I help you?"
+NOT_UNDERSTOOD_PHRASE = "Sorry, I couldn't process that."
+NO_NAME_PHRASE = "I didn't catch a name."
+SAVE_FAILED_PHRASE = "Sorry, I couldn't save your name."
+
+STOCK_PHRASES = [UNKNOWN_GREETING, ACK_PHRASE, NOT_UNDERSTOOD_PHRASE,
+                 NO_NAME_PHRASE, SAVE_FAILED_PHRASE]
+
+
+def get_time_based_greeting(hour: int = None) -> str:
+    h = int(time.strftime('%H')) if hour is None else hour
+    if h < 12: return "Good morning"
+    elif h < 17: return "Good afternoon"
+    else: return "Good evening"
+
+
+def full_greeting(person: str, greeting_time: str = None) -> str:
+    """First sighting since boot: formal greeting."""
+    greeting_time = greeting_time or get_time_based_greeting()
+    return f"{SALUTATION} {person}, {greeting_time}. {SCHOOL_WELCOME}"
+
+
+def casual_greeting(person: str) -> str:
+    """Returning or standing person."""
+    return f"{CASUAL_SALUTATION} {person}!"
+
+
+def greeting_variants(person: str) -> list:
+    """Every greeting string `main.py` can produce for `person`."""
+    return [full_greeting(person, t) for t in TIME_GREETINGS] + [casual_greeting(person)]
+
+
+# Greetings can also be played as a chain of separately cached clips
+# (`speaker.speak(..., segments=...)`): the fixed parts are shared by
+# everyone, so a new name costs one short synthesis instead of four
+# full sentences.
+GREETING_PARTS = [SALUTATION, CASUAL_SALUTATION, NAME_JOINER, EVERYONE, *TIME_GREETINGS, SCHOOL_WELCOME]
+
+
+def full_greeting_segments(person: str, greeting_time: str = None) -> list:
+    """`full_greeting` split into cacheable segments."""
+    return [SALUTATION, person, greeting_time or get_time_based_greeting(), SCHOOL_WELCOME]
+
+
+def casual_greeting_segments(person: str) -> list:
+    return [CASUAL_SALUTATION, person]
+
+
+def join_names(names) -> str:
+    """"Rishi", "Rishi and Suji", "Rishi, Suji and Gayathri"."""
+    names = list(names)
+    if len(names) < 2:
+        return ''.join(names)
+    return f"{', '.join(names[:-1])} {NAME_JOINER} {names[-1]}"
+
+
+def group_greeting(names, formal: bool, greeting_time: str = None, max_names: int = MAX_GREETING_NAMES):
+    """One greeting for several people: (text, segments). Past `max_names`
+    people, the first few are named and the rest are "everyone"."""
+    names = list(names)
+    if len(names) > max_names:
+        names = names[:max(1, max_names - 1)] + [EVERYONE]
+    if len(names) == 1:
+        if formal:
+            return full_greeting(names[0], greeting_time), full_greeting_segments(names[0], greeting_time)
+        return casual_greeting(names[0]), casual_greeting_segments(names[0])
+    name_segments = names[:-1] + [NAME_JOINER, names[-1]]
+    if formal:
+        greeting_time = greeting_time or get_time_based_greeting()
+        text = f"{greeting_time} {join_names(names)}. {SCHOOL_WELCOME}"
+        return text, [greeting_time, *name_segments, SCHOOL_WELCOME]
+    return f"{CASUAL_SALUTATION} {join_names(names)}!", [CASUAL_SALUTATION, *name_segments]
+
+
+class GreetingBatcher:
+    """Collects people to greet for a short window, then greets them together.
+
+    `main.py` still decides *whether* someone gets greeted (cooldown and
+    re-entry rules); the batcher only decides *when* and merges arrivals, so
+    three students walking in together hear one sentence instead of three.
+    A batch is formal if anyone in it is being greeted for the first time.
+    """
+
+    def __init__(self, window: float = 1.2, max_names: int = MAX_GREETING_NAMES):
+        self.window = window
+        self.max_names = max_names
+        self._pending = {}  # person -> formal, in arrival order
+        self._opened = None
+
+    def add(self, person: str, formal: bool, now: float = None):
+        now = time.time() if now is None else now
+        if self._opened is None:
+            self._opened = now
+        self._pending[person] = self._pending.get(person, False) or formal
+
+    def __contains__(self, person):
+        return person in self._pending
+
+    def __len__(self):
+        return len(self._pending)
+
+    def due(self, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        return self._opened is not None and now - self._opened >= self.window
+
+    def flush(self):
+        """(text, segments, names) for everyone pending, or None. `names`
+        lists everyone, including those the greeting calls "everyone"."""
+        if not self._pending:
+            return None
+        names = list(self._pending)
+        formal = any(self._pending.values())
+        self._pending.clear()
+        self._opened = None
+        text, segments = group_greeting(names, formal, max_names=self.max_names)
+        return text, segments, names
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Index build time and query latency of the knowledge-base search.
+
+Indexes the school knowledge base padded with generated entries
+(timetables, circulars, clubs) to the requested size, then times BM25
+queries for the corpus questions and fuzzy correction of misspelled ones:
+
+    python kb_benchmark.py                  # 5000 entries, 2000 queries
+    python kb_benchmark.py --entries 20000
+
+Exits with status 1 if a p95 latency is over `--max-query-ms`.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import perf_metrics
+import school_data
+from kb_search import BM25Index, FuzzyMatcher, words
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, 'benchmarks', 'speech_corpus.json')
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+SUBJECTS = ['maths', 'physics', 'chemistry', 'biology', 'english', 'malayalam', 'hindi',
+            'history', 'geography', 'computer science', 'economics', 'art', 'music']
+CLUBS = ['debate', 'robotics', 'eco', 'chess', 'drama', 'astronomy', 'quiz', 'literary']
+EVENTS = ['sports day', 'annual day', 'science fair', 'parent teacher meeting', 'exam',
+          'field trip', 'blood donation camp', 'onam celebration', 'christmas party']
+
+
+def generated_documents(n: int, seed: int = 0) -> list:
+    """`n` plausible (question, answer) entries."""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        kind = i % 3
+        grade = rng.randint(1, 12)
+        division = rng.choice('ABCDE')
+        if kind == 0:
+            day, subject = rng.choice(DAYS), rng.choice(SUBJECTS)
+            period = rng.randint(1, 8)
+            docs.append((f"Which subject does class {grade} {division} have in period {period} on {day}?",
+                         f"Class {grade} {division} has {subject} in period {period} on {day}."))
+        elif kind == 1:
+            event = rng.choice(EVENTS)
+            docs.append((f"When is the {event} for class {grade}? Circular {i}",
+                         f"Circular {i}: the {event} for class {grade} is on the "
+                         f"{rng.randint(1, 28)}th of {rng.choice(['June', 'August', 'November', 'January'])}."))
+        else:
+            club = rng.choice(CLUBS)
+            docs.append((f"When does the {club} club for class {grade} meet?",
+                         f"The {club} club for class {grade} meets on {rng.choice(DAYS)} "
+                         f"in room {rng.randint(100, 400)}."))
+    return docs
+
+
+def corpus_questions(path: str) -> list:
+    with open(path) as f:
+        corpus = json.load(f)
+    questions = [u.get('text', '') for u in corpus.get('utterances', corpus)]
+    return [q for q in questions if q] or ["who is our principal"]
+
+
+def misspell(question: str) -> str:
+    """Drop a letter from the longest word, as speech recognition might."""
+    longest = max(question.split(), key=len, default='')
+    return question.replace(longest, longest[:2] + longest[3:], 1) if len(longest) > 4 else question
+
+
+def timed(fn, items: list, n: int) -> dict:
+    latencies = []
+    for i in range(n):
+        t = time.perf_counter()
+        fn(items[i % len(items)])
+        latencies.append(time.perf_counter() - t)
+    return perf_metrics.summarize(latencies)
+
+
+def report(label: str, stats: dict):
+    print(f"{label} over {stats['count']} queries: mean {stats['mean'] * 1000:.3f} ms, "
+          f"p50 {stats['p50'] * 1000:.3f} ms, p95 {stats['p95'] * 1000:.3f} ms, max {stats['max'] * 1000:.3f} ms")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--max-query-ms', type=float, default=9.0)
+    args = parser.parse_args(argv)
+
+    docs = school_data.knowledge_documents()
+    docs += generated_documents(max(0, args.entries - len(docs)))
+    questions = corpus_questions(args.corpus) + [q for q, _ in docs[:50]]
+
+    start = time.perf_counter()
+    index = BM25Index(docs)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    fuzzy = FuzzyMatcher({w for doc in docs for text in doc for w in words(text)})
+    fuzzy_build = time.perf_counter() - start
+
+    query = timed(index.search, questions, args.queries)
+    correction = timed(lambda q: fuzzy.correct(words(q)), [misspell(q) for q in questions], args.queries)
+
+    print(f"Indexed {len(index)} entries ({len(index.vocab)} terms) in {build * 1000:.1f} ms, "
+          f"fuzzy keys ({len(fuzzy.vocab)} words) in {fuzzy_build * 1000:.1f} ms")
+    report("Query latency", query)
+    report("Fuzzy correction", correction)
+    if max(query['p95'], correction['p95']) * 1000 > args.max_query_ms:
+        print(f"❌ p95 latency over {args.max_query_ms} ms")
+        return 1
+    print("✅ Query latency within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,453 @@
+"""
+Search indexes over the school knowledge base.
+
+`KeywordIndex` compiles the stored questions (CUSTOM_QA) and keyword lists
+(METADATA) into an inverted index (word -> entries), so a lookup only
+looks at entries sharing a word with the question, and keywords match whole
+words ("old" doesn't match "hold").
+
+`BM25Index` ranks every entry for questions those miss. Each entry (a
+stored question or keyword list plus its answer) is a document. At build
+time the BM25 weight of every (term, document) pair is precomputed into
+term-major numpy arrays, so a query is a few array slices and one
+`np.bincount`: thousands of entries answer in well under a millisecond on a
+Pi (see `kb_benchmark.py`). Sharing a word or two with an entry is not
+enough to answer from it; the best entry must
+- contain at least `KB_CONFIDENCE` (default 0.55) of the question's words,
+  weighted by idf; words the knowledge base never uses count fully against
+  it ("who is the prime minister")
+- share two content words with the question, or its only one ("is there a
+  counselor")
+- beat the runner-up by `KB_MARGIN` (default 1.1 times its score), so
+  "what is the mgm school", which fits several entries equally, isn't
+  decided by a tie
+- ask the same kind of question: "who", "when", "where", "why" and "how"
+  in the question must also be in the entry, if the entry has question
+  words ("who is the chief minister" is not "which chief minister visited")
+Otherwise the question is handed to the AI. When the AI can't answer
+either, `related_answer` drops the margin and two-word rules and takes the
+best entry asking the same kind of question that covers
+`KB_RELATED_CONFIDENCE` (default 0.6) of it: a related school fact beats an
+apology.
+
+`FuzzyMatcher` repairs speech-recognition near misses before a second try:
+"principle" -> "principal", "MG M" -> "mgm", "inaugurated" -> the
+knowledge base's "inagurated". Every knowledge-base word is indexed by its
+character trigrams and a phonetic key, so a misheard word is only compared
+with words sharing a trigram or sounding the same. Only close matches are
+taken (`KB_FUZZY_MIN`, or half the trigrams for words that sound alike, so
+"prime" stays "prime" rather than becoming "prem"), never another form of
+the word ("india", "indian"), and the corrected question must then match
+at `KB_FUZZY_CONFIDENCE` (default 0.8) rather than `KB_CONFIDENCE`, and on
+more than the corrected word alone ("what is data" is not "what date").
+
+Settings: `KB_CONFIDENCE`, `KB_MARGIN`, `KB_RELATED_CONFIDENCE`, `KB_BM25_K1` (default 1.5), `KB_BM25_B` (0.75),
+`KB_FUZZY_MIN` (trigram similarity accepted without a phonetic match,
+default 0.7), `KB_FUZZY_CONFIDENCE`.
+"""
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+K1 = float(os.environ.get('KB_BM25_K1', '1.5'))
+B = float(os.environ.get('KB_BM25_B', '0.75'))
+MIN_CONFIDENCE = float(os.environ.get('KB_CONFIDENCE', '0.55'))
+# The best entry's BM25 score must be this many times the runner-up's
+MARGIN = float(os.environ.get('KB_MARGIN', '1.1'))
+# Coverage enough for a related answer when the AI is unavailable
+RELATED_CONFIDENCE = float(os.environ.get('KB_RELATED_CONFIDENCE', '0.6'))
+# Content words (not question words) a BM25 match must share with the question
+MIN_MATCHED_TERMS = 2
+FUZZY_MIN = float(os.environ.get('KB_FUZZY_MIN', '0.7'))
+# Words that sound alike still need this much spelling in common
+FUZZY_PHONETIC_MIN = 0.5
+# A question with corrected words must match more strongly: this share of
+# a METADATA entry's keywords, this BM25 confidence
+FUZZY_ACCURACY = 0.75
+FUZZY_CONFIDENCE = float(os.environ.get('KB_FUZZY_CONFIDENCE', '0.8'))
+# Shorter words are too ambiguous to correct
+FUZZY_MIN_LEN = 4
+# Stored questions count this many times over the answer text
+QUESTION_BOOST = 2
+
+STOP_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'am', 'do', 'does', 'did',
+    'can', 'could', 'would', 'will', 'shall', 'should', 'you', 'your', 'me', 'my',
+    'i', 'im', 'we', 'our', 'us', 'it', 'its', 'of', 'to', 'for', 'in', 'on', 'at',
+    'and', 'or', 'so', 'if', 'by', 'with', 'from', 'about', 'please', 'tell',
+    'know', 'there', 'this', 'that', 'omnis', 'hey', 'hello', 'hi',
+}
+# Question words are BM25 terms too. The specific ones also give the kind
+# of answer wanted; "what" and "which" can ask for anything.
+QUESTION_TYPES = {'who': 1, 'whos': 1, 'whom': 1, 'whose': 1, 'when': 2, 'where': 4, 'why': 8, 'how': 16}
+GENERIC_QUESTION_WORDS = {'what', 'whats', 'which'}
+_ANY_QUESTION = 32
+QUESTION_WORDS = set(QUESTION_TYPES) | GENERIC_QUESTION_WORDS
+# Rule keywords shorter than this are ignored ("the", "is", "do", ...), as
+# are question words that say nothing about the topic
+RULE_KEYWORD_MIN_LEN = 4
+RULE_STOP_WORDS = {'what', 'when', 'where', 'which', 'should', 'does', 'about', 'have', 'there'}
+# Skipped when matching whole stored questions ("when are the fees due")
+FILLER_WORDS = {'a', 'an', 'the', 'please'}
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def words(text: str) -> tuple:
+    """Lowercase words of `text`, apostrophes dropped ("I'm" -> "im")."""
+    return tuple(_WORD.findall(str(text).lower().replace("'", '')))
+
+
+def _stem(word: str) -> str:
+    """Strip common English endings (visited -> visit, libraries -> library)."""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) >= 5 and word.endswith('es') and word[:-2].endswith(('s', 'x', 'ch', 'sh')):
+        return word[:-2]
+    for suffix, min_len in (('ing', 6), ('ed', 5), ('s', 4)):
+        if len(word) >= min_len and word.endswith(suffix) and not word.endswith('ss'):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list:
+    """BM25 terms: words without stop words, stemmed."""
+    return [_stem(w) for w in words(text) if w not in STOP_WORDS]
+
+
+def question_type(text: str) -> int:
+    """Bit mask of the question words in `text` (0 if there are none)."""
+    mask = 0
+    for w in words(text):
+        if w in QUESTION_TYPES:
+            mask |= QUESTION_TYPES[w]
+        elif w in GENERIC_QUESTION_WORDS:
+            mask |= _ANY_QUESTION
+    return mask
+
+
+def _contains(tokens: tuple, phrase: tuple) -> bool:
+    """Does `phrase` occur as consecutive words of `tokens`?"""
+    n = len(phrase)
+    return any(tokens[i:i + n] == phrase for i in range(len(tokens) - n + 1))
+
+
+class KeywordIndex:
+    def __init__(self, custom_qa: dict, metadata: list):
+        # Rules: (question tokens, answer, keyword weight)
+        self.rules = []
+        self.rule_starts = defaultdict(list)    # first question token -> rule ids
+        self.rule_keywords = defaultdict(list)  # keyword -> rule ids
+        for qa_question, qa_answer in custom_qa.items():
+            phrase = tuple(t for t in words(qa_question) if t not in FILLER_WORDS)
+            if not phrase:
+                continue
+            keywords = {t for t in phrase if len(t) >= RULE_KEYWORD_MIN_LEN and t not in RULE_STOP_WORDS}
+            rule_id = len(self.rules)
+            self.rules.append((phrase, qa_answer, 1.0 / len(keywords) if keywords else 0.0))
+            self.rule_starts[phrase[0]].append(rule_id)
+            for kw in keywords:
+                self.rule_keywords[kw].append(rule_id)
+
+        # METADATA: (answer, keyword weight); multi-word keywords are posted
+        # under their first word and checked as a phrase
+        self.entries = []
+        self.entry_keywords = defaultdict(list)  # first keyword token -> (entry id, phrase)
+        for item in metadata:
+            phrases = {words(kw) for kw in item['question_data']} - {()}
+            if not phrases:
+                continue
+            answer = item['answer']
+            # Answers may be lists (from user provided code) or strings
+            answer = answer[0] if isinstance(answer, list) else answer
+            entry_id = len(self.entries)
+            self.entries.append((answer, 1.0 / len(item['question_data'])))
+            for phrase in phrases:
+                self.entry_keywords[phrase[0]].append((entry_id, phrase))
+
+    def state(self) -> dict:
+        """JSON-serialisable contents, for `from_state` (index cache)."""
+        return {'rules': self.rules, 'rule_starts': self.rule_starts, 'rule_keywords': self.rule_keywords,
+                'entries': self.entries, 'entry_keywords': self.entry_keywords}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        index = cls.__new__(cls)
+        index.rules = [(tuple(phrase), answer, weight) for phrase, answer, weight in state['rules']]
+        index.rule_starts = defaultdict(list, state['rule_starts'])
+        index.rule_keywords = defaultdict(list, state['rule_keywords'])
+        index.entries = [(answer, weight) for answer, weight in state['entries']]
+        index.entry_keywords = defaultdict(list, {
+            word: [(entry_id, tuple(phrase)) for entry_id, phrase in posts]
+            for word, posts in state['entry_keywords'].items()})
+        return index
+
+    def rule_answer(self, tokens: tuple):
+        """CUSTOM_QA answer for a tokenized question, or None.
+
+        1. A stored question appearing word for word in the question (the
+           first such rule wins)
+        2. Otherwise the rule with the highest share of its keywords in the
+           question, if that is at least half and two or more keywords
+        """
+        present = set(tokens)
+        content = tuple(t for t in tokens if t not in FILLER_WORDS)
+        for rule_id in sorted(r for t in present for r in self.rule_starts.get(t, ())):
+            phrase, answer, _ = self.rules[rule_id]
+            if _contains(content, phrase):
+                return answer
+
+        hits = defaultdict(int)
+        for t in present:
+            for rule_id in self.rule_keywords.get(t, ()):
+                hits[rule_id] += 1
+        best, best_ratio = None, 0.0
+        for rule_id in sorted(hits):
+            count = hits[rule_id]
+            ratio = count * self.rules[rule_id][2]
+            if count >= 2 and ratio >= 0.5 and ratio > best_ratio:
+                best, best_ratio = rule_id, ratio
+        return self.rules[best][1] if best is not None else None
+
+    def metadata_answer(self, tokens: tuple, accuracy: float):
+        """Best METADATA answer whose share of matched keywords reaches
+        `accuracy` (earliest entry on ties), or None."""
+        scores = defaultdict(float)
+        for t in set(tokens):
+            for entry_id, phrase in self.entry_keywords.get(t, ()):
+                if len(phrase) == 1 or _contains(tokens, phrase):
+                    scores[entry_id] += self.entries[entry_id][1]
+        best, best_score = None, 0.0
+        for entry_id in sorted(scores):
+            score = scores[entry_id]
+            # Float sums of 1/n weights can land a hair under the threshold
+            if score + 1e-9 >= accuracy and score > best_score + 1e-9:
+                best, best_score = entry_id, score
+        return self.entries[best][0] if best is not None else None
+
+
+class BM25Index:
+    def __init__(self, documents, k1: float = K1, b: float = B):
+        """`documents`: iterable of (question text, answer)."""
+        self.k1 = k1
+        self.answers = []
+        self.vocab = {}
+        term_ids, doc_ids, tfs, lengths, types = [], [], [], [], []
+        for question, answer in documents:
+            tokens = tokenize(question) * QUESTION_BOOST + tokenize(answer)
+            doc = len(self.answers)
+            self.answers.append(answer)
+            types.append(question_type(question))
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                doc_ids.append(doc)
+                tfs.append(count)
+
+        n_docs = len(self.answers)
+        self.types = np.asarray(types, dtype=np.uint8)
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tf = np.asarray(tfs, dtype=np.float32)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        avg_len = float(lengths.mean()) if n_docs else 1.0
+
+        df = np.bincount(term_ids, minlength=len(self.vocab))
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # A word the knowledge base never uses is as specific as it gets
+        self.unknown_idf = math.log1p((n_docs - 1 + 0.5) / 1.5) if n_docs else 0.0
+        norm = k1 * (1 - b + b * lengths[doc_ids] / max(avg_len, 1.0))
+        weights = self.idf[term_ids] * tf * (k1 + 1) / (tf + norm)
+
+        # Term-major postings: term t's documents are docs[starts[t]:starts[t + 1]]
+        order = np.argsort(term_ids, kind='stable')
+        self.docs = doc_ids[order]
+        self.weights = weights[order].astype(np.float32)
+        self.starts = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+
+    def __len__(self):
+        return len(self.answers)
+
+    def state(self) -> dict:
+        """Contents for `from_state` (index cache): numpy arrays and
+        JSON-serialisable values."""
+        return {'k1': self.k1, 'answers': self.answers, 'vocab': self.vocab,
+                'unknown_idf': self.unknown_idf, 'idf': self.idf, 'types': self.types,
+                'docs': self.docs, 'weights': self.weights, 'starts': self.starts}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        index = cls.__new__(cls)
+        for name, value in state.items():
+            setattr(index, name, value)
+        return index
+
+    def _rank(self, terms: set):
+        """Per document: BM25 score, share of the terms' idf it contains and
+        number of content terms it contains. None if no term is known."""
+        known = [t for t in terms if t in self.vocab]
+        if not known:
+            return None
+        ids = [self.vocab[t] for t in known]
+        slices = [slice(self.starts[i], self.starts[i + 1]) for i in ids]
+        counts = [s.stop - s.start for s in slices]
+        docs = np.concatenate([self.docs[s] for s in slices])
+        n = len(self.answers)
+        scores = np.bincount(docs, weights=np.concatenate([self.weights[s] for s in slices]), minlength=n)
+        # Share of the question's information (idf) each document contains
+        total_idf = float(self.idf[ids].sum()) + (len(terms) - len(ids)) * self.unknown_idf
+        coverage = np.bincount(docs, weights=np.repeat(self.idf[ids], counts), minlength=n) / total_idf
+        is_content = [t not in QUESTION_WORDS for t in known]
+        matched = np.bincount(docs, weights=np.repeat(is_content, counts), minlength=n)
+        return scores, coverage, matched
+
+    def search(self, question: str, k: int = 1) -> list:
+        """Up to `k` (answer, confidence) pairs by BM25 score, best first."""
+        ranked = self._rank(set(tokenize(question)))
+        if ranked is None:
+            return []
+        scores, coverage, _ = ranked
+        if k == 1:
+            top = [int(np.argmax(scores))]
+        else:
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = sorted(top, key=lambda d: -scores[d])
+        return [(self.answers[d], float(coverage[d])) for d in top if scores[d] > 0]
+
+    def best_answer(self, question: str, min_confidence: float = MIN_CONFIDENCE, min_terms: int = 1):
+        """The best answer if it is a confident, unambiguous match (see the
+        module docstring) sharing at least `min_terms` content words with
+        the question, else None."""
+        terms = set(tokenize(question))
+        ranked = self._rank(terms)
+        if ranked is None:
+            return None
+        scores, coverage, matched = ranked
+        best = int(np.argmax(scores))
+        runner_up = float(np.partition(scores, -2)[-2]) if len(scores) > 1 else 0.0
+        content = len(terms - QUESTION_WORDS)
+        wanted = question_type(question) & ~_ANY_QUESTION
+        if (scores[best] <= 0 or coverage[best] < min_confidence
+                or scores[best] < MARGIN * runner_up
+                or matched[best] < max(min_terms, min(MIN_MATCHED_TERMS, content))
+                or (self.types[best] and wanted & ~int(self.types[best]))):
+            return None
+        return self.answers[best]
+
+    def related_answer(self, question: str, min_confidence: float = RELATED_CONFIDENCE):
+        """The best-scoring answer sharing a content word and `min_confidence`
+        of the question, ties and margin ignored, or None. A "who", "when",
+        etc. question only takes entries asking the same. For when the AI
+        can't answer."""
+        ranked = self._rank(set(tokenize(question)))
+        if ranked is None:
+            return None
+        scores, coverage, matched = ranked
+        wanted = question_type(question) & ~_ANY_QUESTION
+        eligible = (scores > 0) & (coverage >= min_confidence) & (matched >= 1)
+        eligible &= (self.types.astype(np.int64) & wanted) == wanted
+        if not eligible.any():
+            return None
+        return self.answers[int(np.argmax(np.where(eligible, scores, -1.0)))]
+
+
+_PHONETIC_RULES = [
+    (re.compile(r'^(kn|gn|pn|wr|ps)'), lambda m: m.group(1)[1]),
+    (re.compile(r'^x'), lambda m: 's'),
+    (re.compile(r'ph'), lambda m: 'f'),
+    (re.compile(r'(sch|ck|q)'), lambda m: 'k'),
+    (re.compile(r'(tch|sh|ch)'), lambda m: 'x'),
+    (re.compile(r'th'), lambda m: '0'),
+    (re.compile(r'dg(?=[eiy])'), lambda m: 'j'),
+    (re.compile(r'c(?=[eiy])'), lambda m: 's'),
+    (re.compile(r'g(?=[eiy])'), lambda m: 'j'),
+    (re.compile(r'gh(?![aeiou])'), lambda m: ''),
+    (re.compile(r'x'), lambda m: 'ks'),
+    (re.compile(r'[wy](?![aeiou])'), lambda m: ''),
+    (re.compile(r'h(?![aeiou])'), lambda m: ''),
+]
+_PHONETIC_LETTERS = str.maketrans({'c': 'k', 'd': 't', 'z': 's', 'v': 'f'})
+
+
+def phonetic_key(word: str) -> str:
+    """Metaphone-style sound key: "principle" and "principal" -> "prnspl"."""
+    word = re.sub(r'[^a-z]', '', word.lower())
+    if not word:
+        return ''
+    for pattern, repl in _PHONETIC_RULES:
+        word = pattern.sub(repl, word)
+    word = word.translate(_PHONETIC_LETTERS)
+    # Vowels only count at the start; repeated sounds once
+    key = ('a' if word[:1] in 'aeiou' else word[:1]) + re.sub(r'[aeiouhwy]', '', word[1:])
+    return re.sub(r'(.)\1+', r'\1', key)
+
+
+def trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyMatcher:
+    def __init__(self, vocabulary):
+        self.vocab = {w for w in vocabulary if len(w) >= 3}
+        self.grams = {}                     # word -> its trigrams
+        self.by_gram = defaultdict(list)    # trigram -> words
+        self.by_sound = defaultdict(list)   # phonetic key -> words
+        for word in sorted(self.vocab):
+            grams = trigrams(word)
+            self.grams[word] = grams
+            for g in grams:
+                self.by_gram[g].append(word)
+            self.by_sound[phonetic_key(word)].append(word)
+
+    def state(self) -> dict:
+        """JSON-serialisable contents, for `from_state` (index cache)."""
+        return {'by_gram': self.by_gram, 'by_sound': self.by_sound}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        matcher = cls.__new__(cls)
+        matcher.by_gram = defaultdict(list, state['by_gram'])
+        matcher.by_sound = defaultdict(list, state['by_sound'])
+        matcher.vocab = {w for sounding in matcher.by_sound.values() for w in sounding}
+        matcher.grams = {w: trigrams(w) for w in matcher.vocab}
+        return matcher
+
+    def closest(self, word: str):
+        """Knowledge-base word `word` was probably meant as, or None."""
+        if word in self.vocab or len(word) < FUZZY_MIN_LEN or word.isdigit():
+            return None
+        grams = trigrams(word)
+        shared = Counter(w for g in grams for w in self.by_gram.get(g, ()))
+        sounds_alike = set(self.by_sound.get(phonetic_key(word), ()))
+        best, best_score = None, 0.0
+        for candidate in sounds_alike | set(shared):
+            if candidate.startswith(word) or word.startswith(candidate):
+                # Another form of the same word ("india", "indian"): not misheard
+                continue
+            # Dice similarity of the trigram sets
+            score = 2 * shared[candidate] / (len(grams) + len(self.grams[candidate]))
+            needed = FUZZY_PHONETIC_MIN if candidate in sounds_alike else FUZZY_MIN
+            if score >= needed and (score > best_score or (score == best_score and candidate < best)):
+                best, best_score = candidate, score
+        return best
+
+    def correct(self, tokens: tuple) -> tuple:
+        """`tokens` with misheard words replaced by knowledge-base words and
+        split words rejoined ("mg m" -> "mgm")."""
+        out = []
+        i = 0
+        while i < len(tokens):
+            word = tokens[i]
+            if i + 1 < len(tokens):
+                joined = word + tokens[i + 1]
+                if joined in self.vocab and not (word in self.vocab and tokens[i + 1] in self.vocab):
+                    out.append(joined)
+                    i += 2
+                    continue
+            out.append(self.closest(word) or word)
+            i += 1
+        return tuple(out)
+
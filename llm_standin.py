@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Deterministic stand-in for a language model server, so the answer path can
+be exercised and load-tested with no API key or internet.
+
+Speaks the OpenAI-style `/v1/chat/completions` API that `local_llm.py` uses
+(plain JSON or `"stream": true` server-sent events):
+
+    python llm_standin.py --latency 0.8 --token-delay 0.03
+    AI_BACKEND=local python speech_benchmark.py --live-llm
+
+- `--latency`: seconds before the first token
+- `--token-delay`: seconds between streamed words
+- `--error-rate` / `--error-status`: fail that fraction of requests with that
+  HTTP status (e.g. 429 to exercise the circuit breaker); the sequence of
+  failures is fixed by `--seed`, so runs are repeatable
+- `--gguf model.gguf`: answer with a real CPU model through llama-cpp-python
+  (`pip install llama-cpp-python`) instead of the canned text. For a
+  production offline fallback, llama.cpp's own `llama-server` works too.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def canned_answer(question: str) -> str:
+    """Same question -> same answer, mentioning what was asked."""
+    words = re.findall(r"[A-Za-z0-9']+", question)[-8:]
+    topic = ' '.join(words) or 'that'
+    return (f"This is a stand-in answer about {topic}. "
+            "It was generated locally for testing. "
+            "Ask me another question!")
+
+
+class StandinModel:
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, seed: int = 0, gguf: str = None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.llm = None
+        if gguf:
+            from llama_cpp import Llama
+            self.llm = Llama(model_path=gguf, n_ctx=2048, verbose=False)
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            return self._rng.random() < self.error_rate
+
+    def words(self, messages, max_tokens: int, temperature: float):
+        """Answer as a list of pieces (one per word for canned answers)."""
+        if self.llm is not None:
+            out = self.llm.create_chat_completion(messages=messages, max_tokens=max_tokens,
+                                                  temperature=temperature)
+            text = out['choices'][0]['message']['content'] or ''
+        else:
+            question = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+            text = canned_answer(question.splitlines()[-1] if question else '')
+        pieces = re.findall(r'\S+\s*', text)
+        return pieces[:max_tokens] if max_tokens else pieces
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    model: StandinModel = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, status: int, data: dict):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _sse(self, data):
+        chunk = f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode('utf-8')
+        self.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            return self._json(404, {'error': {'message': 'not found'}})
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        model = self.model
+        if model.should_fail():
+            time.sleep(model.latency / 2)
+            return self._json(model.error_status, {'error': {'message': f'injected {model.error_status}'}})
+
+        messages = request.get('messages') or []
+        pieces = model.words(messages, int(request.get('max_tokens') or 0),
+                             float(request.get('temperature') or 0.0))
+        usage = {'prompt_tokens': sum(len(m.get('content', '')) for m in messages) // 4 + 1,
+                 'completion_tokens': len(pieces)}
+        time.sleep(model.latency)
+
+        if not request.get('stream'):
+            time.sleep(model.token_delay * len(pieces))
+            return self._json(200, {
+                'object': 'chat.completion',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ''.join(pieces)}}],
+                'usage': usage,
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(model.token_delay)
+            self._sse({'object': 'chat.completion.chunk',
+                       'choices': [{'index': 0, 'delta': {'content': piece}}]})
+        self._sse({'object': 'chat.completion.chunk',
+                   'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage})
+        self._sse('[DONE]')
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(host: str = '127.0.0.1', port: int = 8088, **model_kwargs) -> ThreadingHTTPServer:
+    """Start the stand-in in a background thread and return the server
+    (`server.shutdown()` to stop; `server.server_address` for the port)."""
+    handler = type('Handler', (StandinHandler,), {'model': StandinModel(**model_kwargs)})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='LLMStandin').start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deterministic local LLM server for testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8088)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--gguf', default=None)
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port, latency=args.latency, token_delay=args.token_delay,
+                   error_rate=args.error_rate, error_status=args.error_status,
+                   seed=args.seed, gguf=args.gguf)
+    print(f"LLM stand-in listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Client for a local HTTP model server with an OpenAI-style
+`/v1/chat/completions` endpoint: `llm_standin.py` (deterministic, for tests),
+llama.cpp's `llama-server -m model.gguf`, or anything compatible.
+
+    AI_BACKEND=local            # answer every question with the local server
+    LOCAL_LLM_URL=http://127.0.0.1:8088
+    LOCAL_LLM_FALLBACK=1        # with Gemini: use it when Gemini is unreachable
+
+Settings: `LOCAL_LLM_URL`, `LOCAL_LLM_MODEL` (sent as "model", default
+"local"), `LOCAL_LLM_TIMEOUT` (seconds, default 30).
+"""
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+import requests
+
+from gemini_client import SYSTEM_INSTRUCTION
+
+LOCAL_LLM_URL = os.environ.get('LOCAL_LLM_URL', 'http://127.0.0.1:8088')
+LOCAL_LLM_MODEL = os.environ.get('LOCAL_LLM_MODEL', 'local')
+LOCAL_LLM_TIMEOUT = float(os.environ.get('LOCAL_LLM_TIMEOUT', '30'))
+
+
+def backend_name() -> str:
+    """'gemini' (default) or 'local' (`AI_BACKEND`)."""
+    return os.environ.get('AI_BACKEND', 'gemini').lower()
+
+
+def fallback_enabled() -> bool:
+    return os.environ.get('LOCAL_LLM_FALLBACK') == '1'
+
+
+def _usage(data: dict):
+    """OpenAI-style usage as the attributes Gemini's usage_metadata has."""
+    usage = data.get('usage') or {}
+    return SimpleNamespace(prompt_token_count=usage.get('prompt_tokens'),
+                           candidates_token_count=usage.get('completion_tokens'))
+
+
+class LocalLLMClient:
+    def __init__(self, url: str = LOCAL_LLM_URL, model: str = LOCAL_LLM_MODEL,
+                 timeout: float = LOCAL_LLM_TIMEOUT):
+        self.url = url.rstrip('/') + '/v1/chat/completions'
+        self.model = model
+        self.timeout = timeout
+        # Keep-alive connection reused across questions
+        self.session = requests.Session()
+
+    def _body(self, prompt: str, max_tokens: int, temperature: float, stream: bool) -> dict:
+        return {
+            'model': self.model,
+            'messages': [{'role': 'system', 'content': SYSTEM_INSTRUCTION},
+                         {'role': 'user', 'content': prompt}],
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'stream': stream,
+        }
+
+    def complete(self, prompt: str, max_tokens: int = 300, temperature: float = 0.6, timeout: float = None):
+        """(text, usage) for `prompt`. HTTP errors raise (a 429 says "429")."""
+        resp = self.session.post(self.url, json=self._body(prompt, max_tokens, temperature, False),
+                                 timeout=timeout or self.timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        text = data['choices'][0]['message']['content'] or ''
+        return text, _usage(data)
+
+    def stream(self, prompt: str, max_tokens: int = 300, temperature: float = 0.6, on_usage=None):
+        """Yield text pieces as the server streams them (server-sent events).
+        `on_usage(usage)` is called at the end if the server reports usage."""
+        resp = self.session.post(self.url, json=self._body(prompt, max_tokens, temperature, True),
+                                 timeout=self.timeout, stream=True)
+        with resp:
+            resp.raise_for_status()
+            usage = None
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    break
+                data = json.loads(payload)
+                if data.get('usage'):
+                    usage = _usage(data)
+                for choice in data.get('choices') or []:
+                    text = (choice.get('delta') or {}).get('content')
+                    if text:
+                        yield text
+            if on_usage:
+                on_usage(usage)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_local_llm() -> LocalLLMClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LocalLLMClient()
+        return _client
@@ -12,11 +12,17 @@ from speaker import speak, is_speaking
 from sr_class import SpeechRecognitionThread
 import shared_state
 from register_face import register_name
+from audio_devices import get_device_manager
+from greetings import UNKNOWN_GREETING, GreetingBatcher
+from tts_warmup import start_tts_warmup, request_refresh
+from school_data import start_kb_watcher
+from answer_providers import start_background_refresh
+from ai_response import start_ai_warmup
 
 # Adapter to provide a .speak() method for the SpeechRecognitionThread
 class SpeakerAdapter:
-    def speak(self, text):
-        speak(text)
+    def speak(self, text, **kwargs):
+        speak(text, **kwargs)
 
 speaker_adapter = SpeakerAdapter()
 
@@ -28,6 +34,9 @@ last_seen = {}  # person_id -> last seen timestamp
 GREETING_COOLDOWN = 300  # 5 Minutes: Re-greet people standing there
 REENTRY_THRESHOLD = 60   # 1 Minute: Don't greet if they just looked away briefly
 FACE_MATCH_TOLERANCE = float(os.environ.get('FACE_MATCH_TOLERANCE', '0.55'))
+# Arrivals within this many seconds are greeted together ("Good morning A, B and C")
+GREETING_BATCH_WINDOW = float(os.environ.get('GREETING_BATCH_WINDOW', '1.2'))
+greeting_batcher = GreetingBatcher(GREETING_BATCH_WINDOW)
 # Maximum faces to process per frame to bound CPU usage (helps low-power devices)
 MAX_FACES = int(os.environ.get('FACE_MAX_FACES', '4'))
 
@@ -53,6 +62,15 @@ with open(r'images/encoded_file.p', 'rb') as f:
 encode_list_known, studentIds = encode_list_known_with_ids
 print(f"Loaded {len(studentIds)} people: {studentIds}")
 
+# Pre-synthesize greetings and known answers in the background (low priority)
+start_tts_warmup()
+# Open the Gemini connection now rather than on the first question
+start_ai_warmup()
+# Pick up edits to school_kb.json without a restart (and pre-synthesize new answers)
+start_kb_watcher(on_change=request_refresh)
+# Keep slow dynamic answers (weather) fresh so questions never wait on them
+start_background_refresh()
+
 cap = cv2.VideoCapture(0)
 mode_type = 0
 prev_known_people = set()
@@ -165,13 +183,6 @@ try:
                         
                     if not is_in_conversation:
                         conversation_active = False
-                        # Helper for time-based greetings
-                        def get_time_based_greeting():
-                            h = int(time.strftime('%H'))
-                            if h < 12: return "Good morning"
-                            elif h < 17: return "Good afternoon"
-                            else: return "Good evening"
-
                         # Greet newly-arrived people immediately
                         new_people = known_people_in_frame - prev_known_people
                         for person in new_people:
@@ -183,9 +194,7 @@ try:
                                 if os.environ.get('OMNIS_DEBUG') == '1':
                                     print(f"[DEBUG] Full greeting new person: {person}")
                                 
-                                greeting_time = get_time_based_greeting()
-                                payload = f"Hello {person}, {greeting_time}. Welcome to MGM Model School. I am OMNIS."
-                                speak(payload)
+                                greeting_batcher.add(person, formal=True, now=current_time)
                             
                             elif gap > REENTRY_THRESHOLD:
                                 # RETURNING USER (>1 min absence): Casual Greeting
@@ -193,8 +202,7 @@ try:
                                     print(f"[DEBUG] Casual return greeting: {person} gap={gap:.1f}s")
                                 
                                 # Casual: "Hello there Name"
-                                payload = f"Hello there {person}!"
-                                speak(payload)
+                                greeting_batcher.add(person, formal=False, now=current_time)
                             
                             else:
                                 # FLICKER (<1 min absence): Ignore (Silent update)
@@ -212,8 +220,7 @@ try:
                                     print(f"[DEBUG] Standing re-greeting: {person} last={last}")
                                 
                                 # Casual re-greeting for standing people
-                                payload = f"Hello there {person}!"
-                                speak(payload)
+                                greeting_batcher.add(person, formal=False, now=current_time)
                                 last_seen[person] = current_time
 
                         # Optional debug logging controlled by OMNIS_DEBUG environment variable
@@ -233,10 +240,8 @@ try:
                                     print(f"[DEBUG] greeting primary person: {primary_person}")
                                 
                                 # Only greet if we haven't JUST greeted them as a "new person" logic above
-                                if person not in new_people:
-                                     greeting_time = get_time_based_greeting()
-                                     payload = f"Hello {primary_person}, {greeting_time}. Welcome to MGM Model School. I am OMNIS."
-                                     speak(payload)
+                                if person not in new_people and primary_person not in greeting_batcher:
+                                     greeting_batcher.add(primary_person, formal=True, now=current_time)
                                      last_seen[primary_person] = current_time
                                 last_primary_person = primary_person
                         else:
@@ -247,16 +252,9 @@ try:
 
                         # Start voice recognition thread only if mic is available and not running
                         if not (speech_thread and speech_thread.is_alive()):
+                            # Cached probe: only touches ALSA once, then on backoff expiry/hotplug
                             try:
-                                import speech_recognition as _sr
-                                from alsa_error import no_alsa_error
-                                try:
-                                    with no_alsa_error():
-                                        _sr.Microphone()
-                                    mic_available = True
-                                except Exception as _e:
-                                    mic_available = False
-                                    print(f"[Main] Microphone unavailable: {_e}")
+                                mic_available = get_device_manager().is_available()
                             except Exception as _e:
                                 mic_available = False
                                 print(f"[Main] Could not check microphone: {_e}")
@@ -287,8 +285,8 @@ try:
                     last_unknown = last_seen.get(unknown_key, 0)
                     if (current_time - last_unknown) > GREETING_COOLDOWN:
                         # Greet unknown/frontmost person once per cooldown window
-                        payload = "Hello there!"
-                        speak(payload)
+                        payload = UNKNOWN_GREETING
+                        speak(payload, kind='greeting', key=unknown_key)
                         last_seen[unknown_key] = current_time
                         last_primary_person = unknown_key
                         last_primary_person = unknown_key
@@ -301,6 +299,17 @@ try:
                 # NO FACE DETECTED
                 mode_type = 0
 
+            # Greet everyone who arrived within the batch window in one sentence
+            if greeting_batcher.due():
+                batch = greeting_batcher.flush()
+                in_conversation = speech_thread is not None and speech_thread.is_alive() \
+                    and speech_thread.conversation_active
+                if batch and not in_conversation:
+                    payload, segments, names = batch
+                    if os.environ.get('OMNIS_DEBUG') == '1':
+                        print(f"[DEBUG] Greeting batch: {names}")
+                    speak(payload, kind='greeting', key=tuple(names), segments=segments)
+
             # Display window
             cv2.imshow("Face Attendance", imgBackground)
             
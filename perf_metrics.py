@@ -0,0 +1,99 @@
+"""
+Tiny in-process latency/counter registry shared by the speech, speaker and AI
+modules. Everything is kept in memory (bounded) so it is safe to leave enabled
+on the Pi; call `snapshot()` to read the numbers or `report()` to print them.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Keep only the most recent samples per metric so a long-running robot
+# doesn't grow memory without bound.
+MAX_SAMPLES = 500
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_counters = defaultdict(float)
+
+
+def record(name: str, value: float):
+    """Record one sample (usually seconds) for metric `name`."""
+    with _lock:
+        _samples[name].append(float(value))
+
+
+def incr(name: str, amount: float = 1):
+    """Increment counter `name` by `amount`."""
+    with _lock:
+        _counters[name] += amount
+
+
+@contextmanager
+def timer(name: str):
+    """Time the wrapped block and record it under `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of `values` (0 if empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def summarize(values) -> dict:
+    values = list(values)
+    if not values:
+        return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'max': max(values),
+    }
+
+
+def samples(name: str) -> list:
+    with _lock:
+        return list(_samples.get(name, ()))
+
+
+def counter(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> dict:
+    """Return {'timings': {name: summary}, 'counters': {name: value}}."""
+    with _lock:
+        timings = {name: list(vals) for name, vals in _samples.items()}
+        counters = dict(_counters)
+    return {
+        'timings': {name: summarize(vals) for name, vals in timings.items()},
+        'counters': counters,
+    }
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _counters.clear()
+
+
+def report():
+    """Print a compact table of all metrics (handy from a debug console)."""
+    snap = snapshot()
+    for name in sorted(snap['timings']):
+        s = snap['timings'][name]
+        print(f"[perf] {name:<32} n={s['count']:<4} mean={s['mean']*1000:7.1f}ms "
+              f"p95={s['p95']*1000:7.1f}ms max={s['max']*1000:7.1f}ms")
+    for name in sorted(snap['counters']):
+        print(f"[perf] {name:<32} {snap['counters'][name]:g}")
@@ -0,0 +1,196 @@
+"""
+Client-side Gemini quota: token buckets for requests and tokens per minute,
+plus a persistent per-day usage ledger.
+
+Every AI call asks `get_rate_limiter().acquire(tokens, priority)` first, so we
+slow down before the server answers 429. Priorities:
+- 'high': a student is waiting. Waits up to `AI_QUEUE_WAIT` seconds (default
+  2) for quota, then gives up (the caller answers locally).
+- 'low': background or speculative work (e.g. hedged duplicates). Never
+  waits and may not dip into the last `AI_RESERVE` fraction (default 0.25) of
+  either bucket, so it is shed first when we're busy.
+
+Limits come from `GEMINI_RPM` (default 10) and `GEMINI_TPM` (default 250000);
+set them to the project's quota. The ledger (`AI_USAGE_DB`, default
+ai_usage.db) keeps calls, errors, shed calls, tokens in/out and latency per
+day.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import perf_metrics
+
+RPM = float(os.environ.get('GEMINI_RPM', '10'))
+TPM = float(os.environ.get('GEMINI_TPM', '250000'))
+QUEUE_WAIT = float(os.environ.get('AI_QUEUE_WAIT', '2'))
+RESERVE = float(os.environ.get('AI_RESERVE', '0.25'))
+USAGE_DB = os.environ.get('AI_USAGE_DB', 'ai_usage.db')
+
+
+class QuotaExceeded(RuntimeError):
+    """Shed locally because the call would exceed the configured quota."""
+
+
+def estimate_tokens(text: str, max_output: int = 0) -> int:
+    """Rough token count of a request (~4 characters per token)."""
+    return len(str(text)) // 4 + 1 + max_output
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self._stamp = time.monotonic()
+
+    def refill(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        self.level = min(self.capacity, self.level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `floor` behind."""
+        missing = min(amount, self.capacity - floor) + floor - self.level
+        return max(0.0, missing / self.rate) if self.rate > 0 else float('inf')
+
+
+class RateLimiter:
+    def __init__(self, rpm: float = RPM, tpm: float = TPM, reserve: float = RESERVE,
+                 queue_wait: float = QUEUE_WAIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.reserve = reserve
+        self.queue_wait = queue_wait
+        self.shed = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens: int = 1, priority: str = 'high', timeout: float = None) -> bool:
+        """Take one request and `tokens` tokens from the buckets.
+
+        Returns False (shed) if that isn't possible within the wait allowed
+        for `priority`.
+        """
+        low = priority == 'low'
+        if timeout is None:
+            timeout = 0.0 if low else self.queue_wait
+        req_floor = self.reserve * self.requests.capacity if low else 0.0
+        tok_floor = self.reserve * self.tokens.capacity if low else 0.0
+        # A request bigger than the whole bucket can still go out when it's full
+        tokens = min(tokens, self.tokens.capacity - tok_floor)
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                wait = max(self.requests.wait_time(1, req_floor),
+                           self.tokens.wait_time(tokens, tok_floor))
+                if wait <= 0:
+                    self.requests.level -= 1
+                    self.tokens.level -= tokens
+                    perf_metrics.record('ai.quota_wait', now - start)
+                    return True
+                remaining = start + timeout - now
+                if remaining <= 0 or wait > remaining:
+                    self.shed += 1
+                    perf_metrics.incr(f'ai.shed_{priority}')
+                    return False
+                self._cond.wait(wait)
+
+    def refund(self, tokens: int):
+        """Give back a reservation whose call was never made."""
+        with self._cond:
+            self.requests.refill()
+            self.tokens.refill()
+            self.requests.level = min(self.requests.capacity, self.requests.level + 1)
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + tokens)
+            self._cond.notify_all()
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage of a call is known."""
+        with self._cond:
+            self.tokens.refill()
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - actual)
+            self._cond.notify_all()
+
+
+class UsageLedger:
+    def __init__(self, path: str = USAGE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS usage (
+            day TEXT PRIMARY KEY,
+            calls INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            shed INTEGER NOT NULL DEFAULT 0,
+            tokens_in INTEGER NOT NULL DEFAULT 0,
+            tokens_out INTEGER NOT NULL DEFAULT 0,
+            latency_total REAL NOT NULL DEFAULT 0,
+            latency_max REAL NOT NULL DEFAULT 0)""")
+        self._db.commit()
+
+    def _add(self, calls=0, errors=0, shed=0, tokens_in=0, tokens_out=0, latency=0.0):
+        day = date.today().isoformat()
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO usage (day) VALUES (?)", (day,))
+            self._db.execute(
+                "UPDATE usage SET calls = calls + ?, errors = errors + ?, shed = shed + ?, "
+                "tokens_in = tokens_in + ?, tokens_out = tokens_out + ?, "
+                "latency_total = latency_total + ?, latency_max = MAX(latency_max, ?) WHERE day = ?",
+                (calls, errors, shed, tokens_in, tokens_out, latency, latency, day))
+            self._db.commit()
+
+    def record_call(self, tokens_in: int, tokens_out: int, latency: float):
+        self._add(calls=1, tokens_in=tokens_in, tokens_out=tokens_out, latency=latency)
+
+    def record_error(self):
+        self._add(errors=1)
+
+    def record_shed(self):
+        self._add(shed=1)
+
+    def day(self, day: str = None) -> dict:
+        """Totals for `day` (ISO date, default today) with the mean latency."""
+        day = day or date.today().isoformat()
+        with self._lock:
+            cur = self._db.execute("SELECT * FROM usage WHERE day = ?", (day,))
+            row = cur.fetchone()
+            columns = [c[0] for c in cur.description]
+        if row:
+            totals = dict(zip(columns, row))
+        else:
+            totals = {'day': day, 'calls': 0, 'errors': 0, 'shed': 0, 'tokens_in': 0,
+                      'tokens_out': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+        totals['latency_mean'] = totals['latency_total'] / totals['calls'] if totals['calls'] else 0.0
+        return totals
+
+
+_limiter = None
+_ledger = None
+_singleton_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter shared by every Gemini caller."""
+    global _limiter
+    with _singleton_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def get_usage_ledger():
+    """Process-wide ledger, or None if the database can't be opened."""
+    global _ledger
+    with _singleton_lock:
+        if _ledger is None:
+            try:
+                _ledger = UsageLedger()
+            except sqlite3.Error as e:
+                print(f"[Usage] Ledger disabled: {e}")
+                _ledger = False
+        return _ledger or None
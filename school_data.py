@@ -1,206 +1,292 @@
-from datetime import datetime
+"""
+School knowledge base: questions OMNIS answers without asking the AI.
+
+The data lives in `school_kb.json` (or the file named by `SCHOOL_KB`):
+- `custom_qa`: stored question -> answer
+- `metadata`: keyword lists with an answer; "{time}", "{date}" and
+  "{weather}" answers are filled in when asked (answer_providers.py)
+- `school_info`, `school_rules`: reference facts
+
+Edit the file while OMNIS runs: `start_kb_watcher()` notices the change
+within `KB_WATCH_INTERVAL` seconds (default 2), compiles the new version in
+the background and swaps it in at once; conversations in progress keep
+using the old one until then. A file with errors is reported and ignored.
+
+Compiled indexes (kb_search.py) are cached in `KB_INDEX_CACHE` (default
+kb_index_cache/) keyed by the file's content hash, so restarts skip
+rebuilding them. The cache is plain JSON and numpy arrays, loaded without
+pickle: a file planted there can at worst be a wrong index, never code.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+import answer_providers
+import perf_metrics
+from kb_search import (BM25Index, FuzzyMatcher, KeywordIndex, FUZZY_ACCURACY, FUZZY_CONFIDENCE,
+                       MIN_CONFIDENCE, MIN_MATCHED_TERMS, words)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KB_FILE = os.environ.get('SCHOOL_KB', os.path.join(HERE, 'school_kb.json'))
+INDEX_CACHE_DIR = os.environ.get('KB_INDEX_CACHE', os.path.join(HERE, 'kb_index_cache'))
+WATCH_INTERVAL = float(os.environ.get('KB_WATCH_INTERVAL', '2'))
+# Bump when the index classes change so stale caches are ignored
+INDEX_FORMAT = 4
+INDEX_CLASSES = (('keywords', KeywordIndex), ('bm25', BM25Index), ('fuzzy', FuzzyMatcher))
+
+
+class KnowledgeBase:
+    """One version of the data file with its compiled indexes."""
+
+    def __init__(self, data: dict, digest: str, indexes=None):
+        self.digest = digest
+        self.school_info = data.get('school_info', {})
+        self.school_rules = data.get('school_rules', {})
+        self.custom_qa = data.get('custom_qa', {})
+        self.metadata = data.get('metadata', [])
+        if indexes is None:
+            docs = self.documents()
+            vocabulary = {w for doc in docs for text in doc for w in words(text)}
+            indexes = (KeywordIndex(self.custom_qa, self.metadata), BM25Index(docs), FuzzyMatcher(vocabulary))
+        self.keywords, self.bm25, self.fuzzy = indexes
+
+    def documents(self) -> list:
+        """(question text, answer) for every entry, for BM25 retrieval."""
+        docs = list(self.custom_qa.items())
+        for item in self.metadata:
+            answer = item['answer']
+            docs.append((' '.join(item['question_data']), answer[0] if isinstance(answer, list) else answer))
+        return docs
+
 
 # ============================================
-# SCHOOL CONFIGURATION & RULES
+# LOADING & INDEX CACHE
 # ============================================
-# Easy to update! Just modify values here and OMNIS will use them
-
-SCHOOL_INFO = {
-    "name": "MGM Model School",
-    "location": "Varkala, Kerala, India",
-    "founded": 1983,
-    "principal": "Dr Pooja S",
-    "founder": "Dr P K Sukumaran",
-    "tagline": "Satyameya Jayate",
-    "vision": "To Develop Global Citizens, with indian values, capable of transforming every indian to lead a generous, empathetic and fulfilled life",
-    "total_students": 2900,
-    "total_staff": 250,
-    "sister_school": "KPM Model School",
-    "starting_students": 5,
-}
-
-# School Rules - UK Style + MGM Rules
-SCHOOL_RULES = {
-    "attendance": {
-        "requirement": "95% minimum attendance required",
-        "uniform": "Compulsory Monday to Friday",
-        "assembly": "Daily morning assembly at 8:15 AM",
-        "late_policy": "Students arriving after 8:30 AM marked as late",
-        "absent_protocol": "Parent notification within 2 hours",
-    },
-    "uniform": {
-        "weekdays": "Full uniform compulsory",
-        "pe_days": "PE uniform on designated sports days",
-        "formal_events": "Formal attire for assemblies and events",
-        "shoes": "Black leather shoes only",
-    },
-    "conduct": {
-        "bullying": "Zero tolerance - immediate disciplinary action",
-        "mobile_phones": "Not permitted during school hours",
-        "behavior": "Respectful conduct towards staff and peers",
-        "language": "English/Malayalam only in class",
-    },
-}
-
-# Custom Q&A for Specific Rules - Easy to Ask!
-CUSTOM_QA = {
-    # ATTENDANCE & TIME RULES
-    "What is the assembly time?": "Daily morning assembly is at 8:15 AM sharp.",
-    "When am I marked late?": "Students arriving after 8:30 AM are marked as late.",
-    "What is the attendance requirement?": "You need minimum 95% attendance to continue in school.",
-    "What happens if I'm absent?": "Your parents will be notified within 2 hours of your absence.",
-    
-    # UNIFORM RULES
-    "What is the dress code?": "Full school uniform is compulsory Monday to Friday. Uniform includes shirt/blouse, tie, trousers/skirt, and black leather shoes.",
-    "When can I wear PE uniform?": "PE uniform is only worn on designated sports days as per the timetable.",
-    "What about formal events?": "Formal attire must be worn for assemblies, ceremonies, and special events.",
-    "What shoes should I wear?": "Only black leather shoes are permitted. No colored or casual shoes.",
-    
-    # MOBILE PHONE & CONDUCT RULES
-    "Can I bring my mobile phone to school?": "No, mobile phones are not permitted during school hours. Any phones found will be confiscated and returned to parents.",
-    "What is the bullying policy?": "MGM has a zero-tolerance policy on bullying. Any bullying will result in immediate disciplinary action.",
-    "What language should I speak in class?": "Only English or Malayalam is permitted in class. No other languages.",
-    "How should I behave?": "Always show respectful conduct towards all staff and peers. Use polite language and follow instructions.",
-    
-    # LATE & LEAVE PROCEDURES
-    "What should I do if I'm late for school?": "Report to the main office with a note from your parent. You will be marked as late in your record.",
-    "How do I request leave?": "Submit a leave form to your class teacher at least 3 days in advance. Medical certificates are required for sick leave longer than 2 days.",
-    "What is the emergency leave process?": "For emergency situations, call the school office immediately. Parent notification is compulsory within the same day.",
-    
-    # FEE PAYMENT RULES
-    "When are fees due?": "School fees must be paid by the 5th of each month.",
-    "What if I pay late?": "Late payment will incur a 5% late charge. Please pay on time to avoid penalties.",
-    "How do I pay fees?": "Fees can be paid via online bank transfer or cheque. Always request a receipt for your records.",
-    
-    # SAFETY & LABORATORY RULES
-    "What are the laboratory safety rules?": "Lab access is only permitted with teacher supervision. Always wear safety goggles and follow all instructions exactly.",
-    "What if I don't follow lab rules?": "Non-compliance with lab safety rules will result in suspension from lab access and disciplinary action.",
-    "What medical facilities are available?": "A qualified school nurse is available 8 AM to 4 PM daily. Report any injuries or health issues immediately.",
-    
-    # BULLYING & DISCIPLINE
-    "What should I do if I'm being bullied?": "Report immediately to any teacher, counselor, or the principal. All complaints will be investigated and appropriate action taken.",
-    "What is the grievance procedure?": "First speak to your class teacher. If unresolved, contact the administrator. For formal complaints, submit a written request to the principal.",
-    "How long does grievance resolution take?": "The Grievance Redressal Committee reviews all complaints and aims to resolve within 30 days.",
-    
-    # LIBRARY & STUDY FACILITIES
-    "What are the library hours?": "The library is open from 8:00 AM to 4:00 PM on all school days.",
-    "How long can I keep books?": "Books can be issued for 2 weeks. You can renew if no one else has requested the book.",
-    "Are there digital resources?": "Yes, we have three digital libraries with e-books and online resources available to all students.",
-    
-    # SPORTS & ACTIVITIES
-    "Do I have to participate in sports?": "Yes, all students must participate in at least one sport or physical activity per week.",
-    "What sports facilities are available?": "We have a basketball court, volleyball court, badminton facilities, and sports equipment for various activities.",
-    "Are there extracurricular activities?": "Yes, students can join various clubs including debate, music, arts, STEM, and community service.",
-    
-    # CANTEEN & FOOD
-    "What is the canteen policy?": "Only healthy food is served in the canteen. Junk food is strictly prohibited.",
-    "Are there special meals for allergies?": "Yes, please inform the canteen manager and principal of any food allergies for special arrangements.",
-    
-    # CONTACT & ADMINISTRATION
-    "Who is the principal?": "Dr Pooja S is our principal. Office hours are 8:30 AM to 4:00 PM.",
-    "How do I contact the school?": "Call the main office or visit the school during office hours. Email queries can be sent to the school website.",
-    "Is there a school counselor?": "Yes, a qualified counselor is available for student support, academic guidance, and personal counseling.",
-}
+
+def _index_cache_path(digest: str) -> str:
+    return os.path.join(INDEX_CACHE_DIR, f"{digest[:32]}-v{INDEX_FORMAT}.npz")
+
+
+def _load_indexes(digest: str):
+    try:
+        # allow_pickle=False: arrays and a JSON string only, nothing executable
+        with np.load(_index_cache_path(digest), allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['digest'] != digest or meta['format'] != INDEX_FORMAT:
+                return None
+            indexes = []
+            for name, cls in INDEX_CLASSES:
+                state = dict(meta[name])
+                prefix = f"{name}."
+                state.update({key[len(prefix):]: data[key] for key in data.files if key.startswith(prefix)})
+                indexes.append(cls.from_state(state))
+            return tuple(indexes)
+    except Exception:
+        # Missing, half-written or from an incompatible version: rebuild
+        return None
+
+
+def _save_indexes(kb: KnowledgeBase):
+    path = _index_cache_path(kb.digest)
+    meta = {'digest': kb.digest, 'format': INDEX_FORMAT}
+    arrays = {}
+    for (name, _), index in zip(INDEX_CLASSES, (kb.keywords, kb.bm25, kb.fuzzy)):
+        state = index.state()
+        meta[name] = {k: v for k, v in state.items() if not isinstance(v, np.ndarray)}
+        arrays.update({f"{name}.{k}": v for k, v in state.items() if isinstance(v, np.ndarray)})
+    try:
+        os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+        # Only the current version is worth keeping (older ones may be pickles)
+        for name in os.listdir(INDEX_CACHE_DIR):
+            if name.endswith(('.npz', '.pkl')) and name != os.path.basename(path):
+                os.remove(os.path.join(INDEX_CACHE_DIR, name))
+    except OSError as e:
+        print(f"[KB] Could not cache the index: {e}")
+
+
+def load_knowledge_base(path: str = KB_FILE) -> KnowledgeBase:
+    """Read and compile the data file (raises on missing or invalid files)."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw)
+    digest = hashlib.sha256(raw).hexdigest()
+    indexes = _load_indexes(digest)
+    if indexes is not None:
+        perf_metrics.incr('kb.index_cache_hits')
+        return KnowledgeBase(data, digest, indexes)
+    start = time.perf_counter()
+    kb = KnowledgeBase(data, digest)
+    perf_metrics.record('kb.index_build', time.perf_counter() - start)
+    _save_indexes(kb)
+    return kb
+
+
+# The live version. Lookups read it once, so a swap never mixes versions.
+_kb = None
+_swap_lock = threading.Lock()
+
+# Module-level views of the live version (tts_warmup.py reads these)
+SCHOOL_INFO = {}
+SCHOOL_RULES = {}
+CUSTOM_QA = {}
+METADATA = []
+
+
+def _install(kb: KnowledgeBase):
+    global _kb, SCHOOL_INFO, SCHOOL_RULES, CUSTOM_QA, METADATA
+    with _swap_lock:
+        SCHOOL_INFO, SCHOOL_RULES = kb.school_info, kb.school_rules
+        CUSTOM_QA, METADATA = kb.custom_qa, kb.metadata
+        _kb = kb
+        # Cached lookups are keyed by version; drop the old ones' memory
+        _rule_lookup.cache_clear()
+        _metadata_lookup.cache_clear()
+        _bm25_lookup.cache_clear()
+        _corrected.cache_clear()
+
+
+def reload(path: str = KB_FILE) -> bool:
+    """Load `path` and swap it in. True if the content changed; on errors the
+    current version stays live."""
+    try:
+        kb = load_knowledge_base(path)
+    except Exception as e:
+        print(f"[KB] Keeping the current knowledge base, {path} could not be loaded: {e}")
+        return False
+    if _kb is not None and kb.digest == _kb.digest:
+        return False
+    _install(kb)
+    perf_metrics.incr('kb.reloads')
+    print(f"[KB] Loaded {len(kb.custom_qa)} Q&A and {len(kb.metadata)} keyword entries from {path}")
+    return True
+
+
+def rebuild_index():
+    """Recompile the indexes after CUSTOM_QA or METADATA were changed in code."""
+    _install(KnowledgeBase({'school_info': SCHOOL_INFO, 'school_rules': SCHOOL_RULES,
+                            'custom_qa': CUSTOM_QA, 'metadata': METADATA}, digest='in-memory'))
+
+
+def knowledge_documents() -> list:
+    """(question text, answer) for every entry of the live version."""
+    return _kb.documents()
+
+
+class KnowledgeBaseWatcher(threading.Thread):
+    def __init__(self, path: str = KB_FILE, interval: float = WATCH_INTERVAL, on_change=None):
+        threading.Thread.__init__(self, daemon=True, name='KBWatcher')
+        self.path = path
+        self.interval = interval
+        self.on_change = on_change
+        self._stop_event = threading.Event()
+        # Taken now, so a change made before the thread runs isn't missed
+        self._last_sig = self._signature()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime, st.st_size
+        except OSError:
+            return None
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            sig = self._signature()
+            if sig is None or sig == self._last_sig:
+                continue
+            self._last_sig = sig
+            # Compiled here, off the conversation path; the swap is instant
+            if reload(self.path) and self.on_change:
+                self.on_change()
+
+
+_watcher = None
+
+
+def start_kb_watcher(**kwargs) -> KnowledgeBaseWatcher:
+    """Start (once) and return the thread that reloads the data file on change.
+    `on_change()` is called after a new version is live."""
+    global _watcher
+    if _watcher is None:
+        _watcher = KnowledgeBaseWatcher(**kwargs)
+        _watcher.start()
+    return _watcher
+
 
 # ============================================
-# LEGACY METADATA - Original School Q&A
+# LOOKUPS
 # ============================================
-METADATA = [
-    {'answer': "Our school is forty years old", 'question_data': ["old", 'mgm']},
-    {'answer': "Welcome to MGM Model School Robot", 'question_data': ["my", 'name', 'is']},
-    {'answer': "I am MGM Robot. How are you?", 'question_data': ["your", 'name']},
-    {'answer': f'{datetime.now().strftime("%M minutes past %I%p")}', 'question_data': ["what", 'time']},
-    {'answer': f'{datetime.now().strftime("Today is %B %d %Y")}', 'question_data': ["what", 'date', 'today']},
-    {'answer': "You are welcome!", 'question_data': ["thank", 'you']},
-    {'answer': "Dr P K Sukumaran", 'question_data': ['who', 'founder', 'mgm']},
-    {'answer': "Dr P K Sukumaran", 'question_data': ['who', 'founded', 'mgm']},
-    {'answer': "Nitya Haritha Nayakan Mister Prem Nasir", 'question_data': ['foundation', 'stone', 'laid']},
-    {'answer': 'Dr Pooja S', 'question_data': ['our', 'principal']},
-    {'answer': 'Ms Lalitha', 'question_data': ['who', 'first', 'principal', 'of', 'mgm']},
-    {'answer': 'We have three digital libraries', 'question_data': ['many', 'digital', 'library', 'libraries']},
-    {'answer': "Dr A P J Abdul Kalam", 'question_data': ['Name', 'President', 'visit', 'mgm']},
-    {'answer': "To develop global citizens, with Indian values, capable of transforming every Indian to lead a generous, empathetic and fulfilled life", 
-        'question_data': ['what', 'vision', 'our', 'school']},
-    {'answer': 'Two thousand nine hundred', 'question_data': ['many', 'students', 'do', 'have']},
-    {'answer': "Nineteen eighty three", 'question_data': ['mgm', 'mgm model school', 'start', 'started', 'year', 'which']},
-    {'answer': "KPM model school, Mayyanad", 'question_data': ['which', 'sister', 'sister concern', 'school', 'mgm']},
-    {'answer': "We started with five students", 'question_data': ['how', 'many', 'students', 'there', 'mgm', 'begining']},
-    {'answer': "Twenty twenty", 'question_data': ['which', 'novel', 'method', 'teaching', 'introduced', 'mgm']},
-    {'answer': 'Ruby Jubilee', 'question_data': ['what', 'going', 'celebrated', 'celebration', 'year', '20', '23', '24']},
-    {'answer': "Honourable Governer Shri Arif Mohammed Khan", 'question_data': ['who', 'inagurated', 'innovation', 'center']},
-    {'answer': "Shri Oommen Chandy", 'question_data': ['which', 'chief', 'minister', 'visit', 'mgm']},
-    {'answer': "Satyameya Jayate", 'question_data': ['tagline', 'mgm', 'tag', 'line', 'what']},
-    {'answer': "We have two hundred and fifty employees", 'question_data': ['how', 'many', 'employees', 'have']},
-    {'answer': "Digital library, Maths 3d corner, Maths innovation center, Globe, Basket ball court, Butterfly garden, and one yoga period for class one to eighth", 
-     'question_data': ['what', 'facilities', 'infrastructure', 'provided', 'mgm']}
-]
+
+def _render(answer):
+    # "{time}" etc. are computed (or taken from the provider's cache) now
+    return answer_providers.render(answer)
+
+
+# Students repeat questions; remember recent lookups (per version)
+@lru_cache(maxsize=256)
+def _rule_lookup(kb: KnowledgeBase, tokens: tuple):
+    return kb.keywords.rule_answer(tokens)
+
+
+@lru_cache(maxsize=256)
+def _metadata_lookup(kb: KnowledgeBase, tokens: tuple, accuracy: float):
+    return kb.keywords.metadata_answer(tokens, accuracy)
+
+
+@lru_cache(maxsize=256)
+def _bm25_lookup(kb: KnowledgeBase, tokens: tuple, min_confidence: float, min_terms: int = 1):
+    return kb.bm25.best_answer(' '.join(tokens), min_confidence, min_terms)
+
+
+@lru_cache(maxsize=256)
+def _corrected(kb: KnowledgeBase, tokens: tuple):
+    return kb.fuzzy.correct(tokens)
+
+
+def search_school_answer(question: str, min_confidence: float = MIN_CONFIDENCE):
+    """BM25 match over the whole knowledge base (kb_search.py), or None if
+    nothing is relevant enough and the question should go to the AI."""
+    return _render(_bm25_lookup(_kb, words(question), min_confidence))
+
+
+def related_school_answer(question: str):
+    """A looser match for when the AI can't answer (kb_search.py
+    `related_answer`), or None. Time, date and weather answers are left
+    out: the question wasn't about them, or the strict lookup had said so."""
+    answer = _kb.bm25.related_answer(' '.join(words(question)))
+    return None if answer_providers.is_dynamic(answer) else answer
+
 
 def get_school_answer(question: str, accuracy: float = 0.6):
     """
     Checks if the question matches any local school metadata.
     Returns the answer string if found, else None.
     """
-    best_match = None
-    max_score = 0
-    
-    question_lower = question.lower()
-    
-    for item in METADATA:
-        count = 0
-        valid = 0
-        total_keywords = len(item["question_data"])
-        
-        for word in item["question_data"]:
-            if word.lower() in question_lower:
-                valid += 1
-        
-        if total_keywords > 0:
-            score = valid / total_keywords
-            if score >= accuracy and score > max_score:
-                max_score = score
-                # Handle answers that are lists (from user provided code) or strings
-                ans = item['answer']
-                if isinstance(ans, list):
-                    best_match = ans[0]
-                else:
-                    best_match = ans
-                    
-    return best_match
+    return _render(_metadata_lookup(_kb, words(question), accuracy))
 
 
 def get_rule_based_answer(question: str) -> str:
     """
     Check CUSTOM_QA for exact or close rule-based matches
     Returns answer if found, else None
-    
+
     Uses 2-tier matching:
-    1. Exact substring match (strict)
+    1. Exact match of the whole stored question (strict)
     2. Keyword matching with higher threshold (requires 50%+ keyword match)
     """
-    question_lower = question.lower().strip()
-    
-    # First try exact substring match (one string fully contains the other)
-    for qa_question, qa_answer in CUSTOM_QA.items():
-        qa_lower = qa_question.lower()
-        # Check if question contains the Q&A question or vice versa
-        if qa_lower in question_lower:
-            return qa_answer
-    
-    # Try keyword matching with higher threshold
-    for qa_question, qa_answer in CUSTOM_QA.items():
-        qa_lower = qa_question.lower()
-        keywords = [kw for kw in qa_lower.split() if len(kw) > 3]  # Only keywords > 3 chars
-        if not keywords:
-            continue
-            
-        match_count = sum(1 for kw in keywords if kw in question_lower)
-        match_ratio = match_count / len(keywords)
-        
-        # Require 50%+ keyword match (not just 2 keywords)
-        if match_ratio >= 0.5 and match_count >= 2:
-            return qa_answer
-    
-    return None
+    return _render(_rule_lookup(_kb, words(question)))
 
 
 def get_school_answer_enhanced(question: str, accuracy: float = 0.6) -> str:
@@ -208,11 +294,30 @@ def get_school_answer_enhanced(question: str, accuracy: float = 0.6) -> str:
     Enhanced version that tries:
     1. Rule-based custom Q&A first
     2. Then legacy METADATA matching
+    3. Then BM25 retrieval, if it is confident enough
+    Each step also tries the question with misheard words corrected
+    ("principle" -> "principal", "MG M" -> "mgm") before moving on, so
+    speech recognition near misses don't end up at the AI. A corrected
+    question is a guess, so it has to match more strongly.
     """
-    # First try custom rules
-    rule_answer = get_rule_based_answer(question)
-    if rule_answer:
-        return rule_answer
-    
-    # Fall back to METADATA
-    return get_school_answer(question, accuracy)
\ No newline at end of file
+    kb = _kb
+    tokens = words(question)
+    fixed = _corrected(kb, tokens)
+    variants = ((tokens, False),) if fixed == tokens else ((tokens, False), (fixed, True))
+    for tier in (lambda t, guessed: _rule_lookup(kb, t),
+                 lambda t, guessed: _metadata_lookup(kb, t, max(accuracy, FUZZY_ACCURACY) if guessed else accuracy),
+                 lambda t, guessed: _bm25_lookup(kb, t, FUZZY_CONFIDENCE, MIN_MATCHED_TERMS) if guessed
+                 else _bm25_lookup(kb, t, MIN_CONFIDENCE)):
+        for variant, guessed in variants:
+            answer = tier(variant, guessed)
+            if answer is not None:
+                if guessed:
+                    perf_metrics.incr('kb.fuzzy_hits')
+                return _render(answer)
+    return None
+
+
+if not reload(KB_FILE):
+    # No usable data file: answer nothing locally rather than fail to start
+    print("[KB] Starting with an empty knowledge base")
+    _install(KnowledgeBase({}, digest='empty'))
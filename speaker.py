@@ -1,14 +1,61 @@
 import os
+import re
+import subprocess
 import threading
 import time
 import uuid
+import wave
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pygame
-from gtts import gTTS
+
+from echo_cancel import aec_enabled, echo_reference
+from tts_cache import get_tts_cache
+from tts_backends import GTTSBackend, get_tts_router
+from audio_playback import get_playback_engine
+import perf_metrics
+
+# ALSA device of the USB speaker ('plughw:1,0' is the safest way to talk to ALSA)
+SPEAKER_DEVICE = os.environ.get('SPEAKER_DEVICE', 'plughw:1,0')
+TTS_LANG = 'en'
+TTS_TLD = 'com'
+# Sentences synthesized in parallel while the current one plays
+TTS_WORKERS = int(os.environ.get('TTS_WORKERS', '2'))
+# Play greetings stitched from cached segments when the mixer is available
+TTS_SEGMENTS = os.environ.get('TTS_SEGMENTS', '1') != '0'
+# Long sentences are cut at clause boundaries past this many characters
+MAX_CHUNK_CHARS = 160
+# Fragments shorter than this are glued to their neighbour (avoids choppy audio)
+MIN_CHUNK_CHARS = 12
+
+# Speech classes, most urgent first. Kinds in the same class are spoken in
+# the order they were queued, so the wake-word ack comes before the answer
+# that follows it; both go before any pending greeting.
+PRIORITIES = (('ack', 'answer'), ('greeting',))
+_RANK = {kind: rank for rank, kinds in enumerate(PRIORITIES) for kind in kinds}
+# Seconds a message stays worth saying once queued (None = until spoken).
+# A greeting for someone who walked away 8 s ago is just noise.
+DEFAULT_TTL = {'answer': None, 'ack': 4.0, 'greeting': 8.0}
+
+# A full stop after these (or after an initial, "A. P. J.") doesn't end the sentence
+_ABBREVIATIONS = ('Dr', 'Mr', 'Mrs', 'Ms', 'Prof', 'Sr', 'Jr', 'St', 'vs', 'e.g', 'i.e')
+_SENTENCE_END = re.compile(''.join(rf'(?<!\b{re.escape(a)}\.)' for a in _ABBREVIATIONS)
+                           + r'(?<!\b[A-Z]\.)(?<=[.!?])\s+')
+_CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
 
 # Shared state to check if speaker is active
 _global_speaker_active = False
 _last_spoken_time = 0
 
+# Event-driven hand-off between the speaker and the listener. Everything that
+# changes "is the robot talking?" notifies `_state_cond`, so waiters wake up
+# exactly on speech start / speech end / cooldown expiry instead of polling.
+_state_cond = threading.Condition()
+speech_started = threading.Event()   # set while audio is being produced
+speech_finished = threading.Event()  # set when the queue has fully drained
+speech_finished.set()
+
 def is_speaking():
     # True if audio is playing OR if messages are queued to be played
     busy = _global_speaker_active
@@ -19,58 +66,393 @@ def is_speaking():
 def get_last_spoken_time():
     return _last_spoken_time
 
+def _notify_state():
+    with _state_cond:
+        _state_cond.notify_all()
+
+def wake_waiters():
+    """Wake every thread blocked in `wait_until_quiet` (e.g. on shutdown)."""
+    _notify_state()
+
+def wait_until_quiet(cooldown: float = 0.0, should_stop=None, on_wait=None) -> bool:
+    """Block until nothing is queued/playing and `cooldown` seconds have passed
+    since the last utterance finished.
+
+    `should_stop()` is checked on every wake-up (call `wake_waiters()` to
+    interrupt); `on_wait(reason, remaining)` is called once per state change
+    for status output. Returns False if stopped, True when quiet.
+    """
+    last_reason = None
+    with _state_cond:
+        while True:
+            if should_stop and should_stop():
+                return False
+            if is_speaking():
+                reason, timeout = 'speaking', None
+            else:
+                remaining = cooldown - (time.time() - _last_spoken_time)
+                if remaining <= 0:
+                    return True
+                reason, timeout = 'cooldown', remaining
+            if on_wait and reason != last_reason:
+                on_wait(reason, timeout)
+            last_reason = reason
+            _state_cond.wait(timeout)
+
+def _merge_short(parts, limit):
+    out = []
+    for part in parts:
+        if out and (len(out[-1]) < MIN_CHUNK_CHARS or len(part) < MIN_CHUNK_CHARS) \
+                and len(out[-1]) + len(part) < limit:
+            out[-1] = f"{out[-1]} {part}"
+        else:
+            out.append(part)
+    return out
+
+def split_sentences(text) -> list:
+    """Split `text` (or a list of texts) into speakable chunks, in order.
+
+    Sentences are the unit; over-long sentences are further split at
+    commas/semicolons so the first chunk is always quick to synthesize.
+    """
+    if isinstance(text, (list, tuple)):
+        return [c for item in text if item for c in split_sentences(item)]
+    chunks = []
+    for sentence in _SENTENCE_END.split(' '.join(str(text).split())):
+        if not sentence:
+            continue
+        if len(sentence) <= MAX_CHUNK_CHARS:
+            chunks.append(sentence)
+            continue
+        current = ''
+        for clause in _CLAUSE_END.split(sentence):
+            if current and len(current) + len(clause) + 1 > MAX_CHUNK_CHARS:
+                chunks.append(current)
+                current = clause
+            else:
+                current = f"{current} {clause}".strip()
+        if current:
+            chunks.append(current)
+    return _merge_short(chunks, MAX_CHUNK_CHARS)
+
+def iter_sentences(pieces):
+    """Yield sentences from a stream of text fragments (e.g. an LLM response)
+    as soon as each one is complete; whatever is left is yielded at the end.
+    A sentence counts as complete once whitespace follows its full stop."""
+    buf = ''
+    pending = ''
+    for piece in pieces:
+        buf += piece
+        parts = _SENTENCE_END.split(buf)
+        buf = parts.pop()
+        for sentence in parts:
+            pending = f"{pending} {sentence.strip()}".strip()
+            if len(pending) >= MIN_CHUNK_CHARS:
+                yield pending
+                pending = ''
+    rest = f"{pending} {buf.strip()}".strip()
+    if rest:
+        yield rest
+
+def synthesize(text: str, lang: str = TTS_LANG, tld: str = TTS_TLD) -> str:
+    """Return the path of audio for `text` (MP3 from gTTS or WAV from the
+    local engine, see `tts_backends.py`), using the on-disk TTS cache."""
+    return get_tts_router().synthesize(text, lang, tld)
+
+def render_gtts(text: str, lang: str = TTS_LANG, tld: str = TTS_TLD) -> bytes:
+    """Synthesize `text` with gTTS and return the MP3 bytes (network call)."""
+    return GTTSBackend().synthesize(text, lang, tld)
+
+def tts_cache_stats():
+    """Hit/miss statistics of the speech cache."""
+    return get_tts_cache().stats()
+
+class SpeechMessage:
+    __slots__ = ('text', 'kind', 'key', 'segments', 'deadline', 'enqueued', 'dropped')
+
+    def __init__(self, text, kind: str = 'answer', ttl: float = None, key=None,
+                 segments=None):
+        if kind not in DEFAULT_TTL:
+            raise ValueError(f"unknown speech kind {kind!r}")
+        self.text = text
+        self.kind = kind
+        self.key = key
+        self.segments = segments
+        self.enqueued = time.time()
+        if ttl is None:
+            ttl = DEFAULT_TTL[kind]
+        self.deadline = None if ttl is None else self.enqueued + ttl
+        self.dropped = False
+
+    def identity(self):
+        # Messages with the same identity are the same thing to say
+        text = self.text if isinstance(self.text, str) else tuple(self.text)
+        return (self.kind, text if self.key is None else ('key', self.key))
+
+class SpeechQueue:
+    """Priority queue of `SpeechMessage`s: one deque per class, O(1) push/pop.
+
+    - An exact duplicate of a queued message is coalesced into it (its
+      deadline is refreshed).
+    - A message with the same `key` (e.g. a newer greeting for the same
+      person) supersedes the queued one, which is dropped in place.
+    - Messages past their deadline are dropped when they reach the front.
+    """
+
+    def __init__(self):
+        self._queues = [deque() for _ in PRIORITIES]
+        self._live = {}  # identity -> queued message
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, msg: SpeechMessage) -> bool:
+        """Queue `msg`; False if it was coalesced into an identical message."""
+        ident = msg.identity()
+        old = self._live.get(ident)
+        if old is not None:
+            if old.key is None or old.text == msg.text:
+                old.deadline = msg.deadline if old.deadline is not None else None
+                perf_metrics.incr('speech.coalesced')
+                return False
+            old.dropped = True
+            self._count -= 1
+            perf_metrics.incr('speech.superseded')
+        self._queues[_RANK[msg.kind]].append(msg)
+        self._live[ident] = msg
+        self._count += 1
+        return True
+
+    def pop(self, now: float = None):
+        """Most urgent live message, or None."""
+        now = time.time() if now is None else now
+        for q in self._queues:
+            while q:
+                msg = q.popleft()
+                if msg.dropped:
+                    continue
+                self._live.pop(msg.identity(), None)
+                self._count -= 1
+                if msg.deadline is not None and now > msg.deadline:
+                    perf_metrics.incr('speech.dropped_stale')
+                    continue
+                perf_metrics.record('speech.queue_wait', now - msg.enqueued)
+                return msg
+        return None
+
+    def has_more_urgent(self, kind: str) -> bool:
+        return any(not m.dropped for q in self._queues[:_RANK[kind]] for m in q)
+
+    def clear(self):
+        for q in self._queues:
+            q.clear()
+        self._live.clear()
+        self._count = 0
+
 class GTTSThread(threading.Thread):
     def __init__(self):
         threading.Thread.__init__(self)
-        self.queue = []
+        self.queue = SpeechQueue()
         self.lock = threading.Lock()
+        # Signalled by speak()/stop() so the idle thread sleeps without polling
+        self.cond = threading.Condition(self.lock)
         self.running = True
+        # Current player process, kept so interrupt() can stop it mid-sentence
+        self._proc = None
+        self._interrupted = threading.Event()
+        # Synthesizes upcoming sentences while the current one plays
+        self.pool = ThreadPoolExecutor(max_workers=max(1, TTS_WORKERS),
+                                       thread_name_prefix='tts')
+        self.lookahead = max(1, TTS_WORKERS) + 1
 
     def run(self):
         global _global_speaker_active, _last_spoken_time
+        # Open the output device once, up front, so the first phrase doesn't pay for it
+        get_playback_engine(SPEAKER_DEVICE)
         while self.running:
-            text_to_speak = None
-            
-            self.lock.acquire()
-            if self.queue:
-                text_to_speak = self.queue.pop(0)
-            self.lock.release()
-
-            if text_to_speak:
-                _global_speaker_active = True
-                try:
-                    # 1. Generate Audio file
-                    filename = f"speak_{uuid.uuid4()}.mp3"
-                    tts = gTTS(text=text_to_speak, lang='en', tld='com')
-                    tts.save(filename)
-
-                    # 2. Play Audio FORCEFULLY on Card 1 (USB Speaker)
-                    # using 'plughw:1,0' is the safest way to talk to ALSA
-                    os.system(f"mpg321 -a plughw:1,0 -q {filename}")
-                    
-                    # Cleanup
-                    if os.path.exists(filename):
-                        os.remove(filename)
-
-                except Exception as e:
-                    print(f"Speaker Error: {e}")
-                finally:
-                    _global_speaker_active = False
-                    # Only update timestamp if queue is empty (finished all speech)
-                    self.lock.acquire()
+            with self.cond:
+                message = None
+                while self.running and message is None:
+                    message = self.queue.pop()
+                    if message is None:
+                        if not speech_finished.is_set():
+                            # Everything left in the queue had expired
+                            _last_spoken_time = time.time()
+                            speech_finished.set()
+                            _notify_state()
+                        self.cond.wait()
+                if not self.running:
+                    break
+                self._interrupted.clear()
+
+            _global_speaker_active = True
+            speech_finished.clear()
+            speech_started.set()
+            _notify_state()
+            try:
+                if not message.text:
+                    continue
+                if message.segments and self._segments_playable():
+                    self._speak_segments(message.segments, message.enqueued)
+                else:
+                    self._speak_chunks(split_sentences(message.text), message.kind, message.enqueued)
+
+            except Exception as e:
+                print(f"Speaker Error: {e}")
+            finally:
+                _global_speaker_active = False
+                speech_started.clear()
+                # Only update timestamp if queue is empty (finished all speech)
+                with self.lock:
                     if not self.queue:
-                         _last_spoken_time = time.time()
-                    self.lock.release()
-            else:
-                time.sleep(0.1)
+                        _last_spoken_time = time.time()
+                        speech_finished.set()
+                _notify_state()
+
+    def _speak_chunks(self, chunks, kind: str = 'answer', enqueued: float = None):
+        """Play `chunks` in order, synthesizing ahead in the worker pool.
 
-    def speak(self, text):
-        self.lock.acquire()
-        self.queue.append(text)
-        self.lock.release()
+        The first chunk starts playing as soon as it is ready, so the wait
+        before audio no longer grows with the length of the answer. If a more
+        urgent message is queued meanwhile, the rest of this one is dropped at
+        the next sentence boundary.
+        """
+        start = time.perf_counter()
+        pending = iter(chunks)
+        futures = deque()
+
+        def top_up():
+            # Keep every worker busy plus one result ready to go
+            while len(futures) < self.lookahead:
+                chunk = next(pending, None)
+                if chunk is None:
+                    return
+                futures.append(self.pool.submit(synthesize, chunk))
+
+        top_up()
+        first = True
+        while futures:
+            with self.lock:
+                preempted = not first and self.queue.has_more_urgent(kind)
+            if preempted:
+                perf_metrics.incr('speech.preempted')
+            if self._interrupted.is_set() or preempted:
+                for f in futures:
+                    f.cancel()
+                return
+            # 1. Get audio (cached on disk, so repeat phrases skip the network)
+            filename = futures.popleft().result()
+            top_up()
+            if first:
+                perf_metrics.record('tts.time_to_first_audio', time.perf_counter() - start)
+                if enqueued is not None:
+                    # Includes time spent waiting behind other messages
+                    perf_metrics.record('tts.queue_to_audio', time.time() - enqueued)
+                first = False
+            if self._interrupted.is_set():
+                continue
+
+            # 2. Play Audio FORCEFULLY on the USB Speaker
+            self._play_file(filename)
+
+    def _segments_playable(self):
+        return TTS_SEGMENTS and get_playback_engine(SPEAKER_DEVICE).available
+
+    def _speak_segments(self, segments, enqueued: float = None):
+        """Play `segments` (e.g. ["Hello", name, "Good morning", welcome]) as
+        one clip joined from individually cached audio."""
+        start = time.perf_counter()
+        futures = [self.pool.submit(synthesize, seg) for seg in segments if seg]
+        paths = [f.result() for f in futures]
+        engine = get_playback_engine(SPEAKER_DEVICE)
+        sound = engine.join(paths)
+        perf_metrics.record('tts.time_to_first_audio', time.perf_counter() - start)
+        if enqueued is not None:
+            perf_metrics.record('tts.queue_to_audio', time.time() - enqueued)
+        if self._interrupted.is_set():
+            return
+        on_start = None
+        if aec_enabled():
+            on_start = lambda snd, t: echo_reference.publish(engine.pcm(snd), engine.rate, t)
+        engine.play_sound(sound, on_start=on_start)
+
+    def _play_file(self, filename):
+        engine = get_playback_engine(SPEAKER_DEVICE)
+        if engine.available:
+            # In-process: device stays open, decoded audio comes from memory
+            on_start = None
+            if aec_enabled():
+                on_start = lambda sound, t: echo_reference.publish(engine.pcm(sound), engine.rate, t)
+            engine.play_file(filename, on_start=on_start)
+        elif aec_enabled():
+            self._play_with_reference(filename)
+        elif filename.endswith('.wav'):
+            self._play(["aplay", "-q", "-D", SPEAKER_DEVICE, filename])
+        else:
+            self._play(["mpg321", "-a", SPEAKER_DEVICE, "-q", filename])
+
+    def _play(self, cmd):
+        with self.lock:
+            self._proc = subprocess.Popen(cmd)
+        try:
+            self._proc.wait()
+        finally:
+            with self.lock:
+                self._proc = None
+
+    def _play_with_reference(self, filename):
+        """Decode to WAV, publish the PCM as echo reference, then play it."""
+        is_wav = filename.endswith('.wav')
+        wav_name = filename if is_wav else f"speak_{uuid.uuid4()}.wav"
+        try:
+            if not is_wav:
+                subprocess.run(["mpg321", "-q", "-w", wav_name, filename], check=True)
+            with wave.open(wav_name, 'rb') as wf:
+                rate = wf.getframerate()
+                channels = wf.getnchannels()
+                pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+            if channels > 1:
+                pcm = pcm.reshape(-1, channels).mean(axis=1)
+            echo_reference.publish(pcm, rate, time.time())
+            self._play(["aplay", "-q", "-D", SPEAKER_DEVICE, wav_name])
+        finally:
+            if not is_wav and os.path.exists(wav_name):
+                os.remove(wav_name)
+
+    def interrupt(self):
+        """Barge-in: drop queued speech and stop the current playback now."""
+        with self.cond:
+            self.queue.clear()
+            self._interrupted.set()
+            proc = self._proc
+        get_playback_engine(SPEAKER_DEVICE).stop()
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.terminate()
+            except Exception as e:
+                print(f"Speaker Error: could not stop playback: {e}")
+        echo_reference.clear()
+        _notify_state()
+
+    def speak(self, text, kind: str = 'answer', ttl: float = None, key=None,
+              segments=None):
+        """Queue `text`. `kind` is 'answer', 'ack' or 'greeting'; `ttl` overrides the
+        class default; `key` marks messages that supersede each other (e.g.
+        the person being greeted); `segments`, if given, is `text` split into
+        parts that are synthesized and cached separately, then joined."""
+        with self.cond:
+            if self.queue.push(SpeechMessage(text, kind, ttl, key, segments)):
+                speech_finished.clear()
+                self.cond.notify()
+        _notify_state()
 
     def stop(self):
-        self.running = False
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        _notify_state()
 
 # Global helper for main.py
 _global_speaker_thread = None
@@ -82,7 +464,12 @@ def init_speaker_thread():
         _global_speaker_thread.start()
     return _global_speaker_thread
 
-def speak(text):
+def stop_speaking():
+    """Interrupt whatever the global speaker is saying (used for barge-in)."""
+    if _global_speaker_thread is not None:
+        _global_speaker_thread.interrupt()
+
+def speak(text, kind: str = 'answer', ttl: float = None, key=None, segments=None):
     """Global speak function called by main.py"""
     s = init_speaker_thread()
-    s.speak(text)
+    s.speak(text, kind=kind, ttl=ttl, key=key, segments=segments)
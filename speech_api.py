@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 
-from datetime import datetime
 import queue
 from time import sleep
 import threading
 from gtts import gTTS
 import os
-import requests
-from bs4 import BeautifulSoup
+import answer_providers
 from ai_response import get_chat_response as ai_get_chat_response
 import speech_recognition as sr
 import pygame
@@ -25,41 +23,14 @@ is_speaking = False
 listen_tag = False
 
 
-def get_weather_data(city: str='varkala'):
-    url = 'https://www.google.com/search?q='+'weather'+city
-
-    res = requests.get(url).content
-
-    soup = BeautifulSoup(res, 'html.parser')
-
-    temperature = soup.find('div', attrs={'class': 'BNeawe iBp4i AP7Wnd'}).text
-    str = soup.find('div', attrs={'class': 'BNeawe tAd8D AP7Wnd'}).text
- 
-    # formatting data
-    data = str.split('\n')
-    time = data[0]
-    sky = data[1]
-
-    # getting all div tag
-    listdiv = soup.findAll('div', attrs={'class': 'BNeawe s3v9rd AP7Wnd'})
-    strd = listdiv[5].text
-    
-    # getting other required data
-    pos = strd.find('Wind')
-    other_data = strd[pos:]
-    out = f'The temperature is {temperature}. with a {sky} sky'
-    print(out)
-    return out
-
-
 METADATA = [
     {'answer': ["our school is forty years old"], 'question_data': ["old", 'mgm']},
-    {'answer': [None], 'question_data': ["weather"]},
-    {'answer': [None], 'question_data': ["temperature"]},
+    {'answer': ['{weather}'], 'question_data': ["weather"]},
+    {'answer': ['{weather}'], 'question_data': ["temperature"]},
     {'answer': ["Welcome to MGM School Robot"], 'question_data': ["my", 'name', 'is']},
     {'answer': ["I am MGM Robot. How are you?"], 'question_data': ["your", 'name']},
-    {'answer': [f'{datetime.now().strftime("%M minutes past %I%p")}'], 'question_data': ["what", 'time']},
-    {'answer': [f'{datetime.now().strftime("Todays date is %B %d %Y")}'], 'question_data': ["what", 'date', 'today']},
+    {'answer': ['{time}'], 'question_data': ["what", 'time']},
+    {'answer': ['{date}'], 'question_data': ["what", 'date', 'today']},
     {'answer': ["you are welcome!"], 'question_data': ["thank", 'you']},
     {'answer': ["Dr p k sukumaran"], 'question_data': ['who', 'founder', 'mgm']},
     {'answer': ["Dr p k sukumaran"], 'question_data': ['who', 'founded', 'mgm']},
@@ -141,21 +112,13 @@ def validate_questions(question: str, accuracy: float):
 
         # print(f'{item} -> {valid/count}')
         if valid / count > accuracy:
-            # If the stored answer is None (placeholder), compute it dynamically
-            ans = item['answer']
-            if ans and ans[0] is None:
-                # Known dynamic entries: weather/temperature
-                if 'weather' in item['question_data'] or 'temperature' in item['question_data']:
-                    try:
-                        return [get_weather_data()]
-                    except Exception as e:
-                        print(f"[Weather] Error getting weather data: {e}")
-                        return ["Sorry, weather service unavailable."]
-            return item['answer']
+            # "{time}", "{weather}", ... are computed when asked (answer_providers.py)
+            return [answer_providers.render(a) for a in item['answer']]
     
     print(f"Sending to AI backend")
     try:
-        resp = ai_get_chat_response(generate_ai_question(question))
+        # A student is waiting for this one: interactive quota, not the shed-first class
+        resp = ai_get_chat_response(generate_ai_question(question), priority='high')
         response = None
         try:
             response = resp['choices'][0]['message']['content']
@@ -221,6 +184,8 @@ if __name__ == '__main__':
     # Listener thread initialised and started once
     listener_flag = queue.Queue()
     listening_task = threading.Thread(target=speech_to_text_task, args=(listener_flag, ), daemon=True)
+    # Fetch the weather before anyone asks
+    answer_providers.start_background_refresh()
     try:
         listening_task.start()
         # Keep main thread alive while listener runs
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Replay a corpus of recorded/scripted questions through the full
+wake-word -> answer -> speak path and check latency against stored baselines.
+
+    python speech_benchmark.py                     # run and compare
+    python speech_benchmark.py --update-baselines  # accept current numbers
+    python speech_benchmark.py --live-llm          # use the real Gemini backend
+
+Exits with status 1 when any metric regresses past its baseline.
+"""
+import argparse
+import json
+import os
+import sys
+
+import perf_metrics
+from speech_replay import (WavAudioSource, ScriptedRecognizer, StubChat,
+                           StubSpeaker, replay_utterance)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, 'benchmarks', 'speech_corpus.json')
+DEFAULT_BASELINES = os.path.join(HERE, 'benchmarks', 'speech_baselines.json')
+
+# Metrics compared against the baseline file (summary statistic per metric)
+GATED_METRICS = {
+    'time_to_first_audio': 'p95',
+    'speech_to_answer': 'p95',
+    'asr': 'p95',
+    'kb_lookup': 'p95',
+    'llm': 'p95',
+    'ack_handoff': 'p95',
+}
+# Absolute slack (seconds) so scheduler jitter on tiny stages doesn't fail the run
+ABS_SLACK = 0.02
+
+
+def run_corpus(corpus_path: str, asr_latency: float, llm_latency: float,
+               tts_latency: float, live_llm: bool = False) -> dict:
+    """Replay every utterance and return {metric: summary}."""
+    # Imported here so `--help` works even when the speech stack can't load
+    from sr_class import SpeechRecognitionThread
+
+    chat_fn = None
+    if live_llm:
+        from ai_response import get_chat_response
+        chat_fn = get_chat_response
+    else:
+        chat_fn = StubChat(latency=llm_latency)
+
+    thread = SpeechRecognitionThread(StubSpeaker(synth_latency=tts_latency),
+                                     recognizer=ScriptedRecognizer(latency=asr_latency),
+                                     microphone=object(),
+                                     chat_fn=chat_fn)
+
+    per_metric = {}
+    for utt in WavAudioSource.from_manifest(corpus_path):
+        timings = replay_utterance(thread, utt)
+        print(f"[bench] {utt.label[:40]:<40} " +
+              ' '.join(f"{k}={v*1000:.0f}ms" for k, v in sorted(timings.items())))
+        for key, value in timings.items():
+            per_metric.setdefault(key, []).append(value)
+
+    return {key: perf_metrics.summarize(vals) for key, vals in per_metric.items()}
+
+
+def compare(results: dict, baselines: dict, tolerance: float) -> list:
+    """Return a list of human-readable regression messages (empty if OK)."""
+    failures = []
+    for metric, stat in GATED_METRICS.items():
+        base = baselines.get(metric, {}).get(stat)
+        if base is None or metric not in results:
+            continue
+        measured = results[metric][stat]
+        limit = base * (1 + tolerance) + ABS_SLACK
+        if measured > limit:
+            failures.append(f"{metric}.{stat}: {measured*1000:.0f}ms > "
+                            f"{limit*1000:.0f}ms (baseline {base*1000:.0f}ms)")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--baselines', default=DEFAULT_BASELINES)
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed fractional regression (default 0.2 = 20%%)')
+    parser.add_argument('--asr-latency', type=float, default=0.4)
+    parser.add_argument('--llm-latency', type=float, default=0.8)
+    parser.add_argument('--tts-latency', type=float, default=0.3)
+    parser.add_argument('--live-llm', action='store_true')
+    parser.add_argument('--update-baselines', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = run_corpus(args.corpus, args.asr_latency, args.llm_latency,
+                         args.tts_latency, live_llm=args.live_llm)
+
+    print("\n" + "=" * 60)
+    for metric in sorted(results):
+        s = results[metric]
+        print(f"{metric:<22} n={s['count']:<3} p50={s['p50']*1000:7.1f}ms "
+              f"p95={s['p95']*1000:7.1f}ms max={s['max']*1000:7.1f}ms")
+    print("=" * 60)
+
+    if args.update_baselines:
+        data = {m: {GATED_METRICS[m]: round(results[m][GATED_METRICS[m]], 4)}
+                for m in GATED_METRICS if m in results}
+        with open(args.baselines, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"✅ Baselines written to {args.baselines}")
+        return 0
+
+    if not os.path.exists(args.baselines):
+        print(f"⚠️ No baselines at {args.baselines}; run with --update-baselines")
+        return 0
+
+    with open(args.baselines, 'r', encoding='utf-8') as f:
+        baselines = json.load(f)
+    failures = compare(results, baselines, args.tolerance)
+    if failures:
+        print("❌ Latency regression:")
+        for msg in failures:
+            print(f"   {msg}")
+        return 1
+    print("✅ All latencies within baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Offline stand-ins for everything `SpeechRecognitionThread` talks to, so the
+wake-word -> answer -> speak path can be replayed from WAV files or scripted
+text with no microphone, no Google ASR, no Gemini and no speaker.
+
+    source = WavAudioSource.from_manifest('benchmarks/speech_corpus.json')
+    recognizer = ScriptedRecognizer(latency=0.4)
+    speaker = StubSpeaker(synth_latency=0.3)
+    thread = SpeechRecognitionThread(speaker, recognizer=recognizer,
+                                     chat_fn=StubChat(latency=0.8))
+    for utt in source:
+        replay_utterance(thread, utt)
+
+Used by `speech_benchmark.py`.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import speech_recognition as sr
+
+
+class Utterance:
+    """One recorded (or scripted) question: optional WAV path + expected transcript.
+
+    `new_conversation` replays it as the start of a conversation (the
+    thread leaves conversation mode first), so its wake-word ack is spoken
+    and timed instead of being skipped as a follow-up.
+    """
+
+    def __init__(self, text: str, wav: str = None, label: str = None, new_conversation: bool = False):
+        self.text = text
+        self.wav = wav
+        self.label = label or (os.path.basename(wav) if wav else text)
+        self.new_conversation = new_conversation
+
+    def __repr__(self):
+        return f"Utterance({self.label!r})"
+
+
+class WavAudioSource:
+    """Iterable of `Utterance`s backed by WAV files (falls back to scripted text)."""
+
+    def __init__(self, utterances):
+        self.utterances = list(utterances)
+
+    @classmethod
+    def from_manifest(cls, path: str):
+        """Load `{"utterances": [{"text": ..., "wav": optional path,
+        "new_conversation": optional bool}, ...]}`.
+
+        Relative WAV paths are resolved against the manifest's folder.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+        items = []
+        for entry in data.get('utterances', []):
+            wav = entry.get('wav')
+            if wav and not os.path.isabs(wav):
+                wav = os.path.join(base, wav)
+            items.append(Utterance(entry['text'], wav=wav, label=entry.get('label'),
+                                   new_conversation=entry.get('new_conversation', False)))
+        return cls(items)
+
+    @classmethod
+    def from_texts(cls, texts):
+        return cls(Utterance(t) for t in texts)
+
+    def __iter__(self):
+        return iter(self.utterances)
+
+    def __len__(self):
+        return len(self.utterances)
+
+
+def scripted_audio(seconds: float = 1.0, sample_rate: int = 16000) -> sr.AudioData:
+    """Stand-in phrase for text-only utterances: silence, a noise burst, silence.
+
+    The burst is loud enough for the VAD in `audio_prep` to treat it as speech.
+    """
+    rng = np.random.default_rng(0)
+    pad = np.zeros(int(0.3 * sample_rate))
+    burst = rng.normal(0, 3000, int(seconds * sample_rate))
+    pcm = np.concatenate((pad, burst, pad)).clip(-32768, 32767).astype(np.int16)
+    return sr.AudioData(pcm.tobytes(), sample_rate, 2)
+
+
+def capture(recognizer, utterance: Utterance) -> sr.AudioData:
+    """Run the real `listen()` VAD over the utterance's WAV (or synthesize a phrase)."""
+    if utterance.wav and os.path.exists(utterance.wav):
+        with sr.AudioFile(utterance.wav) as source:
+            return recognizer.listen(source, timeout=5, phrase_time_limit=8)
+    return scripted_audio()
+
+
+class ScriptedRecognizer(sr.Recognizer):
+    """`sr.Recognizer` whose `recognize_google` returns queued transcripts.
+
+    `listen()` is the real implementation so WAV replays still exercise
+    end-of-speech detection. `latency` simulates the cloud ASR round trip.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self._pending = []
+
+    def expect(self, text: str):
+        self._pending.append(text)
+
+    def recognize_google(self, audio_data, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if not self._pending or not self._pending[0]:
+            if self._pending:
+                self._pending.pop(0)
+            raise sr.UnknownValueError()
+        return self._pending.pop(0)
+
+
+class StubChat:
+    """Deterministic replacement for `ai_response.get_chat_response`."""
+
+    def __init__(self, latency: float = 0.0, answer: str = "This is a test answer."):
+        self.latency = latency
+        self.answer = answer
+        self.calls = []
+
+    def __call__(self, payload: str, **kwargs):
+        self.calls.append(payload)
+        if self.latency:
+            time.sleep(self.latency)
+        return {'choices': [{'message': {'content': self.answer}}]}
+
+    def stream(self, payload: str, pieces: int = 4, **kwargs):
+        """Streaming variant (`stream_fn` contract): the first piece arrives
+        after a quarter of `latency`, the rest spread over the remainder."""
+        self.calls.append(payload)
+        words = self.answer.split(' ')
+        step = max(1, -(-len(words) // pieces))
+        chunks = [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+        for i, chunk in enumerate(chunks):
+            if self.latency:
+                time.sleep(self.latency / 4 if i == 0 else 3 * self.latency / 4 / max(1, len(chunks) - 1))
+            yield chunk if i == len(chunks) - 1 else chunk + ' '
+
+
+
+class StubSpeaker:
+    """Records what would have been spoken and when audio would start.
+
+    Audio is modelled as starting `synth_latency` seconds after the hand-off,
+    which is what a non-blocking speaker thread does with gTTS.
+    """
+
+    def __init__(self, synth_latency: float = 0.0):
+        self.synth_latency = synth_latency
+        self.events = []  # (perf_counter when audio starts, text)
+
+    def speak(self, text, **kwargs):
+        self.events.append((time.perf_counter() + self.synth_latency, text))
+
+    def clear(self):
+        self.events = []
+
+
+def replay_utterance(thread, utterance: Utterance) -> dict:
+    """Push one utterance through `thread.handle_audio` and return its timings.
+
+    The thread must have been built with a `ScriptedRecognizer` and a
+    `StubSpeaker`. Returned keys (seconds): `capture`, the thread's stage
+    breakdown (`asr`, `kb_lookup`, `llm`, `ack_handoff`, `answer_handoff`)
+    and, when something was spoken, `time_to_first_audio` and
+    `speech_to_answer` (end of speech -> answer audio starts).
+    """
+    speaker = thread.speaker
+    speaker.clear()
+    if utterance.new_conversation:
+        thread.end_conversation()
+    thread.recognizer.expect(utterance.text)
+
+    start = time.perf_counter()
+    audio = capture(thread.recognizer, utterance)
+    end_of_speech = time.perf_counter()
+
+    thread.handle_audio(audio)
+
+    result = dict(thread.last_timings)
+    result['capture'] = end_of_speech - start
+    if speaker.events:
+        result['time_to_first_audio'] = speaker.events[0][0] - end_of_speech
+        result['speech_to_answer'] = speaker.events[-1][0] - end_of_speech
+    return result
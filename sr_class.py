@@ -3,73 +3,321 @@ import time
 import os
 import speech_recognition as sr
 
-from speaker import GTTSThread, is_speaking, get_last_spoken_time
-from ai_response import get_chat_response
+from speaker import (GTTSThread, is_speaking, get_last_spoken_time, wait_until_quiet,
+                     wake_waiters, stop_speaking, iter_sentences)
+from ai_response import get_chat_response, stream_chat_response, ConversationMemory
 from school_data import get_school_answer_enhanced
 import shared_state
+import perf_metrics
 from register_face import register_name
 from alsa_error import no_alsa_error
+from audio_devices import get_device_manager
+from echo_cancel import aec_enabled, EchoCancellingSource
+from audio_prep import prep_enabled, condition_audio
+from greetings import ACK_PHRASE, NOT_UNDERSTOOD_PHRASE, NO_NAME_PHRASE, SAVE_FAILED_PHRASE
+
+# REDUCED LATENCY: 3.0s -> 1.5s is usually enough for echo to die
+ECHO_COOLDOWN = 1.5
+# Speak AI answers sentence by sentence while Gemini is still generating
+STREAM_ANSWERS = os.environ.get('GEMINI_STREAM', '1') != '0'
 
 
 class SpeechRecognitionThread(threading.Thread):
-    def __init__(self, speaker: GTTSThread):
+    """Wake-word listener that answers questions through `speaker`.
+
+    Every collaborator can be injected so the whole pipeline can be driven
+    without a microphone or network (see `speech_replay.py`):
+    - `recognizer`: object with `listen()` / `recognize_google()` (default `sr.Recognizer()`)
+    - `microphone`: an `sr.AudioSource`; when given, `audio_devices` probing is skipped
+    - `chat_fn`: AI backend, same contract as `ai_response.get_chat_response`
+    - `stream_fn`: streaming AI backend yielding text pieces, same contract as
+      `ai_response.stream_chat_response`; used instead of `chat_fn` when set
+      (by default only if `chat_fn` isn't injected and GEMINI_STREAM != 0)
+    - `school_fn`: local knowledge-base lookup (default `get_school_answer_enhanced`)
+    """
+
+    def __init__(self, speaker: GTTSThread, recognizer=None, microphone=None,
+                 chat_fn=None, school_fn=None, stream_fn=None):
         threading.Thread.__init__(self)
         self.stop_event = threading.Event()
         self.speaker = speaker
         self.verbose = True
         self.conversation_active = False
-        self.microphone = None
+        self.microphone = microphone
+        self._owns_microphone = False
         self.conversation_timeout = 15
-        
+        self.timeout_count = 0
+        # Follow-up questions are sent with the recent turns of this conversation
+        self.memory = ConversationMemory()
+        # Per-utterance stage timings (seconds) of the last processed phrase
+        self.last_timings = {}
+        self._end_of_speech = None
+
         env_wake = os.environ.get('WAKE_WORDS')
         if env_wake:
             self.wake_words = [w.strip().lower() for w in env_wake.split(',') if w.strip()]
         else:
             self.wake_words = ['omnis', 'hello']
-        self.recognizer = sr.Recognizer()
+        self.recognizer = recognizer if recognizer is not None else sr.Recognizer()
+        if stream_fn is None and chat_fn is None and STREAM_ANSWERS:
+            stream_fn = stream_chat_response
+        self.stream_fn = stream_fn
+        self.chat_fn = chat_fn or get_chat_response
+        self.school_fn = school_fn or get_school_answer_enhanced
+        # With echo cancellation the mic stays open while OMNIS talks and a
+        # wake word heard mid-answer interrupts playback (barge-in).
+        self.aec = aec_enabled()
+        self._aec_source = None
+        # With AEC, streamed answers run here so the mic keeps listening;
+        # setting `_answer_cancel` stops the one in progress.
+        self._answer_thread = None
+        self._answer_cancel = threading.Event()
+        # Trim/resample/normalise each phrase before uploading it for ASR
+        self.prep = prep_enabled()
 
     def _open_microphone(self) -> bool:
-        try:
-            if self.microphone is None:
-                target_index = None
-                
-                # Dynamic microphone finding
-                print("\n[Auto-Config] Searching for USB Microphone...")
-                try:
-                    mics = sr.Microphone.list_microphone_names()
-                    for i, name in enumerate(mics):
-                        print(f"  Device {i}: {name}")
-                        if "USB" in name and "Hardware" in name: # Prefer hardware direct
-                             target_index = i
-                             break
-                    
-                    if target_index is None:
-                        for i, name in enumerate(mics):
-                             if "USB" in name:
-                                  target_index = i
-                                  break
-                except Exception as e:
-                    print(f"  Error listing mics: {e}")
-
-                if target_index is not None:
-                     print(f"✅ Found USB Microphone at index {target_index}")
-                else:
-                     print("⚠️ No USB Mic found, trying default (index 4 or default)")
-                     target_index = 4 # Fallback
-
-                try:
-                    with no_alsa_error():
-                        self.microphone = sr.Microphone(device_index=target_index)
-                except ImportError:
-                     self.microphone = sr.Microphone(device_index=target_index)
+        if self.microphone is not None:
             return True
-        except Exception as e:
-            print(f"[Microphone] Could not open microphone: {e}")
+        # Shared, cached device selection (probes once, backs off on failure)
+        self.microphone = get_device_manager().get_microphone()
+        if self.microphone is None:
             return False
+        self._owns_microphone = True
+        return True
+
+    def _listen_source(self):
+        """The microphone, wrapped in the echo canceller when AEC is on."""
+        if not self.aec:
+            return self.microphone
+        if self._aec_source is None or self._aec_source.source is not self.microphone:
+            self._aec_source = EchoCancellingSource(self.microphone)
+        return self._aec_source
+
+    @staticmethod
+    def _print_mute_status(reason, remaining):
+        if reason == 'speaking':
+            print("🔇 ROBOT SPEAKING - MIC CLOSED...    ", end='\r')
+        else:
+            print(f"🔇 COOLING DOWN ({remaining:.1f}s)...      ", end='\r')
+
+    def _timed(self, stage: str, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)`, storing its duration in `last_timings[stage]`."""
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.last_timings[stage] = elapsed
+            perf_metrics.record(f"speech.{stage}", elapsed)
+
+    def _say(self, text: str, kind: str):
+        """Hand `text` to the speaker and note when (relative to end of speech) it happened."""
+        self.speaker.speak(text, kind=kind)
+        key = f"{kind}_handoff"
+        if key not in self.last_timings and self._end_of_speech is not None:
+            elapsed = time.perf_counter() - self._end_of_speech
+            self.last_timings[key] = elapsed
+            perf_metrics.record(f"speech.{key}", elapsed)
+
+    def _answering(self) -> bool:
+        return self._answer_thread is not None and self._answer_thread.is_alive()
+
+    def _talking(self) -> bool:
+        """Is OMNIS speaking, or still generating an answer it will speak?"""
+        return is_speaking() or self._answering()
+
+    def barge_in(self):
+        """Stop the answer in progress: its playback, queued speech and the
+        rest of a streamed answer."""
+        self._answer_cancel.set()
+        stop_speaking()
+
+    def handle_audio(self, audio_data):
+        """Recognize one captured phrase and act on it.
+
+        Returns the recognized text (or None). `last_timings` is reset and
+        filled with the stage breakdown for this phrase.
+        """
+        self.last_timings = {}
+        self._end_of_speech = time.perf_counter()
+        # Was OMNIS talking over this phrase? Noted before the ASR round trip,
+        # during which an answer may finish or start.
+        talked_over = self.aec and self._talking()
+
+        # Double check if speaker became active during listening or processing
+        # OR if it finished speaking recently (which means it spoke DURING the listen)
+        if not self.aec and (is_speaking() or (time.time() - get_last_spoken_time() < ECHO_COOLDOWN)):
+            print("🔇 Discarding (speaker active during listen)")
+            return None
+
+        print("🔄 Processing audio...")
+        if self.prep:
+            audio_data = self._timed('condition', condition_audio, audio_data)
+            if audio_data is None:
+                print("   (Only silence - nothing to upload)")
+                return None
+        try:
+            text = self._timed('asr', self.recognizer.recognize_google, audio_data)
+        except sr.UnknownValueError:
+            print("   (Didn't catch that)")
+            return None
+        finally:
+            if 'asr' in self.last_timings:
+                perf_metrics.record('asr.upload_latency', self.last_timings['asr'])
+
+        # TRIPLE check - if we were speaking while processing
+        if self.aec:
+            if talked_over or self._talking():
+                if not any(w in text.lower().split() for w in self.wake_words):
+                    print(f"🔇 Ignoring '{text}' (no wake word while speaking)")
+                    return None
+                print("\n✋ BARGE-IN - stopping playback\n")
+                self.barge_in()
+                # Treat it as a fresh wake-word question
+                self.end_conversation()
+        elif is_speaking():
+            print(f"🔇 Discarding result '{text}' (self-heard)")
+            return None
+
+        print(f"📝 Heard: '{text}'")
+        self.handle_text(text)
+        return text
+
+    def handle_text(self, text: str):
+        """Apply registration / wake-word / conversation logic to recognized `text`."""
+        if getattr(shared_state, 'awaiting_name', False):
+            name_spoken = text.strip()
+            greetings = {'hello', 'hi', 'hey', 'thanks', 'thank you'}
+            norm = name_spoken.lower().strip()
+            if not name_spoken or norm in greetings or len(''.join(ch for ch in norm if ch.isalpha())) < 2:
+                self.speaker.speak(NO_NAME_PHRASE)
+                shared_state.awaiting_name = False
+                shared_state.awaiting_encoding = None
+                shared_state.awaiting_face_image = None
+                return
+            enc = getattr(shared_state, 'awaiting_encoding', None)
+            img = getattr(shared_state, 'awaiting_face_image', None)
+            ok = register_name(name_spoken, enc, img)
+            if ok:
+                self.speaker.speak(f"Thanks {name_spoken}, I will remember you.")
+            else:
+                self.speaker.speak(SAVE_FAILED_PHRASE)
+            shared_state.awaiting_name = False
+            shared_state.awaiting_encoding = None
+            shared_state.awaiting_face_image = None
+            return
+
+        text_lower = text.lower()
+        tokens = text_lower.split()
+
+        if self.conversation_active:
+            has_wake_word = False
+        else:
+            has_wake_word = any(w in tokens for w in self.wake_words)
+
+        if has_wake_word or self.conversation_active:
+            if has_wake_word:
+                print("\n✅ WAKE WORD DETECTED!\n")
+                self._say(ACK_PHRASE, 'ack')
+                self.memory.reset()
+                self.conversation_active = True
+            else:
+                print("\n💬 Follow-up question\n")
+
+            question = text_lower
+            for w in self.wake_words:
+                question = question.replace(w, "")
+            question = question.strip()
+
+            if question and len(question) >= 3:
+                print(f"❓ Question: {question}\n")
+                self.answer_question(question)
+                self.timeout_count = 0
+        else:
+            print("   (No wake word)\n")
+
+    def end_conversation(self):
+        """Leave conversation mode and forget its history."""
+        self.conversation_active = False
+        self.memory.reset()
+
+    def _context_kwargs(self) -> dict:
+        # Only pass `context` when there is some, so simple chat_fn stubs keep working
+        context = self.memory.context()
+        return {'context': context} if context else {}
+
+    def answer_question(self, question: str):
+        school_ans = self._timed('kb_lookup', self.school_fn, question)
+        if school_ans:
+            print(f"🏫 School Response: {school_ans}\n")
+            self._say(school_ans, 'answer')
+            self.memory.add(question, str(school_ans))
+            return
+
+        print("🤖 Getting AI response...")
+        if self.stream_fn is not None:
+            if not self.aec:
+                self._stream_answer(question)
+                return
+            # Keep listening for a barge-in while the answer streams
+            self._answer_cancel.set()
+            self._answer_cancel = cancel = threading.Event()
+            self._answer_thread = threading.Thread(target=self._stream_answer, args=(question, cancel),
+                                                   daemon=True, name='StreamAnswer')
+            self._answer_thread.start()
+            return
+        resp = self._timed('llm', self.chat_fn, question, **self._context_kwargs())
+        if isinstance(resp, dict) and 'choices' in resp:
+            answer = resp['choices'][0]['message']['content']
+            print(f"💬 AI Response: {answer}\n")
+            self._say(answer, 'answer')
+            self.memory.add(question, answer)
+        else:
+            self._say(NOT_UNDERSTOOD_PHRASE, 'answer')
+
+    def _stream_answer(self, question: str, cancel: threading.Event = None):
+        """Speak the AI answer sentence by sentence as it is generated.
+
+        Adds `llm_first_token` and `llm_first_sentence` to `last_timings`;
+        `llm` covers the whole generation. Stops early once `cancel` is set.
+        """
+        start = time.perf_counter()
+        timings = self.last_timings
+
+        def mark(stage):
+            if stage not in timings:
+                elapsed = time.perf_counter() - start
+                timings[stage] = elapsed
+                perf_metrics.record(f"speech.{stage}", elapsed)
+
+        def pieces():
+            for piece in self.stream_fn(question, **self._context_kwargs()):
+                mark('llm_first_token')
+                yield piece
+
+        spoken = []
+        try:
+            for sentence in iter_sentences(pieces()):
+                if cancel is not None and cancel.is_set():
+                    print("   (Answer interrupted)")
+                    return
+                mark('llm_first_sentence')
+                spoken.append(sentence)
+                self._say(sentence, 'answer')
+        finally:
+            elapsed = time.perf_counter() - start
+            timings['llm'] = elapsed
+            perf_metrics.record("speech.llm", elapsed)
+        if spoken:
+            answer = ' '.join(spoken)
+            print(f"💬 AI Response: {answer}\n")
+            self.memory.add(question, answer)
+        else:
+            self._say(NOT_UNDERSTOOD_PHRASE, 'answer')
 
     def run(self) -> None:
         self.recognizer.dynamic_energy_threshold = True
-        self.recognizer.pause_threshold = 1.0  
+        self.recognizer.pause_threshold = 1.0
         self.recognizer.non_speaking_duration = 0.5
 
         print("\n" + "=" * 50)
@@ -84,28 +332,19 @@ class SpeechRecognitionThread(threading.Thread):
         while not self.stop_event.is_set():
             try:
                 # STRICT MUTE: Block here if robot is speaking or cooling down
-                # We do this OUTSIDE the mic context so we don't buffer audio while waiting
-                while not self.stop_event.is_set():
-                        if is_speaking():
-                            print("🔇 ROBOT SPEAKING - MIC CLOSED...    ", end='\r')
-                            time.sleep(0.1)
-                            continue
-                        
-                        # REDUCED LATENCY: 3.0s -> 1.5s is usually enough for echo to die
-                        remaining = 1.5 - (time.time() - get_last_spoken_time())
-                        if remaining > 0:
-                            print(f"🔇 COOLING DOWN ({remaining:.1f}s)...      ", end='\r')
-                            time.sleep(0.1)
-                            continue
-                        break # Safe to proceed
-                
+                # We do this OUTSIDE the mic context so we don't buffer audio while waiting.
+                # The speaker signals start/end of speech, so this sleeps until exactly then.
+                if not self.aec and not wait_until_quiet(ECHO_COOLDOWN, should_stop=self.stop_event.is_set,
+                                                         on_wait=self._print_mute_status):
+                    break
+
                 if self.conversation_active and (time.time() - get_last_spoken_time()) < 3.0:
                         print("\n🟢 NOW LISTENING - GO AHEAD!\n")
 
                 # Open Mic FRESH every time to ensure empty buffer
                 with no_alsa_error():
-                    with self.microphone as source:
-                        # Only adjust for noise once or periodically, not every single loop if possible, 
+                    with self._listen_source() as source:
+                        # Only adjust for noise once or periodically, not every single loop if possible,
                         # but here we need safety. A quick 0.2s adjustment is fine.
                         print("🔊 Adjusting...", end='\r')
                         self.recognizer.adjust_for_ambient_noise(source, duration=0.2)
@@ -117,96 +356,15 @@ class SpeechRecognitionThread(threading.Thread):
 
                         try:
                             audio_data = self.recognizer.listen(source, timeout=5, phrase_time_limit=8)
-                            
-                            # Double check if speaker became active during listening or processing
-                            # OR if it finished speaking recently (which means it spoke DURING the listen)
-                            if is_speaking() or (time.time() - get_last_spoken_time() < 1.5):
-                                print("🔇 Discarding (speaker active during listen)")
-                                continue
-
-                            print("🔄 Processing audio...")
-                            try:
-                                text = self.recognizer.recognize_google(audio_data)
-                            except sr.UnknownValueError:
-                                print("   (Didn't catch that)")
-                                continue
-                            
-                            # TRIPLE check - if we were speaking while processing
-                            if is_speaking():
-                                print(f"🔇 Discarding result '{text}' (self-heard)")
-                                continue
-
-                            print(f"📝 Heard: '{text}'")
-
-                            if getattr(shared_state, 'awaiting_name', False):
-                                name_spoken = text.strip()
-                                greetings = {'hello', 'hi', 'hey', 'thanks', 'thank you'}
-                                norm = name_spoken.lower().strip()
-                                if not name_spoken or norm in greetings or len(''.join(ch for ch in norm if ch.isalpha())) < 2:
-                                    self.speaker.speak("I didn't catch a name.")
-                                    shared_state.awaiting_name = False
-                                    shared_state.awaiting_encoding = None
-                                    shared_state.awaiting_face_image = None
-                                    continue
-                                enc = getattr(shared_state, 'awaiting_encoding', None)
-                                img = getattr(shared_state, 'awaiting_face_image', None)
-                                ok = register_name(name_spoken, enc, img)
-                                if ok:
-                                    self.speaker.speak(f"Thanks {name_spoken}, I will remember you.")
-                                else:
-                                    self.speaker.speak("Sorry, I couldn't save your name.")
-                                shared_state.awaiting_name = False
-                                shared_state.awaiting_encoding = None
-                                shared_state.awaiting_face_image = None
-                                continue
-
-                            text_lower = text.lower()
-                            tokens = text_lower.split()
-                            
-                            if self.conversation_active:
-                                has_wake_word = False
-                            else:
-                                has_wake_word = any(w in tokens for w in self.wake_words)
-
-                            if has_wake_word or self.conversation_active:
-                                if has_wake_word:
-                                    print("\n✅ WAKE WORD DETECTED!\n")
-                                    self.speaker.speak("Yes, how can I help you?")
-                                    self.conversation_active = True
-                                else:
-                                    print("\n💬 Follow-up question\n")
-
-                                question = text_lower
-                                for w in self.wake_words:
-                                    question = question.replace(w, "")
-                                question = question.strip()
-                                
-                                if question and len(question) >= 3:
-                                    print(f"❓ Question: {question}\n")
-                                    school_ans = get_school_answer_enhanced(question)
-                                    if school_ans:
-                                        print(f"🏫 School Response: {school_ans}\n")
-                                        self.speaker.speak(school_ans)
-                                    else:
-                                        print("🤖 Getting AI response...")
-                                        resp = get_chat_response(question)
-                                        if isinstance(resp, dict) and 'choices' in resp:
-                                            answer = resp['choices'][0]['message']['content']
-                                            print(f"💬 AI Response: {answer}\n")
-                                            self.speaker.speak(answer)
-                                        else:
-                                            self.speaker.speak("Sorry, I couldn't process that.")
-                                    timeout_count = 0
-                            else:
-                                print("   (No wake word)\n")
+                            self.handle_audio(audio_data)
 
                         except sr.WaitTimeoutError:
                             if self.conversation_active:
-                                timeout_count += 1
-                                if timeout_count >= 3:
+                                self.timeout_count += 1
+                                if self.timeout_count >= 3:
                                     print("⏱️ Timeout - say 'OMNIS' to start again\n")
-                                    self.conversation_active = False
-                                    timeout_count = 0
+                                    self.end_conversation()
+                                    self.timeout_count = 0
                         except sr.UnknownValueError:
                             print("   (Didn't catch that)\n")
                         except sr.RequestError as ex:
@@ -216,12 +374,21 @@ class SpeechRecognitionThread(threading.Thread):
                             time.sleep(1)
             except Exception as e:
                 print(f"❌ Microphone Error: {e}")
+                if self._owns_microphone:
+                    # Device probably went away: let the manager re-probe with backoff
+                    get_device_manager().mark_failed()
+                    self.microphone = None
+                    self._owns_microphone = False
                 time.sleep(2)
-                
+                while not self.stop_event.is_set() and not self._open_microphone():
+                    time.sleep(1)
+
     def stop(self):
         self.stop_event.set()
+        self._answer_cancel.set()
+        wake_waiters()
         print("\n🛑 Voice recognition stopped\n")
 
 
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,23 @@
+"""
+Shared setup: import the top-level modules and keep every cache and usage
+database the code writes out of the working tree.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Set before the test modules import the code (settings are read at import),
+# so this can't be a fixture; removed when the run ends
+_scratch = tempfile.mkdtemp(prefix='omnis-tests-')
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('ANSWER_CACHE_DB', os.path.join(_scratch, 'answer_cache.db'))
+os.environ.setdefault('AI_USAGE_DB', os.path.join(_scratch, 'ai_usage.db'))
+os.environ.setdefault('TTS_CACHE_DIR', os.path.join(_scratch, 'tts_cache'))
+os.environ.setdefault('KB_INDEX_CACHE', os.path.join(_scratch, 'kb_index_cache'))
+os.environ.pop('OMNIS_AEC', None)
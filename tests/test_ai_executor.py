@@ -0,0 +1,209 @@
+import threading
+import time
+
+import pytest
+
+import ai_response
+import perf_metrics
+import school_data
+from ai_executor import (AIExecutor, CircuitBreaker, CircuitOpenError, DeadlineExceeded, FIRST_TOKEN_METRIC,
+                         LATENCY_METRIC)
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    perf_metrics.reset()
+    yield
+    perf_metrics.reset()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_rate_limit_opens_at_once():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    breaker.record_failure(rate_limited=True)
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.01)
+    breaker.record_failure(rate_limited=True)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_call_returns_result_and_records_latency():
+    executor = AIExecutor(deadline=1)
+    assert executor.call(lambda x: x * 2, 21) == 42
+    assert len(perf_metrics.samples(LATENCY_METRIC)) == 1
+
+
+def test_deadline_exceeded():
+    executor = AIExecutor(deadline=0.05)
+    release = threading.Event()
+    with pytest.raises(DeadlineExceeded):
+        executor.call(release.wait, 5)
+    release.set()
+
+
+def test_errors_open_the_breaker_and_calls_are_refused():
+    executor = AIExecutor(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60), deadline=1)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise RuntimeError("429 Quota exceeded")
+
+    with pytest.raises(RuntimeError):
+        executor.call(fail)
+    with pytest.raises(CircuitOpenError):
+        executor.call(fail)
+    assert len(calls) == 1
+
+
+def slow_first(release):
+    """First call hangs until released, later calls answer at once."""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return 'slow'
+        return 'hedged'
+    return fn, calls
+
+
+def seed_latencies(seconds):
+    for _ in range(10):
+        perf_metrics.record(LATENCY_METRIC, seconds)
+
+
+def test_hedged_request_wins_when_first_is_slow():
+    seed_latencies(0.02)
+    release = threading.Event()
+    fn, calls = slow_first(release)
+    executor = AIExecutor(deadline=2, hedge=True)
+    assert executor.call(fn) == 'hedged'
+    assert len(calls) == 2
+    assert perf_metrics.counter('ai.hedged') == 1
+    release.set()
+
+
+def test_hedge_gate_can_veto():
+    seed_latencies(0.02)
+    release = threading.Event()
+    fn, calls = slow_first(release)
+    executor = AIExecutor(deadline=0.2, hedge=True)
+    with pytest.raises(DeadlineExceeded):
+        executor.call(fn, hedge_gate=lambda: False)
+    assert len(calls) == 1
+    release.set()
+
+
+def test_no_hedging_without_history():
+    executor = AIExecutor(deadline=1, hedge=True)
+    assert executor.hedge_delay() is None
+
+
+def test_stream_yields_items_and_closes_breaker():
+    executor = AIExecutor(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01), deadline=1)
+    executor.breaker.record_failure()
+    time.sleep(0.02)
+    assert list(executor.stream(lambda: iter(['a', 'b']))) == ['a', 'b']
+    assert executor.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_stream_first_item_deadline():
+    executor = AIExecutor(deadline=1)
+    release = threading.Event()
+
+    def stalled():
+        release.wait(5)
+        yield 'late'
+
+    with pytest.raises(DeadlineExceeded):
+        list(executor.stream(stalled, first_deadline=0.05))
+    release.set()
+
+
+def test_stream_deadline_bounds_the_gap_not_the_whole_answer():
+    executor = AIExecutor(deadline=0.1)
+
+    def steady():
+        for i in range(6):
+            time.sleep(0.04)
+            yield i
+
+    assert list(executor.stream(steady, first_deadline=0.1)) == list(range(6))
+    assert executor.breaker.failures == 0
+
+
+def test_stall_after_first_item_is_not_a_breaker_failure():
+    executor = AIExecutor(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60), deadline=0.05)
+    release = threading.Event()
+
+    def stalls():
+        yield 'a'
+        release.wait(5)
+        yield 'b'
+
+    got = []
+    with pytest.raises(DeadlineExceeded):
+        for item in executor.stream(stalls, first_deadline=1):
+            got.append(item)
+    release.set()
+    assert got == ['a']
+    assert executor.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_stream_first_token_does_not_feed_the_hedge_delay():
+    executor = AIExecutor(deadline=1)
+    list(executor.stream(lambda: iter(['a', 'b'])))
+    assert len(perf_metrics.samples(FIRST_TOKEN_METRIC)) == 1
+    assert perf_metrics.samples(LATENCY_METRIC) == []
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Gemini configured but the breaker open, no answer cache."""
+    executor = AIExecutor(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60), deadline=1)
+    executor.breaker.record_failure()
+    monkeypatch.setattr(ai_response, 'get_ai_executor', lambda: executor)
+    monkeypatch.setattr(ai_response, '_backend_key', lambda: 'key')
+    monkeypatch.setattr(ai_response, 'get_answer_cache', lambda: None)
+    monkeypatch.setattr(ai_response.local_llm, 'fallback_enabled', lambda: False)
+    return executor
+
+
+def test_fallback_answers_from_the_knowledge_base(offline):
+    # The strict lookup that runs before the AI finds nothing here
+    question = "tell me about the school founder"
+    assert school_data.get_school_answer_enhanced(question) is None
+    reply = ai_response.get_chat_response(question)
+    assert reply['choices'][0]['message']['content'] == "Dr P K Sukumaran"
+
+
+def test_fallback_apologises_when_nothing_is_related(offline):
+    reply = ai_response.get_chat_response("what is the capital of france")
+    assert reply['choices'][0]['message']['content'] == ai_response.OFFLINE_ANSWER
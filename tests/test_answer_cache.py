@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+import ai_response
+from answer_cache import AnswerCache, is_cacheable, normalize_question
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(str(tmp_path / 'answers.db'), ttl=3600, max_entries=3)
+
+
+def test_equivalent_questions_share_a_key():
+    assert normalize_question("OMNIS, what is AI?") == normalize_question("what's AI") == 'ai'
+
+
+def test_changing_facts_are_not_cacheable():
+    assert not is_cacheable("what is the weather today")
+    assert not is_cacheable("what is the time")
+    assert not is_cacheable("omnis please")
+    assert is_cacheable("who invented the telephone")
+
+
+def test_hit_after_put(cache):
+    assert cache.get("who invented the telephone") is None
+    assert cache.put("Who invented the telephone?", "Alexander Graham Bell.", latency=1.5)
+    assert cache.get("omnis who invented the telephone") == "Alexander Graham Bell."
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert stats['saved_seconds'] == pytest.approx(1.5)
+
+
+def test_volatile_question_is_not_stored(cache):
+    assert not cache.put("what is the news today", "Nothing new.")
+    assert cache.stats()['entries'] == 0
+
+
+def test_expired_answer_is_only_a_fallback(cache):
+    cache.put("who invented the telephone", "Alexander Graham Bell.", ttl=-1)
+    assert cache.get("who invented the telephone") is None
+    assert cache.get_stale("who invented the telephone") == "Alexander Graham Bell."
+
+
+def test_least_recently_used_is_evicted(cache):
+    for i, topic in enumerate(["telephone", "radio", "television"]):
+        cache.put(f"who invented the {topic}", f"answer {i}")
+        time.sleep(0.01)
+    cache.get("who invented the telephone")
+    cache.put("who invented the bulb", "Edison.")
+    assert cache.stats()['entries'] == 3
+    assert cache.get_stale("who invented the radio") is None
+    assert cache.get_stale("who invented the telephone") == "answer 0"
+
+
+def test_expired_entries_are_evicted_first(cache):
+    cache.put("who invented the telephone", "old", ttl=-1)
+    cache.put("who invented the radio", "Marconi.")
+    cache.put("who invented the television", "Baird.")
+    cache.put("who invented the bulb", "Edison.")
+    assert cache.get_stale("who invented the telephone") is None
+    assert cache.get("who invented the radio") == "Marconi."
+
+
+def test_entries_persist(tmp_path):
+    path = str(tmp_path / 'answers.db')
+    AnswerCache(path).put("who invented the telephone", "Bell.")
+    assert AnswerCache(path).get("who invented the telephone") == "Bell."
+
+
+class StandIn:
+    """Local model server returning a fixed answer."""
+
+    def complete(self, prompt, max_tokens=300, temperature=0.6, timeout=None):
+        return "Stand-in answer.", None
+
+    def stream(self, prompt, max_tokens=300, temperature=0.6, on_usage=None):
+        yield "Stand-in answer."
+
+
+def test_local_backend_answers_are_not_cached(monkeypatch, cache):
+    monkeypatch.setenv('AI_BACKEND', 'local')
+    monkeypatch.setattr(ai_response, 'get_answer_cache', lambda: cache)
+    monkeypatch.setattr(ai_response.local_llm, 'get_local_llm', lambda: StandIn())
+    reply = ai_response.get_chat_response("who invented the telephone")
+    assert reply['choices'][0]['message']['content'] == "Stand-in answer."
+    assert ''.join(ai_response.stream_chat_response("who invented the radio")) == "Stand-in answer."
+    # Switching back to Gemini must not replay the stand-in's answers
+    assert cache.stats()['entries'] == 0
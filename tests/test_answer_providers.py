@@ -0,0 +1,116 @@
+import sys
+import threading
+import types
+from datetime import datetime
+
+import pytest
+
+import answer_providers
+from answer_providers import AnswerProvider, is_dynamic, render
+
+FROZEN = datetime(2026, 10, 19, 8, 58, 30)
+
+
+class FrozenClock:
+    @staticmethod
+    def now():
+        return FROZEN
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    """The registered providers with a frozen clock, a stub weather source
+    and nothing cached."""
+    monkeypatch.setattr(answer_providers, 'datetime', FrozenClock)
+    weather = types.SimpleNamespace(calls=0, result="It is 28 degrees and sunny in Varkala.",
+                                    ready=threading.Event())
+    weather.ready.set()
+
+    def get_weather_data(city):
+        weather.ready.wait(5)
+        weather.calls += 1
+        if isinstance(weather.result, Exception):
+            raise weather.result
+        return weather.result
+
+    monkeypatch.setitem(sys.modules, 'weather', types.SimpleNamespace(get_weather_data=get_weather_data))
+    for provider in answer_providers._providers.values():
+        monkeypatch.setattr(provider, 'value', None)
+        monkeypatch.setattr(provider, 'updated', 0.0)
+        monkeypatch.setattr(provider, 'failed', False)
+    return weather
+
+
+def refreshed(name):
+    """Wait for a background refresh of provider `name` to finish."""
+    provider = answer_providers._providers[name]
+    for thread in threading.enumerate():
+        if thread.name == f'Answer-{name}':
+            thread.join(timeout=5)
+    return provider
+
+
+def test_time_and_date_are_rendered(providers):
+    assert render("{time}") == "58 minutes past 08AM"
+    assert render("{date}") == "Today is October 19 2026"
+
+
+def test_plain_answers_pass_through(providers):
+    assert render("The library opens at eight.") == "The library opens at eight."
+    assert render("{unknown}") == "{unknown}"
+    assert render(["a", "list"]) == ["a", "list"]
+    assert is_dynamic("{weather}") and not is_dynamic("{unknown}") and not is_dynamic("weather")
+
+
+def test_answer_is_reused_within_its_ttl():
+    calls = []
+    provider = AnswerProvider('test', lambda: calls.append(1) or f"answer {len(calls)}", ttl=60)
+    assert provider.get() == "answer 1"
+    assert provider.get() == "answer 1"
+    provider.updated -= 61
+    assert provider.get() == "answer 2"
+
+
+def test_failed_refresh_keeps_the_last_answer():
+    results = iter(["first", RuntimeError("down")])
+
+    def fn():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    provider = AnswerProvider('test', fn, ttl=0)
+    assert provider.get() == "first"
+    assert provider.get() == "first"
+    assert provider.failed
+
+
+def test_weather_is_fetched_in_the_background(providers):
+    providers.ready.clear()
+    # Never fetched on the question path: the first asker hears "checking"
+    assert render("{weather}") == answer_providers._providers['weather'].pending
+    providers.ready.set()
+    refreshed('weather')
+    assert render("{weather}") == "It is 28 degrees and sunny in Varkala."
+    assert providers.calls == 1
+
+
+def test_weather_unavailable(providers):
+    providers.result = ConnectionError("no network")
+    render("{weather}")
+    provider = refreshed('weather')
+    assert provider.failed
+    assert render("{weather}") == provider.unavailable
+
+
+def test_stale_weather_is_still_said_while_refreshing(providers):
+    render("{weather}")
+    provider = refreshed('weather')
+    provider.updated -= provider.ttl + 1
+    providers.result = "Now it is raining."
+    providers.ready.clear()
+    assert render("{weather}") == "It is 28 degrees and sunny in Varkala."
+    providers.ready.set()
+    refreshed('weather')
+    assert render("{weather}") == "Now it is raining."
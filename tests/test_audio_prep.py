@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+import speech_recognition as sr
+
+import audio_prep
+from audio_prep import EncodedAudioData, condition_audio, normalize, resample, trim_silence
+
+RATE = 48000
+
+
+def tone(freq, seconds, rate=RATE, amplitude=8000):
+    t = np.arange(int(seconds * rate)) / rate
+    return (np.sin(2 * np.pi * freq * t) * amplitude).astype(np.int16)
+
+
+def silence(seconds, rate=RATE):
+    return np.zeros(int(seconds * rate), dtype=np.int16)
+
+
+def audio(samples, rate=RATE):
+    return sr.AudioData(samples.astype(np.int16).tobytes(), rate, 2)
+
+
+def dominant_frequency(samples, rate):
+    spectrum = np.abs(np.fft.rfft(samples))
+    return np.fft.rfftfreq(len(samples), 1 / rate)[np.argmax(spectrum)]
+
+
+def test_trim_keeps_speech_and_padding():
+    samples = np.concatenate((silence(1.0), tone(440, 0.5), silence(1.0)))
+    trimmed = trim_silence(samples, RATE)
+    expected = 0.5 + 2 * audio_prep.PAD_SECONDS
+    assert len(trimmed) / RATE == pytest.approx(expected, abs=2 * audio_prep.FRAME_SECONDS)
+
+
+def test_trim_of_silence_is_none():
+    assert trim_silence(silence(1.0), RATE) is None
+    # Quiet hiss stays under the absolute speech level
+    hiss = np.random.default_rng(0).normal(0, 20, RATE).astype(np.int16)
+    assert trim_silence(hiss, RATE) is None
+    assert trim_silence(silence(0.001), RATE) is None
+
+
+def test_resample_keeps_length_and_pitch():
+    out = resample(tone(440, 1.0), RATE)
+    assert len(out) == audio_prep.TARGET_RATE
+    assert dominant_frequency(out, audio_prep.TARGET_RATE) == pytest.approx(440, abs=2)
+
+
+def test_resample_filters_what_the_new_rate_cannot_carry():
+    # 12 kHz is above the 8 kHz Nyquist limit of 16 kHz audio and would alias
+    out = resample(tone(12000, 1.0), RATE)
+    assert np.abs(out).max() < 0.2 * 8000
+
+
+def test_resample_at_the_target_rate_is_a_copy():
+    samples = tone(440, 0.1, rate=audio_prep.TARGET_RATE)
+    assert np.array_equal(resample(samples, audio_prep.TARGET_RATE), samples)
+
+
+def test_normalize_gain_is_capped():
+    quiet = np.full(10, 100.0)
+    assert np.abs(normalize(quiet)).max() == pytest.approx(100 * audio_prep.MAX_GAIN)
+    loud = np.full(10, 20000.0)
+    assert np.abs(normalize(loud)).max() == pytest.approx(audio_prep.TARGET_PEAK)
+    assert not normalize(np.zeros(10)).any()
+
+
+def test_condition_audio_outputs_trimmed_16k_mono():
+    phrase = np.concatenate((silence(1.0), tone(440, 0.5), silence(1.0)))
+    out = condition_audio(audio(phrase), encode_flac=False)
+    assert isinstance(out, EncodedAudioData)
+    assert (out.sample_rate, out.sample_width) == (audio_prep.TARGET_RATE, 2)
+    seconds = len(out.get_raw_data()) / 2 / audio_prep.TARGET_RATE
+    assert seconds < 1.5
+
+
+def test_silent_phrase_is_not_sent():
+    assert condition_audio(audio(silence(2.0))) is None
+
+
+def test_flac_is_encoded_once(monkeypatch):
+    calls = []
+    encode = sr.AudioData.get_flac_data
+
+    def counting(self, convert_rate=None, convert_width=None):
+        calls.append((convert_rate, convert_width))
+        return encode(self, convert_rate, convert_width)
+
+    monkeypatch.setattr(sr.AudioData, 'get_flac_data', counting)
+    out = condition_audio(audio(np.concatenate((silence(0.5), tone(440, 0.5)))), encode_flac=True)
+    assert len(calls) == 1
+    # What recognize_google asks for is the pre-encoded data
+    flac = out.get_flac_data(convert_rate=None, convert_width=2)
+    assert flac.startswith(b'fLaC')
+    assert len(calls) == 1
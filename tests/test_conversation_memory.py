@@ -0,0 +1,84 @@
+import ai_response
+from ai_response import ConversationMemory
+from speech_replay import ScriptedRecognizer, StubSpeaker, Utterance, replay_utterance
+from sr_class import SpeechRecognitionThread
+
+
+def test_turns_past_the_limit_are_summarised():
+    memory = ConversationMemory(token_budget=1000, max_turns=2)
+    memory.add("who founded the school", "Dr P K Sukumaran. He started it in 1985.")
+    memory.add("how old is it", "About forty years old.")
+    memory.add("how many students", "Around two thousand.")
+    assert [q for q, _ in memory.turns] == ["how old is it", "how many students"]
+    # Only the first sentence of an evicted answer is kept
+    assert list(memory.summary) == ["who founded the school -> Dr P K Sukumaran."]
+
+
+def test_history_stays_within_the_token_budget():
+    memory = ConversationMemory(token_budget=60, max_turns=100)
+    for i in range(20):
+        memory.add(f"question number {i}", f"A fairly long answer to question {i}. " * 3)
+    assert len(memory.turns) >= 1
+    assert len(memory.summary) == 1 or memory._tokens(memory.summary) <= memory.token_budget // 3
+    assert "question number 19" in memory.context()
+    assert "question number 0" not in memory.context()
+
+
+def test_idle_history_expires():
+    memory = ConversationMemory(idle_timeout=60)
+    memory.add("who is the principal", "Dr Pooja S.")
+    assert memory.context()
+    memory.updated -= 61
+    assert memory.context() == ''
+    assert not memory
+
+
+def test_new_turn_after_idle_starts_afresh():
+    memory = ConversationMemory(idle_timeout=60)
+    memory.add("who is the principal", "Dr Pooja S.")
+    memory.updated -= 61
+    memory.add("when does the library open", "At eight.")
+    assert "principal" not in memory.context()
+
+
+def test_context_reaches_the_prompt(monkeypatch):
+    prompts = []
+
+    def generate(prompt, key, estimate=0):
+        prompts.append(prompt)
+        return ai_response._answer("It was founded in 1985.")
+
+    monkeypatch.setattr(ai_response, '_backend_key', lambda: ai_response.LOCAL_KEY)
+    monkeypatch.setattr(ai_response, '_generate_chat_response', generate)
+    memory = ConversationMemory()
+    memory.add("who founded mgm school", "Dr P K Sukumaran.")
+    ai_response.get_chat_response("and when was that", context=memory.context())
+    assert "Student: who founded mgm school" in prompts[0]
+    assert "OMNIS: Dr P K Sukumaran." in prompts[0]
+    assert prompts[0].endswith("Student's new question: and when was that")
+
+
+def test_follow_up_question_carries_the_conversation():
+    calls = []
+
+    def chat(question, context=None):
+        calls.append((question, context))
+        return ai_response._answer("Dr P K Sukumaran." if len(calls) == 1 else "In 1985.")
+
+    thread = SpeechRecognitionThread(StubSpeaker(), recognizer=ScriptedRecognizer(),
+                                     chat_fn=chat, school_fn=lambda q: None)
+    replay_utterance(thread, Utterance("omnis who founded the school"))
+    replay_utterance(thread, Utterance("and when was that"))
+    assert calls[0] == ("who founded the school", None)
+    assert "who founded the school" in calls[1][1]
+    thread.end_conversation()
+    assert not thread.memory
+
+
+def test_wake_word_starts_a_fresh_history():
+    thread = SpeechRecognitionThread(StubSpeaker(), recognizer=ScriptedRecognizer(),
+                                     chat_fn=lambda q, **kw: ai_response._answer("Yes."),
+                                     school_fn=lambda q: None)
+    thread.memory.add("old question", "old answer")
+    replay_utterance(thread, Utterance("omnis who is the principal"))
+    assert "old question" not in thread.memory.context()
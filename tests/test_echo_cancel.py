@@ -0,0 +1,108 @@
+import threading
+
+import numpy as np
+
+from echo_cancel import EchoReference, NLMSEchoCanceller
+from speech_replay import ScriptedRecognizer, StubSpeaker, Utterance, replay_utterance
+from sr_class import SpeechRecognitionThread
+
+
+def coloured_noise(n, seed=0):
+    """Speech-like reference: white noise through a resonant AR(2) filter."""
+    rng = np.random.default_rng(seed)
+    white = rng.standard_normal(n)
+    out = np.zeros(n)
+    for i in range(2, n):
+        out[i] = white[i] + 1.6 * out[i - 1] - 0.8 * out[i - 2]
+    return out * 3000 / out.std()
+
+
+def run(canceller, mic, ref, chunk=1024):
+    return np.concatenate([canceller.process(mic[i:i + chunk], ref[i:i + chunk])
+                           for i in range(0, len(mic), chunk)])
+
+
+def erle_db(mic, out):
+    return 10 * np.log10(np.sum(mic ** 2) / np.sum(out ** 2))
+
+
+def test_converges_on_coloured_reference_with_defaults():
+    n = 3 * 16000
+    ref = coloured_noise(n)
+    path = np.zeros(512)
+    path[[40, 90, 200]] = [0.6, -0.3, 0.1]
+    mic = np.convolve(ref, path)[:n] + np.random.default_rng(1).standard_normal(n) * 10
+    canceller = NLMSEchoCanceller()
+    out = run(canceller, mic, ref)
+    assert np.all(np.isfinite(canceller.weights))
+    assert erle_db(mic[n // 2:], out[n // 2:]) > 10
+    assert canceller.resets == 0
+
+
+def test_near_end_speech_is_kept():
+    n = 2 * 16000
+    ref = coloured_noise(n)
+    near = coloured_noise(n, seed=5)
+    mic = 0.5 * np.roll(ref, 30) + near
+    out = run(NLMSEchoCanceller(filter_len=64), mic, ref)
+    # What is left is mostly the local talker, not silence
+    assert erle_db(near[n // 2:], out[n // 2:]) < 3
+
+
+def test_silent_reference_passes_mic_through():
+    mic = np.arange(256, dtype=np.float64)
+    out = NLMSEchoCanceller(filter_len=32).process(mic, np.zeros(256))
+    assert np.array_equal(out, mic)
+
+
+def test_diverged_weights_are_reset():
+    canceller = NLMSEchoCanceller(filter_len=32)
+    canceller.weights[:] = 1e9
+    ref = coloured_noise(512)
+    out = canceller.process(0.5 * ref, ref)
+    assert canceller.resets == 1
+    assert np.all(np.isfinite(out))
+    assert np.sum(out ** 2) <= np.sum((0.5 * ref) ** 2) * 1.01
+
+
+def test_reference_lookup_aligns_clips():
+    reference = EchoReference()
+    reference.publish(np.ones(100), 100, start_time=10.0)
+    window = reference.get(9.5, 100, 100)
+    assert not window[:50].any()
+    assert window[50:99].all()
+    assert reference.is_active(10.5)
+    reference.clear()
+    assert not reference.is_active(10.5)
+
+
+class GatedStream:
+    """Streaming AI stand-in that stops after its first sentence until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def __call__(self, question, **kwargs):
+        yield "Once upon a time there was a robot in a school. "
+        self.release.wait(5)
+        yield "It answered every question the students asked. "
+
+
+def test_wake_word_interrupts_streamed_answer():
+    stream = GatedStream()
+    thread = SpeechRecognitionThread(StubSpeaker(), recognizer=ScriptedRecognizer(), stream_fn=stream,
+                                     school_fn=lambda q: "The principal is Mrs. Example." if 'principal' in q else None)
+    thread.aec = True
+
+    replay_utterance(thread, Utterance("omnis tell me a story"))
+    # The listener is free again while the answer streams
+    assert thread._answering()
+    replay_utterance(thread, Utterance("that is nice"))
+    assert thread._answering()
+    replay_utterance(thread, Utterance("omnis who is the principal"))
+    stream.release.set()
+    thread._answer_thread.join(5)
+
+    spoken = [text for _, text in thread.speaker.events]
+    assert "The principal is Mrs. Example." in spoken
+    assert not any("every question" in text for text in spoken)
@@ -0,0 +1,69 @@
+from greetings import (CASUAL_SALUTATION, EVERYONE, NAME_JOINER, SCHOOL_WELCOME, GreetingBatcher,
+                       casual_greeting, full_greeting, group_greeting, join_names)
+
+
+def test_join_names():
+    assert join_names(["Rishi"]) == "Rishi"
+    assert join_names(["Rishi", "Suji"]) == "Rishi and Suji"
+    assert join_names(["Rishi", "Suji", "Gayathri"]) == "Rishi, Suji and Gayathri"
+
+
+def test_one_person_gets_the_usual_greeting():
+    assert group_greeting(["Rishi"], formal=True, greeting_time="Good morning")[0] == \
+        full_greeting("Rishi", "Good morning")
+    assert group_greeting(["Rishi"], formal=False)[0] == casual_greeting("Rishi")
+
+
+def test_several_names_in_one_greeting():
+    text, segments = group_greeting(["Rishi", "Suji", "Gayathri"], formal=True, greeting_time="Good morning")
+    assert text == f"Good morning Rishi, Suji and Gayathri. {SCHOOL_WELCOME}"
+    assert segments == ["Good morning", "Rishi", "Suji", NAME_JOINER, "Gayathri", SCHOOL_WELCOME]
+
+
+def test_crowd_is_capped():
+    names = ["Rishi", "Suji", "Gayathri", "Anu", "Ravi"]
+    text, segments = group_greeting(names, formal=False, max_names=4)
+    assert text == f"{CASUAL_SALUTATION} Rishi, Suji, Gayathri and {EVERYONE}!"
+    assert segments == [CASUAL_SALUTATION, "Rishi", "Suji", "Gayathri", NAME_JOINER, EVERYONE]
+    # Exactly at the cap everyone is still named
+    assert "Anu" in group_greeting(names[:4], formal=False, max_names=4)[0]
+
+
+def test_batch_waits_for_its_window():
+    batcher = GreetingBatcher(window=1.0)
+    assert not batcher.due(now=100.0)
+    batcher.add("Rishi", formal=False, now=100.0)
+    batcher.add("Suji", formal=False, now=100.6)
+    # The window runs from the first arrival, later ones don't extend it
+    assert not batcher.due(now=100.9)
+    assert batcher.due(now=101.0)
+
+
+def test_flush_greets_everyone_pending_once():
+    batcher = GreetingBatcher(window=1.0)
+    batcher.add("Rishi", formal=False, now=0.0)
+    batcher.add("Suji", formal=False, now=0.1)
+    batcher.add("Rishi", formal=False, now=0.2)
+    assert "Rishi" in batcher and len(batcher) == 2
+    text, segments, names = batcher.flush()
+    assert text == f"{CASUAL_SALUTATION} Rishi and Suji!"
+    assert names == ["Rishi", "Suji"]
+    assert batcher.flush() is None
+    assert not batcher.due(now=10.0)
+
+
+def test_batch_is_formal_if_anyone_is_new():
+    batcher = GreetingBatcher(window=1.0)
+    batcher.add("Rishi", formal=False, now=0.0)
+    batcher.add("Suji", formal=True, now=0.1)
+    text, _, _ = batcher.flush()
+    assert text.endswith(SCHOOL_WELCOME)
+
+
+def test_batcher_applies_the_cap_but_reports_everyone():
+    batcher = GreetingBatcher(window=1.0, max_names=2)
+    for i, name in enumerate(["Rishi", "Suji", "Gayathri"]):
+        batcher.add(name, formal=False, now=i * 0.1)
+    text, _, names = batcher.flush()
+    assert text == f"{CASUAL_SALUTATION} Rishi and {EVERYONE}!"
+    assert names == ["Rishi", "Suji", "Gayathri"]
@@ -0,0 +1,143 @@
+import pytest
+
+import school_data
+from kb_search import BM25Index, FuzzyMatcher, question_type, tokenize, words
+
+DOCS = [
+    ("Which chief minister visited our school?", "Shri Oommen Chandy"),
+    ("Which president visited our school?", "Dr A P J Abdul Kalam"),
+    ("When are fees due?", "Fees must be paid by the 5th of each month."),
+    ("How do I pay fees?", "Fees can be paid online or at the office."),
+    ("What are the library hours?", "The library is open from 8 AM to 4 PM."),
+    ("Is there a school counselor?", "Yes, a qualified counselor is available."),
+]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return BM25Index(DOCS)
+
+
+def test_question_words_are_terms():
+    assert tokenize("Who visited the libraries?") == ['who', 'visit', 'library']
+
+
+def test_search_ranks_by_score(index):
+    hits = index.search("when are the fees due", k=2)
+    assert [answer for answer, _ in hits] == [DOCS[2][1], DOCS[3][1]]
+    assert hits[0][1] == pytest.approx(1.0)
+
+
+def test_unknown_words_give_no_hits(index):
+    assert index.search("photosynthesis") == []
+    assert index.best_answer("photosynthesis") is None
+
+
+def test_paraphrase_is_answered(index):
+    assert index.best_answer("which chief minister came to visit") == "Shri Oommen Chandy"
+    assert index.best_answer("library hours") == DOCS[4][1]
+
+
+def test_single_content_word_question_fully_covered(index):
+    assert index.best_answer("is there a counselor") == DOCS[5][1]
+
+
+def test_unknown_words_count_against_the_match(index):
+    assert index.best_answer("who is the prime minister") is None
+
+
+def test_question_type_must_match(index):
+    # Shares "chief minister", but asks who holds the office, not who visited
+    assert question_type("who is the chief minister") != question_type("which chief minister visited")
+    assert index.best_answer("who is the chief minister") is None
+
+
+def test_near_tie_is_not_decided(index):
+    # "visited our school" fits both visits equally well
+    assert index.best_answer("who visited our school") is None
+
+
+def test_one_shared_word_is_not_enough(index):
+    assert index.best_answer("how do plants pay for food") is None
+
+
+def test_related_answer_is_looser(index):
+    # Too ambiguous to answer outright, but better than an apology
+    assert index.best_answer("fees") is None
+    assert index.related_answer("fees") in (DOCS[2][1], DOCS[3][1])
+    # Still the same kind of question, and still about the question's words
+    assert index.related_answer("who is the chief minister") is None
+    assert index.related_answer("photosynthesis") is None
+
+
+@pytest.mark.parametrize('question, expected', [
+    ("which chief minister visited our school", "Shri Oommen Chandy"),
+    ("how many libraries", "We have three digital libraries"),
+    ("who laid the foundation stone", "Nitya Haritha Nayakan Mister Prem Nasir"),
+    ("what is the sister concern of mgm", "KPM model school, Mayyanad"),
+    ("how long can i keep library books", "Books can be issued for 2 weeks"),
+])
+def test_school_questions_answered_locally(question, expected):
+    assert school_data.get_school_answer_enhanced(question).startswith(expected)
+
+
+@pytest.mark.parametrize('question', [
+    "who is the chief minister",
+    "what is the mgm school",
+    "who is the prime minister",
+    "who is the president of america",
+    "what is a library",
+    "where is the canteen",
+    "tell me about black holes",
+])
+def test_school_questions_left_to_the_ai(question):
+    assert school_data.get_school_answer_enhanced(question) is None
+
+
+@pytest.fixture(scope='module')
+def fuzzy():
+    return FuzzyMatcher({w for doc in DOCS for text in doc for w in words(text)}
+                        | {'principal', 'mgm', 'prem', 'indian', 'inagurated'})
+
+
+@pytest.mark.parametrize('heard, meant', [
+    ("who is our principle", "who is our principal"),
+    ("how old is mg m", "how old is mgm"),
+    ("what are the liberary hours", "what are the library hours"),
+    ("is there a counsellor", "is there a counselor"),
+])
+def test_misheard_words_are_corrected(fuzzy, heard, meant):
+    assert fuzzy.correct(words(heard)) == words(meant)
+
+
+@pytest.mark.parametrize('question', [
+    "who is the prime minister",      # sounds like "prem", but shares too little
+    "what is the capital of india",   # "indian" is another form, not a mishearing
+    "who won the world cup",
+    "the mg is fast",                  # both words known: not rejoined
+])
+def test_correct_words_are_left_alone(fuzzy, question):
+    assert fuzzy.correct(words(question)) == words(question)
+
+
+@pytest.mark.parametrize('question, expected', [
+    ("who is our principle", "Dr Pooja S"),
+    ("how old is MG M", "Our school is forty years old"),
+    ("what are the liberary hours", "The library is open"),
+    ("what is the kanteen policy", "Only healthy food"),
+    ("who inaugurated the innovation center", "Honourable Governer Shri Arif Mohammed Khan"),
+])
+def test_misheard_school_questions_answered(question, expected):
+    assert school_data.get_school_answer_enhanced(question).startswith(expected)
+
+
+@pytest.mark.parametrize('question', [
+    "who is the prime minister",
+    "who is the prime minister of india",
+    "when was the school inaugurated",
+    "who inaugurated the school",
+    "what is the principle of relativity",
+    "what is data",
+])
+def test_corrections_do_not_invent_answers(question):
+    assert school_data.get_school_answer_enhanced(question) is None
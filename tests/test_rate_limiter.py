@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+
+import ai_response
+from ai_executor import AIExecutor, CircuitBreaker
+from rate_limiter import RateLimiter, TokenBucket, UsageLedger, estimate_tokens
+
+
+def test_bucket_refills_at_its_rate():
+    bucket = TokenBucket(60)
+    bucket.level = 0
+    bucket.refill(bucket._stamp + 2)
+    assert bucket.level == pytest.approx(2)
+    bucket.refill(bucket._stamp + 600)
+    assert bucket.level == 60
+
+
+def test_high_priority_is_shed_once_empty():
+    limiter = RateLimiter(rpm=2, tpm=10000, queue_wait=0)
+    assert limiter.acquire(10)
+    assert limiter.acquire(10)
+    assert not limiter.acquire(10)
+    assert limiter.shed == 1
+
+
+def test_low_priority_keeps_off_the_reserve():
+    limiter = RateLimiter(rpm=4, tpm=10000, reserve=0.5, queue_wait=0)
+    assert limiter.acquire(10, 'low')
+    assert limiter.acquire(10, 'low')
+    assert not limiter.acquire(10, 'low')
+    # The reserve is still there for a waiting student
+    assert limiter.acquire(10, 'high')
+
+
+def test_settle_returns_unused_tokens():
+    limiter = RateLimiter(rpm=10, tpm=6000, queue_wait=0)
+    limiter.acquire(1000)
+    limiter.settle(1000, 200)
+    assert limiter.tokens.level == pytest.approx(5800, abs=5)
+    limiter.settle(1000, 0)
+    assert limiter.tokens.level <= limiter.tokens.capacity
+
+
+def test_ledger_totals_per_day(tmp_path):
+    ledger = UsageLedger(str(tmp_path / 'usage.db'))
+    ledger.record_call(100, 20, 1.0)
+    ledger.record_call(50, 10, 3.0)
+    ledger.record_error()
+    ledger.record_shed()
+    day = UsageLedger(ledger.path).day()
+    assert (day['calls'], day['errors'], day['shed']) == (2, 1, 1)
+    assert (day['tokens_in'], day['tokens_out']) == (150, 30)
+    assert day['latency_mean'] == pytest.approx(2.0)
+    assert day['latency_max'] == pytest.approx(3.0)
+
+
+def test_ledger_empty_day(tmp_path):
+    assert UsageLedger(str(tmp_path / 'usage.db')).day('2000-01-01')['calls'] == 0
+
+
+class FakeModel:
+    """Returns (or raises) the scripted results in order."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def generate_content(self, payload, generation_config=None):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def reply(text, tokens_in, tokens_out):
+    return SimpleNamespace(text=text, candidates=[],
+                           usage_metadata=SimpleNamespace(prompt_token_count=tokens_in,
+                                                          candidates_token_count=tokens_out))
+
+
+@pytest.fixture
+def gemini(monkeypatch, tmp_path):
+    """Route `_generate_chat_response` to a fake model, limiter and ledger."""
+    limiter = RateLimiter(rpm=10, tpm=60000, queue_wait=0)
+    ledger = UsageLedger(str(tmp_path / 'usage.db'))
+    env = SimpleNamespace(limiter=limiter, ledger=ledger, model=None)
+    client = SimpleNamespace(model=lambda key: env.model, generation_config=lambda *a: None)
+    monkeypatch.setattr(ai_response, 'get_gemini_client', lambda: client)
+    monkeypatch.setattr(ai_response, 'get_rate_limiter', lambda: limiter)
+    monkeypatch.setattr(ai_response, 'get_usage_ledger', lambda: ledger)
+    monkeypatch.setattr(ai_response.local_llm, 'backend_name', lambda: 'gemini')
+    monkeypatch.setattr(ai_response.time, 'sleep', lambda s: None)
+    return env
+
+
+def generate(gemini, payload="what is a volcano"):
+    estimate = ai_response._reserve_quota(payload, 'high')
+    return ai_response._generate_chat_response(payload, 'key', estimate)
+
+
+def test_retry_takes_its_own_quota_and_settles_once(gemini):
+    gemini.model = FakeModel(reply('', 10, 0), reply('Molten rock comes out.', 10, 5))
+    result = generate(gemini)
+    assert result['choices'][0]['message']['content'] == 'Molten rock comes out.'
+    assert gemini.limiter.requests.level == pytest.approx(8, abs=0.01)
+    # Each request is charged exactly its real usage
+    assert gemini.limiter.tokens.level == pytest.approx(60000 - 25, abs=5)
+    assert gemini.ledger.day()['calls'] == 2
+
+
+def test_failed_attempt_is_retried_with_fresh_quota(gemini):
+    gemini.model = FakeModel(RuntimeError("connection reset"), reply('Molten rock.', 10, 5))
+    generate(gemini)
+    assert gemini.model.calls == 2
+    assert gemini.limiter.requests.level == pytest.approx(8, abs=0.01)
+    assert gemini.ledger.day()['calls'] == 1
+
+
+def test_retry_without_quota_is_skipped(gemini):
+    gemini.limiter.requests.level = 1
+    gemini.model = FakeModel(RuntimeError("connection reset"), reply('Molten rock.', 10, 5))
+    with pytest.raises(RuntimeError, match="connection reset"):
+        generate(gemini)
+    assert gemini.model.calls == 1
+
+
+def test_refund_returns_the_reservation():
+    limiter = RateLimiter(rpm=10, tpm=6000, queue_wait=0)
+    limiter.acquire(1000)
+    limiter.refund(1000)
+    assert limiter.requests.level == pytest.approx(10, abs=0.01)
+    assert limiter.tokens.level == pytest.approx(6000, abs=1)
+
+
+def open_breaker(monkeypatch, reset_timeout=60):
+    executor = AIExecutor(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=reset_timeout), deadline=1)
+    executor.breaker.record_failure()
+    monkeypatch.setattr(ai_response, 'get_ai_executor', lambda: executor)
+    monkeypatch.setattr(ai_response, '_backend_key', lambda: 'key')
+    monkeypatch.setattr(ai_response, 'get_answer_cache', lambda: None)
+    monkeypatch.setattr(ai_response, '_local_fallback', lambda payload, e: ai_response.OFFLINE_ANSWER)
+    return executor
+
+
+def test_open_breaker_takes_no_quota(gemini, monkeypatch):
+    open_breaker(monkeypatch)
+    ai_response.get_chat_response("what is a volcano")
+    list(ai_response.stream_chat_response("what is a glacier"))
+    assert gemini.limiter.requests.level == pytest.approx(10, abs=0.01)
+
+
+def test_refused_trial_is_refunded(gemini, monkeypatch):
+    executor = open_breaker(monkeypatch, reset_timeout=0)
+    # Another call holds the half-open trial, so this one is refused after reserving
+    assert executor.breaker.allow()
+    ai_response.get_chat_response("what is a volcano")
+    assert gemini.limiter.requests.level == pytest.approx(10, abs=0.01)
+    assert gemini.limiter.tokens.level == pytest.approx(60000, abs=1)
+
+
+def test_estimate_includes_the_answer_budget():
+    assert estimate_tokens("x" * 40, 300) == 311
@@ -0,0 +1,102 @@
+import json
+import os
+import pickle
+import threading
+
+import pytest
+
+import perf_metrics
+import school_data
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'school_kb.json')
+QUESTIONS = ["who is our principal", "which chief minister visited our school", "how many libraries",
+             "what are the library hours", "who is the chief minister", "can i bring my phone"]
+
+
+@pytest.fixture
+def kb_file(tmp_path, monkeypatch):
+    """A private copy of the knowledge base and index cache; the live
+    version is restored afterwards."""
+    monkeypatch.setattr(school_data, 'INDEX_CACHE_DIR', str(tmp_path / 'cache'))
+    path = tmp_path / 'kb.json'
+    with open(SOURCE) as f:
+        path.write_text(f.read())
+    live = school_data._kb
+    yield path
+    school_data._install(live)
+
+
+def edit(path, question, answer):
+    data = json.loads(path.read_text())
+    data['custom_qa'][question] = answer
+    path.write_text(json.dumps(data))
+
+
+def answers(kb):
+    school_data._install(kb)
+    return [school_data.get_school_answer_enhanced(q) for q in QUESTIONS]
+
+
+def test_cached_index_answers_like_a_fresh_one(kb_file):
+    built = school_data.load_knowledge_base(str(kb_file))
+    assert os.listdir(school_data.INDEX_CACHE_DIR) == [os.path.basename(school_data._index_cache_path(built.digest))]
+    hits = perf_metrics.counter('kb.index_cache_hits')
+    cached = school_data.load_knowledge_base(str(kb_file))
+    assert perf_metrics.counter('kb.index_cache_hits') == hits + 1
+    assert answers(cached) == answers(built)
+
+
+def test_cache_never_unpickles(kb_file):
+    digest = school_data.load_knowledge_base(str(kb_file)).digest
+    ran = []
+
+    class Payload:
+        def __reduce__(self):
+            return ran.append, ('unpickled',)
+
+    with open(school_data._index_cache_path(digest), 'wb') as f:
+        pickle.dump(Payload(), f)
+    assert school_data._load_indexes(digest) is None
+    assert ran == []
+    # The planted file is replaced by a rebuilt index
+    school_data.load_knowledge_base(str(kb_file))
+    assert school_data._load_indexes(digest) is not None
+
+
+def test_cache_for_other_content_is_ignored(kb_file):
+    digest = school_data.load_knowledge_base(str(kb_file)).digest
+    other = 'f' * 32 + digest[32:]
+    os.rename(school_data._index_cache_path(digest), school_data._index_cache_path(other))
+    assert school_data._load_indexes(other) is None
+
+
+def test_reload_swaps_in_new_content(kb_file):
+    edit(kb_file, "Who is the principal?", "Mr New is our principal.")
+    old = school_data._kb
+    assert school_data.reload(str(kb_file))
+    assert not school_data.reload(str(kb_file))
+    assert school_data.get_school_answer_enhanced("who is the principal") == "Mr New is our principal."
+    # Lookups cached for the old version don't leak into the new one
+    school_data._install(old)
+    assert school_data.get_school_answer_enhanced("who is the principal") != "Mr New is our principal."
+
+
+def test_broken_file_keeps_current_version(kb_file):
+    school_data.reload(str(kb_file))
+    live = school_data._kb
+    kb_file.write_text('{"custom_qa": ')
+    assert not school_data.reload(str(kb_file))
+    assert school_data._kb is live
+
+
+def test_watcher_reloads_on_change(kb_file):
+    school_data.reload(str(kb_file))
+    changed = threading.Event()
+    watcher = school_data.KnowledgeBaseWatcher(str(kb_file), interval=0.05, on_change=changed.set)
+    watcher.start()
+    try:
+        edit(kb_file, "What is the school bus number?", "Bus number 7.")
+        assert changed.wait(5)
+        assert school_data.get_school_answer_enhanced("what is the school bus number") == "Bus number 7."
+    finally:
+        watcher.stop()
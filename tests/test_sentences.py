@@ -0,0 +1,64 @@
+from speaker import MAX_CHUNK_CHARS, iter_sentences, split_sentences
+
+
+def test_splits_at_sentence_ends():
+    assert split_sentences("The library opens at eight. It closes at four! Any questions?") == [
+        "The library opens at eight.", "It closes at four!", "Any questions?"]
+
+
+def test_abbreviations_and_decimals_stay_in_the_sentence():
+    text = "Our principal is Dr. Pooja S and she is in her office. The fee is 3.5 thousand per term."
+    assert split_sentences(text) == ["Our principal is Dr. Pooja S and she is in her office.",
+                                     "The fee is 3.5 thousand per term."]
+
+
+def test_initials_stay_in_the_sentence():
+    assert split_sentences("Dr. A. P. J. Abdul Kalam visited our school. He spoke to us.") == [
+        "Dr. A. P. J. Abdul Kalam visited our school.", "He spoke to us."]
+
+
+def test_trailing_fragment_is_kept():
+    assert split_sentences("The bell rings at nine. Then assembly starts") == [
+        "The bell rings at nine.", "Then assembly starts"]
+
+
+def test_short_fragments_are_merged():
+    assert split_sentences("Yes. The canteen is open until two.") == ["Yes. The canteen is open until two."]
+
+
+def test_long_sentence_is_cut_at_clauses():
+    text = ", ".join(f"clause number {i} of a very long answer" for i in range(12)) + "."
+    chunks = split_sentences(text)
+    assert len(chunks) > 1
+    assert all(len(c) <= MAX_CHUNK_CHARS for c in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_list_of_texts():
+    assert split_sentences(["Good morning everyone.", "", "Welcome to school."]) == [
+        "Good morning everyone.", "Welcome to school."]
+
+
+def test_stream_yields_each_sentence_once_complete():
+    pieces = iter(["The library opens at eight", ". It closes", " at four. And"])
+    sentences = iter_sentences(pieces)
+    assert next(sentences) == "The library opens at eight."
+    assert next(sentences) == "It closes at four."
+    assert list(sentences) == ["And"]
+
+
+def test_stream_chunk_boundaries_mid_sentence():
+    pieces = ["Ask Dr", ". Rao about the 3", ".5 hour exam. It is on Mon", "day."]
+    assert list(iter_sentences(pieces)) == ["Ask Dr. Rao about the 3.5 hour exam.", "It is on Monday."]
+
+
+def test_stream_waits_for_whitespace_after_a_full_stop():
+    # "3." may be the start of "3.5"
+    sentences = iter_sentences(iter(["Pi is about 3.", "14 and that is a long number. Yes"]))
+    assert next(sentences) == "Pi is about 3.14 and that is a long number."
+    assert list(sentences) == ["Yes"]
+
+
+def test_stream_merges_short_sentences():
+    assert list(iter_sentences(["Yes. ", "No. ", "The answer is forty two. "])) == [
+        "Yes. No. The answer is forty two."]
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+import speaker
+from speaker import GTTSThread, SpeechMessage, SpeechQueue
+
+
+def drain(queue, now=None):
+    out = []
+    while True:
+        msg = queue.pop(now)
+        if msg is None:
+            return out
+        out.append(msg.text)
+
+
+def test_ack_then_answer_in_order_before_greetings():
+    queue = SpeechQueue()
+    queue.push(SpeechMessage("Hello Anu", kind='greeting'))
+    queue.push(SpeechMessage("Yes?", kind='ack'))
+    queue.push(SpeechMessage("The library opens at nine.", kind='answer'))
+    queue.push(SpeechMessage("It closes at four.", kind='answer'))
+    assert drain(queue) == ["Yes?", "The library opens at nine.", "It closes at four.", "Hello Anu"]
+
+
+def test_long_answer_does_not_starve_the_ack():
+    queue = SpeechQueue()
+    queue.push(SpeechMessage("Yes?", kind='ack'))
+    queue.push(SpeechMessage("A very long answer.", kind='answer'))
+    # Popped before the ack's 4 s TTL runs out, whatever the answer's length
+    assert queue.pop().text == "Yes?"
+
+
+def test_duplicate_is_coalesced():
+    queue = SpeechQueue()
+    assert queue.push(SpeechMessage("Yes?", kind='ack'))
+    assert not queue.push(SpeechMessage("Yes?", kind='ack'))
+    assert len(queue) == 1
+    assert drain(queue) == ["Yes?"]
+
+
+def test_same_key_supersedes_queued_message():
+    queue = SpeechQueue()
+    queue.push(SpeechMessage("Good morning Anu", kind='greeting', key='anu'))
+    queue.push(SpeechMessage("Hello Ravi", kind='greeting', key='ravi'))
+    queue.push(SpeechMessage("Welcome back Anu", kind='greeting', key='anu'))
+    assert len(queue) == 2
+    assert drain(queue) == ["Hello Ravi", "Welcome back Anu"]
+
+
+def test_stale_messages_are_dropped():
+    queue = SpeechQueue()
+    queue.push(SpeechMessage("Hello Anu", kind='greeting', ttl=1.0))
+    queue.push(SpeechMessage("An answer is never stale.", kind='answer'))
+    assert drain(queue, now=time.time() + 60) == ["An answer is never stale."]
+    assert len(queue) == 0
+
+
+def test_coalescing_refreshes_the_deadline():
+    queue = SpeechQueue()
+    first = SpeechMessage("Hello Anu", kind='greeting', ttl=1.0)
+    first.deadline -= 10
+    queue.push(first)
+    queue.push(SpeechMessage("Hello Anu", kind='greeting', ttl=1.0))
+    assert drain(queue) == ["Hello Anu"]
+
+
+def test_more_urgent_ignores_dropped_messages():
+    queue = SpeechQueue()
+    queue.push(SpeechMessage("Hi Anu", kind='greeting', key='anu'))
+    assert not queue.has_more_urgent('answer')
+    assert queue.has_more_urgent('greeting') is False
+    queue.push(SpeechMessage("Yes?", kind='ack'))
+    assert queue.has_more_urgent('greeting')
+    # An ack queued during an answer waits its turn instead of cutting it off
+    assert not queue.has_more_urgent('answer')
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        SpeechMessage("hi", kind='shout')
+
+
+
+def test_speaker_says_ack_before_the_answer(monkeypatch):
+    played = []
+    monkeypatch.setattr(speaker, 'synthesize', lambda text: text)
+    monkeypatch.setattr(GTTSThread, '_segments_playable', lambda self: False)
+    monkeypatch.setattr(GTTSThread, '_play_file', lambda self, filename: played.append(filename))
+    # Put back afterwards, or later tests would see the robot as just spoken
+    monkeypatch.setattr(speaker, '_last_spoken_time', speaker._last_spoken_time)
+    thread = GTTSThread()
+    # Queued before the thread runs, as when the answer is ready at once
+    thread.speak("Hello Anu", kind='greeting')
+    thread.speak("Yes?", kind='ack')
+    thread.speak("The library opens at nine.", kind='answer')
+    thread.start()
+    try:
+        deadline = time.time() + 5
+        while len(played) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        thread.stop()
+        thread.join(timeout=5)
+    assert played == ["Yes?", "The library opens at nine.", "Hello Anu"]
@@ -0,0 +1,65 @@
+from speech_replay import ScriptedRecognizer, StubChat, StubSpeaker, Utterance, WavAudioSource, replay_utterance
+from sr_class import SpeechRecognitionThread
+from greetings import ACK_PHRASE
+
+
+def make_thread(school=None, chat=None):
+    return SpeechRecognitionThread(StubSpeaker(), recognizer=ScriptedRecognizer(),
+                                   chat_fn=chat or StubChat(answer="Forty two."),
+                                   school_fn=lambda q: school)
+
+
+def spoken(thread):
+    return [text for _, text in thread.speaker.events]
+
+
+def test_wake_word_question_goes_to_ai():
+    chat = StubChat(answer="Forty two.")
+    thread = make_thread(chat=chat)
+    timings = replay_utterance(thread, Utterance("omnis what is the answer"))
+    assert spoken(thread) == [ACK_PHRASE, "Forty two."]
+    assert chat.calls == ["what is the answer"]
+    assert {'asr', 'kb_lookup', 'llm', 'time_to_first_audio', 'speech_to_answer'} <= set(timings)
+
+
+def test_school_answer_skips_ai():
+    chat = StubChat()
+    thread = make_thread(school="Our principal is Mrs. Example.", chat=chat)
+    replay_utterance(thread, Utterance("hello who is our principal"))
+    assert spoken(thread) == [ACK_PHRASE, "Our principal is Mrs. Example."]
+    assert chat.calls == []
+
+
+def test_follow_up_needs_no_wake_word():
+    thread = make_thread()
+    replay_utterance(thread, Utterance("omnis what is the answer"))
+    replay_utterance(thread, Utterance("and why is that"))
+    assert spoken(thread) == ["Forty two."]
+
+
+def test_without_wake_word_nothing_is_said():
+    thread = make_thread()
+    timings = replay_utterance(thread, Utterance("what is the answer"))
+    assert spoken(thread) == []
+    assert 'speech_to_answer' not in timings
+
+
+def test_unrecognized_audio_is_ignored():
+    thread = make_thread()
+    replay_utterance(thread, Utterance(""))
+    assert spoken(thread) == []
+
+
+def test_new_conversation_is_acked_again():
+    thread = make_thread()
+    replay_utterance(thread, Utterance("omnis what is the answer"))
+    timings = replay_utterance(thread, Utterance("omnis and the question", new_conversation=True))
+    assert spoken(thread) == [ACK_PHRASE, "Forty two."]
+    assert 'ack_handoff' in timings
+
+
+def test_corpus_times_every_wake_word_ack():
+    from speech_benchmark import DEFAULT_CORPUS, run_corpus
+    corpus = WavAudioSource.from_manifest(DEFAULT_CORPUS)
+    results = run_corpus(DEFAULT_CORPUS, asr_latency=0, llm_latency=0, tts_latency=0)
+    assert results['ack_handoff']['count'] == sum(u.new_conversation for u in corpus) > 1
@@ -0,0 +1,53 @@
+import os
+
+from tts_cache import TTSCache, cache_key
+
+
+def test_key_ignores_whitespace_but_not_voice():
+    assert cache_key("Hello  there\n", 'en', 'com', 'gtts') == cache_key("Hello there", 'en', 'com', 'gtts')
+    assert cache_key("Hello there", 'en', 'com', 'gtts') != cache_key("Hello there", 'en', 'co.in', 'gtts')
+    assert cache_key("Hello there", 'en', 'com', 'gtts') != cache_key("Hello there", 'en', 'com', 'espeak')
+
+
+def test_put_then_get(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    assert cache.get("hi", 'en', 'com', 'gtts') is None
+    path = cache.put("hi", 'en', 'com', 'gtts', b'mp3 data')
+    assert cache.get("hi", 'en', 'com', 'gtts') == path
+    with open(path, 'rb') as f:
+        assert f.read() == b'mp3 data'
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    assert not [n for n in os.listdir(tmp_path) if n.endswith('.tmp')]
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=250)
+    cache.put("a", 'en', 'com', 'gtts', b'x' * 100)
+    cache.put("b", 'en', 'com', 'gtts', b'x' * 100)
+    cache.get("a", 'en', 'com', 'gtts')
+    cache.put("c", 'en', 'com', 'gtts', b'x' * 100)
+    assert cache.contains("a", 'en', 'com', 'gtts')
+    assert not cache.contains("b", 'en', 'com', 'gtts')
+    assert cache.contains("c", 'en', 'com', 'gtts')
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 200
+
+
+def test_entry_larger_than_cache_is_kept(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=10)
+    cache.put("long answer", 'en', 'com', 'gtts', b'x' * 100)
+    assert cache.contains("long answer", 'en', 'com', 'gtts')
+
+
+def test_entries_survive_restart(tmp_path):
+    TTSCache(str(tmp_path)).put("hi", 'en', 'com', 'espeak', b'RIFF', ext='.wav')
+    cache = TTSCache(str(tmp_path))
+    assert cache.get("hi", 'en', 'com', 'espeak').endswith('.wav')
+
+
+def test_deleted_file_is_a_miss(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    os.remove(cache.put("hi", 'en', 'com', 'gtts', b'data'))
+    assert cache.get("hi", 'en', 'com', 'gtts') is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,86 @@
+import pytest
+
+import tts_backends
+from tts_backends import TTSBackend, TTSRouter
+from tts_cache import TTSCache
+
+
+class StubBackend(TTSBackend):
+    """Returns fixed audio, or raises while `failing`."""
+
+    def __init__(self, name, ext='.mp3', installed=True):
+        self.name = name
+        self.ext = ext
+        self.installed = installed
+        self.failing = False
+        self.calls = []
+
+    def available(self):
+        return self.installed
+
+    def synthesize(self, text, lang, tld):
+        self.calls.append(text)
+        if self.failing:
+            raise ConnectionError("no network")
+        return f"{self.name}:{text}".encode()
+
+
+@pytest.fixture
+def router(tmp_path):
+    return TTSRouter(TTSCache(str(tmp_path)), online=StubBackend('gtts'),
+                     local=StubBackend('espeak', ext='.wav'), mode='auto')
+
+
+def measured(router, seconds):
+    router.latency.add(seconds)
+    router._last_online = tts_backends.time.time()
+
+
+def test_unmeasured_gtts_is_tried_first(router):
+    assert router.choose("Hello", 'en', 'com') is router.online
+
+
+def test_cached_gtts_audio_is_reused_even_when_slow(router):
+    router.synthesize("Good morning", 'en', 'com')
+    measured(router, 10.0)
+    assert router.choose("Good morning", 'en', 'com') is router.online
+
+
+def test_slow_gtts_routes_to_the_local_engine(router):
+    measured(router, tts_backends.MAX_WAIT + 1)
+    assert router.choose("A long answer about the library timings.", 'en', 'com') is router.local
+
+
+def test_short_phrases_need_a_fast_gtts(router):
+    measured(router, (tts_backends.SHORT_MAX_WAIT + tts_backends.MAX_WAIT) / 2)
+    assert router.choose("Hello Anu", 'en', 'com') is router.local
+    assert router.choose("x" * (tts_backends.SHORT_CHARS + 1), 'en', 'com') is router.online
+
+
+def test_failed_gtts_falls_back_and_stays_local(router):
+    router.online.failing = True
+    path = router.synthesize("Hello Anu", 'en', 'com')
+    assert path.endswith('.wav')
+    with open(path, 'rb') as f:
+        assert f.read() == b"espeak:Hello Anu"
+    assert router.is_offline()
+    # Offline: the next phrase doesn't wait for gTTS to fail again
+    router.synthesize("Good morning", 'en', 'com')
+    assert router.online.calls == ["Hello Anu"]
+
+
+def test_failure_without_local_engine_raises(tmp_path):
+    router = TTSRouter(TTSCache(str(tmp_path)), online=StubBackend('gtts'),
+                       local=StubBackend('espeak', installed=False), mode='auto')
+    router.online.failing = True
+    with pytest.raises(ConnectionError):
+        router.synthesize("Hello", 'en', 'com')
+
+
+def test_forced_engine(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    online, local = StubBackend('gtts'), StubBackend('espeak', ext='.wav')
+    assert TTSRouter(cache, online, local, mode='espeak').choose("Hi", 'en', 'com') is local
+    forced = TTSRouter(cache, online, local, mode='gtts')
+    measured(forced, 10.0)
+    assert forced.choose("Hi", 'en', 'com') is online
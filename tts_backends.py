@@ -0,0 +1,171 @@
+"""
+Text-to-speech engines and the router that picks one per phrase.
+
+- `GTTSBackend`: Google TTS (best voice, needs network, MP3)
+- `EspeakBackend`: local espeak-ng/espeak (instant, works offline, WAV)
+
+`TTSRouter` chooses per phrase using the cache state, connectivity and
+measured gTTS latency:
+
+1. audio already cached for gTTS -> gTTS (free)
+2. gTTS failed recently (offline) -> local engine
+3. predicted gTTS latency above `TTS_MAX_WAIT` -> local engine
+4. short phrase (greeting) and gTTS slower than `TTS_SHORT_MAX_WAIT` -> local
+5. otherwise gTTS, falling back to the local engine if it fails
+
+Force one engine with `TTS_ENGINE=gtts` or `TTS_ENGINE=espeak`.
+"""
+import io
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import perf_metrics
+
+# Seconds a failed gTTS call keeps us on the local engine before retrying
+OFFLINE_BACKOFF = float(os.environ.get('TTS_OFFLINE_BACKOFF', '60'))
+MAX_WAIT = float(os.environ.get('TTS_MAX_WAIT', '2.0'))
+SHORT_MAX_WAIT = float(os.environ.get('TTS_SHORT_MAX_WAIT', '0.6'))
+SHORT_CHARS = 60
+NET_TIMEOUT = float(os.environ.get('TTS_NET_TIMEOUT', '5'))
+
+
+class TTSBackend:
+    name = 'base'
+    ext = '.mp3'
+
+    def available(self) -> bool:
+        return True
+
+    def synthesize(self, text: str, lang: str, tld: str) -> bytes:
+        raise NotImplementedError
+
+
+class GTTSBackend(TTSBackend):
+    name = 'gtts'
+    ext = '.mp3'
+
+    def synthesize(self, text: str, lang: str, tld: str) -> bytes:
+        from gtts import gTTS
+        buf = io.BytesIO()
+        gTTS(text=text, lang=lang, tld=tld, timeout=NET_TIMEOUT).write_to_fp(buf)
+        return buf.getvalue()
+
+
+class EspeakBackend(TTSBackend):
+    name = 'espeak'
+    ext = '.wav'
+
+    def __init__(self, voice: str = None, speed: int = None):
+        self.binary = shutil.which('espeak-ng') or shutil.which('espeak')
+        self.voice = voice or os.environ.get('ESPEAK_VOICE', 'en-us')
+        self.speed = speed or int(os.environ.get('ESPEAK_SPEED', '160'))
+
+    def available(self) -> bool:
+        return self.binary is not None
+
+    def synthesize(self, text: str, lang: str, tld: str) -> bytes:
+        if not self.binary:
+            raise RuntimeError("espeak-ng is not installed")
+        result = subprocess.run([self.binary, '--stdout', '-v', self.voice,
+                                 '-s', str(self.speed), text],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                check=True)
+        return result.stdout
+
+
+class LatencyTracker:
+    """Exponentially weighted latency estimate (seconds per request)."""
+
+    def __init__(self, alpha: float = 0.3, initial: float = 1.0):
+        self.alpha = alpha
+        self.estimate = initial
+        self.samples = 0
+
+    def add(self, seconds: float):
+        if self.samples == 0:
+            self.estimate = seconds
+        else:
+            self.estimate = self.alpha * seconds + (1 - self.alpha) * self.estimate
+        self.samples += 1
+
+
+class TTSRouter:
+    def __init__(self, cache, online=None, local=None, mode: str = None):
+        self.cache = cache
+        self.online = online or GTTSBackend()
+        self.local = local or EspeakBackend()
+        self.mode = (mode or os.environ.get('TTS_ENGINE', 'auto')).lower()
+        self.latency = LatencyTracker()
+        self._offline_until = 0.0
+        self._last_online = 0.0
+        self._lock = threading.Lock()
+
+    def is_offline(self) -> bool:
+        return time.time() < self._offline_until
+
+    def choose(self, text: str, lang: str, tld: str) -> TTSBackend:
+        if self.mode == self.online.name or not self.local.available():
+            return self.online
+        if self.mode == self.local.name:
+            return self.local
+        if self.cache.contains(text, lang, tld, self.online.name):
+            return self.online
+        if self.is_offline():
+            return self.local
+        if self.latency.samples == 0 or time.time() - self._last_online > OFFLINE_BACKOFF:
+            # Unmeasured or stale estimate: try gTTS so it gets re-measured
+            return self.online
+        predicted = self.latency.estimate
+        if predicted > MAX_WAIT:
+            return self.local
+        if len(text) <= SHORT_CHARS and predicted > SHORT_MAX_WAIT:
+            return self.local
+        return self.online
+
+    def _render(self, backend: TTSBackend, text: str, lang: str, tld: str) -> str:
+        path = self.cache.get(text, lang, tld, backend.name)
+        if path is not None:
+            return path
+        if backend is self.online:
+            self._last_online = time.time()
+        start = time.perf_counter()
+        data = backend.synthesize(text, lang, tld)
+        elapsed = time.perf_counter() - start
+        perf_metrics.record(f'tts.{backend.name}', elapsed)
+        if backend is self.online:
+            with self._lock:
+                self.latency.add(elapsed)
+                self._offline_until = 0.0
+        return self.cache.put(text, lang, tld, backend.name, data, ext=backend.ext)
+
+    def synthesize(self, text: str, lang: str, tld: str) -> str:
+        """Path of audio for `text`, from whichever engine the policy picks."""
+        backend = self.choose(text, lang, tld)
+        perf_metrics.incr(f'tts.route.{backend.name}')
+        try:
+            return self._render(backend, text, lang, tld)
+        except Exception as e:
+            if backend is not self.online or not self.local.available():
+                raise
+            print(f"[TTS] {backend.name} failed ({e}); using {self.local.name}")
+            with self._lock:
+                self._offline_until = time.time() + OFFLINE_BACKOFF
+                # A failure also counts as a very slow request
+                self.latency.add(max(self.latency.estimate, MAX_WAIT))
+            return self._render(self.local, text, lang, tld)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_tts_router() -> TTSRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            from tts_cache import get_tts_cache
+            _router = TTSRouter(get_tts_cache())
+        return _router
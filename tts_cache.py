@@ -0,0 +1,160 @@
+"""
+Persistent, content-addressed cache of synthesized speech.
+
+Audio is stored as `<sha256>.<ext>` (mp3 for gTTS, wav for local engines)
+under `TTS_CACHE_DIR` (default `tts_cache/`), keyed by (text, language, tld,
+engine). Recency is kept in the
+file modification time so LRU order survives restarts; when the cache grows
+past `TTS_CACHE_MB` (default 100) the least recently used files are removed.
+
+    cache = get_tts_cache()
+    path = cache.get(text, 'en', 'com', 'gtts')
+    if path is None:
+        path = cache.put(text, 'en', 'com', 'gtts', mp3_bytes)
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import perf_metrics
+
+DEFAULT_DIR = os.environ.get('TTS_CACHE_DIR', 'tts_cache')
+DEFAULT_MAX_MB = float(os.environ.get('TTS_CACHE_MB', '100'))
+
+
+def cache_key(text: str, lang: str, tld: str, engine: str) -> str:
+    # Whitespace differences shouldn't create separate entries
+    norm = ' '.join(str(text).split())
+    payload = json.dumps([norm, lang, tld, engine], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+AUDIO_EXTS = ('.mp3', '.wav')
+
+
+class TTSCache:
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = None):
+        self.directory = directory
+        self.max_bytes = int(max_bytes if max_bytes is not None else DEFAULT_MAX_MB * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (size, ext), least recently used first
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = []
+        for name in os.listdir(self.directory):
+            key, ext = os.path.splitext(name)
+            if ext not in AUDIO_EXTS:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            found.append((st.st_mtime, key, st.st_size, ext))
+        for _, key, size, ext in sorted(found):
+            self._entries[key] = (size, ext)
+            self._total += size
+
+    def _path(self, key: str, ext: str = None) -> str:
+        if ext is None:
+            ext = self._entries[key][1]
+        return os.path.join(self.directory, key + ext)
+
+    def get(self, text: str, lang: str, tld: str, engine: str):
+        """Path of the cached audio, or None (counts a hit/miss)."""
+        key = cache_key(text, lang, tld, engine)
+        with self._lock:
+            path = self._path(key) if key in self._entries else None
+            if path and os.path.exists(path):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                perf_metrics.incr('tts_cache.hits')
+                try:
+                    os.utime(path, None)  # persist recency for the next start
+                except OSError:
+                    pass
+                return path
+            if key in self._entries:
+                # File vanished behind our back
+                self._total -= self._entries.pop(key)[0]
+            self.misses += 1
+            perf_metrics.incr('tts_cache.misses')
+            return None
+
+    def contains(self, text: str, lang: str, tld: str, engine: str) -> bool:
+        """Like `get` but without touching statistics or recency."""
+        key = cache_key(text, lang, tld, engine)
+        with self._lock:
+            return key in self._entries and os.path.exists(self._path(key))
+
+    def put(self, text: str, lang: str, tld: str, engine: str, data: bytes,
+            ext: str = '.mp3') -> str:
+        """Store `data` atomically and return its path."""
+        key = cache_key(text, lang, tld, engine)
+        path = self._path(key, ext)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if key in self._entries:
+                old_size, old_ext = self._entries.pop(key)
+                self._total -= old_size
+                if old_ext != ext:
+                    try:
+                        os.remove(self._path(key, old_ext))
+                    except OSError:
+                        pass
+            self._entries[key] = (len(data), ext)
+            self._total += len(data)
+            self._evict_locked(keep=key)
+        return path
+
+    def _evict_locked(self, keep: str = None):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, (size, ext) = next(iter(self._entries.items()))
+            if key == keep:
+                self._entries.move_to_end(key)
+                continue
+            self._entries.pop(key)
+            self._total -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key, ext))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """Process-wide shared cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache()
+        return _cache
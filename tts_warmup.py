@@ -0,0 +1,160 @@
+"""
+Background pre-synthesis of every phrase OMNIS can say ahead of time:
+`school_data` answers, stock replies and each enrolled person's greetings.
+Audio lands in the TTS cache (`tts_cache.py`), so the first time a phrase is
+needed it plays without waiting for gTTS.
+
+The job runs in a low-priority daemon thread, pauses while the robot is
+talking, and re-runs when the face gallery (`images/encoded_file.p`) changes
+or `request_refresh()` is called.
+"""
+import os
+import pickle
+import threading
+import time
+
+import answer_providers
+import perf_metrics
+import school_data
+from greetings import GREETING_PARTS, STOCK_PHRASES, greeting_variants
+
+ENCODE_FILE = 'images/encoded_file.p'
+
+
+def load_gallery_names(path: str = ENCODE_FILE) -> list:
+    try:
+        with open(path, 'rb') as f:
+            _, names = pickle.load(f)
+        return list(names)
+    except Exception as e:
+        print(f"[TTSWarmup] Could not read gallery names: {e}")
+        return []
+
+
+def static_answers() -> list:
+    answers = list(school_data.CUSTOM_QA.values())
+    for item in school_data.METADATA:
+        ans = item['answer']
+        answers.extend(a for a in (ans if isinstance(ans, list) else [ans]) if a)
+    # Clock/date/weather answers are computed when asked; nothing to pre-synthesize
+    return [a for a in answers if not answer_providers.is_dynamic(a)]
+
+
+def collect_phrases(names, segments: bool = False) -> list:
+    """Unique phrases to pre-synthesize, most useful first.
+
+    With `segments`, greetings are played from joined clips, so only the
+    shared parts are included here (see `collect_segments`).
+    """
+    phrases = list(STOCK_PHRASES)
+    if not segments:
+        for name in names:
+            phrases.extend(greeting_variants(name))
+    phrases.extend(static_answers())
+    seen = set()
+    return [p for p in phrases if p and not (p in seen or seen.add(p))]
+
+
+def collect_segments(names) -> list:
+    """Greeting segments: the fixed parts plus one clip per name."""
+    return list(dict.fromkeys(p for p in [*GREETING_PARTS, *names] if p))
+
+
+class TTSWarmup(threading.Thread):
+    def __init__(self, names_fn=load_gallery_names, watch_paths=(ENCODE_FILE,),
+                 check_interval: float = 30.0, pause_between: float = 0.2):
+        threading.Thread.__init__(self, daemon=True, name='TTSWarmup')
+        self.names_fn = names_fn
+        self.watch_paths = list(watch_paths)
+        self.check_interval = check_interval
+        self.pause_between = pause_between
+        self._refresh = threading.Event()
+        self._stop_event = threading.Event()
+        self.synthesized = 0
+
+    def request_refresh(self):
+        """Re-run the warm-up soon (e.g. after the knowledge base changed)."""
+        self._refresh.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._refresh.set()
+
+    def _signature(self):
+        sig = []
+        for path in self.watch_paths:
+            try:
+                sig.append(os.path.getmtime(path))
+            except OSError:
+                sig.append(None)
+        return sig
+
+    def _lower_priority(self):
+        # On Linux os.nice() only affects the calling thread
+        try:
+            os.nice(10)
+        except (AttributeError, OSError):
+            pass
+
+    def warm(self):
+        # Imported here: speaker pulls in pygame/gTTS which main.py loads anyway
+        from speaker import (render_gtts, split_sentences, wait_until_quiet,
+                             TTS_LANG, TTS_TLD, TTS_SEGMENTS)
+        from tts_cache import get_tts_cache
+
+        cache = get_tts_cache()
+        names = self.names_fn()
+        phrases = collect_phrases(names, segments=TTS_SEGMENTS)
+        # The speaker synthesizes sentence by sentence, so cache the same chunks
+        chunks = [c for p in phrases for c in split_sentences(p)]
+        if TTS_SEGMENTS:
+            # Segments are synthesized whole, never split
+            chunks = collect_segments(names) + chunks
+        chunks = list(dict.fromkeys(chunks))
+        todo = [c for c in chunks if not cache.contains(c, TTS_LANG, TTS_TLD, 'gtts')]
+        print(f"[TTSWarmup] {len(phrases)} phrases, {len(todo)} need synthesis")
+        start = time.time()
+        for phrase in todo:
+            if self._stop_event.is_set():
+                return False
+            # Never compete with live speech for the network
+            wait_until_quiet(0, should_stop=self._stop_event.is_set)
+            try:
+                cache.put(phrase, TTS_LANG, TTS_TLD, 'gtts', render_gtts(phrase))
+                self.synthesized += 1
+                perf_metrics.incr('tts_warmup.synthesized')
+            except Exception as e:
+                # Probably offline; the run loop retries on the next check
+                print(f"[TTSWarmup] Giving up for now ({e})")
+                return False
+            time.sleep(self.pause_between)
+        if todo:
+            print(f"[TTSWarmup] Done in {time.time() - start:.1f}s")
+        return True
+
+    def run(self):
+        self._lower_priority()
+        last_sig = None
+        while not self._stop_event.is_set():
+            sig = self._signature()
+            if sig != last_sig or self._refresh.is_set():
+                self._refresh.clear()
+                last_sig = sig if self.warm() else None
+            self._refresh.wait(self.check_interval)
+
+
+_warmup = None
+
+
+def start_tts_warmup(**kwargs) -> TTSWarmup:
+    """Start (once) and return the shared warm-up thread."""
+    global _warmup
+    if _warmup is None:
+        _warmup = TTSWarmup(**kwargs)
+        _warmup.start()
+    return _warmup
+
+
+def request_refresh():
+    if _warmup is not None:
+        _warmup.request_refresh()
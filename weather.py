@@ -2,10 +2,10 @@ import requests
 from bs4 import BeautifulSoup
 
 
-def get_weather_data(city: str='thiruvananthapuram'):
+def get_weather_data(city: str='thiruvananthapuram', timeout: float = 10):
     url = 'https://www.google.com/search?q='+'weather'+city
 
-    res = requests.get(url).content
+    res = requests.get(url, timeout=timeout).content
 
     soup = BeautifulSoup(res, 'html.parser')
 